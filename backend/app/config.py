@@ -1,3 +1,4 @@
+import logging
 import os
 from dotenv import load_dotenv
 
@@ -7,14 +8,150 @@ load_dotenv()
 class Config:
     """Application configuration settings."""
     
+    # Log level (DEBUG, INFO, WARNING, ...); per-request messages are logged
+    # at DEBUG so they stay off the hot path in production
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
     # Hugging Face API Key
     HUGGINGFACE_HUB_TOKEN = os.getenv("HUGGINGFACE_HUB_TOKEN")
 
     # OpenRouter API Key
     OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 
+    # OpenRouter endpoint (overridable to point at a local stub server)
+    OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+
+    # Shared LLM HTTP client: concurrent requests, pooled connections,
+    # keep-alive and timeouts (total covers a whole streamed answer)
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+    LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "64"))
+    LLM_KEEPALIVE_SECONDS = float(os.getenv("LLM_KEEPALIVE_SECONDS", "30"))
+    LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "10"))
+    LLM_TOTAL_TIMEOUT_SECONDS = float(os.getenv("LLM_TOTAL_TIMEOUT_SECONDS", "300"))
+
+    # Query embedding and /search result LRU caches (0 disables)
+    QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "4096"))
+    SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1024"))
+
+    # Query encode micro-batching: how long to wait for concurrent queries
+    # and the largest batch per forward pass (window 0 disables batching)
+    QUERY_BATCH_WINDOW_MS = float(os.getenv("QUERY_BATCH_WINDOW_MS", "2"))
+    QUERY_BATCH_MAX_SIZE = int(os.getenv("QUERY_BATCH_MAX_SIZE", "64"))
+
+    # Hybrid search: score fusion ("minmax", "zscore" or "rrf"), keyword and
+    # vector candidates considered per query, and the reciprocal rank fusion
+    # rank offset
+    SEARCH_FUSION = os.getenv("SEARCH_FUSION", "minmax")
+    SEARCH_CANDIDATE_DEPTH = int(os.getenv("SEARCH_CANDIDATE_DEPTH", "100"))
+    RRF_K = int(os.getenv("RRF_K", "60"))
+    # Filtered searches over at most this many chunks scan the stored
+    # vectors exactly instead of searching the FAISS index
+    FILTER_EXACT_MAX_CHUNKS = int(os.getenv("FILTER_EXACT_MAX_CHUNKS", "20000"))
+
+    # /search/batch and /ask/batch: most queries per request, queries
+    # scored together (bounds the queries x chunks BM25 score matrix) and
+    # LLM calls in flight per /ask/batch request
+    BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "10000"))
+    SEARCH_BATCH_SIZE = int(os.getenv("SEARCH_BATCH_SIZE", "32"))
+    ASK_BATCH_CONCURRENCY = int(os.getenv("ASK_BATCH_CONCURRENCY", "8"))
+
+    # /ask answer cache: entries kept, time-to-live (0 disables expiry) and
+    # minimum cosine similarity for reusing a near-identical question
+    ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+    ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1024"))
+    ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+    ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+
+    # /ask cross-encoder reranking: search results considered, passages kept
+    # for the prompt, pairs per forward pass, per-request time budget (the
+    # fused order is kept when it runs out; 0 disables the budget), cached
+    # (query, chunk) scores and an optional minimum score for kept passages
+    RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+    RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+    RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+    RERANK_TOP_K = int(os.getenv("RERANK_TOP_K", "3"))
+    RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+    RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "150"))
+    RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "10000"))
+    RERANK_MIN_SCORE = float(os.environ["RERANK_MIN_SCORE"]) if os.getenv("RERANK_MIN_SCORE") else None
+
+    # /ask prompt context: token budget for retrieved passages (0 disables
+    # the limit), and the share of a chunk's word triples already in the
+    # context above which it is dropped as a near-duplicate
+    CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "1500"))
+    CONTEXT_DUPLICATE_SIMILARITY = float(os.getenv("CONTEXT_DUPLICATE_SIMILARITY", "0.9"))
+
+    # Named collections: where they are stored, and how many of them (and
+    # how many chunks across them, 0 for no limit) stay loaded in memory
+    # before the least recently used are evicted
+    COLLECTIONS_DIR = os.getenv("COLLECTIONS_DIR", "data/collections")
+    COLLECTIONS_MAX_LOADED = int(os.getenv("COLLECTIONS_MAX_LOADED", "8"))
+    COLLECTIONS_MAX_CHUNKS = int(os.getenv("COLLECTIONS_MAX_CHUNKS", "0"))
+
     # Upload Directory
     UPLOAD_DIR = "data/"
 
+    # Embedding model and backend: sentence-transformers, onnx or onnx-int8.
+    # Models load on first use unless EMBEDDING_PRELOAD is set, which loads
+    # them at import so pre-forked workers share the weights copy-on-write
+    EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+    EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "sentence-transformers")
+    EMBEDDING_MODEL_DIR = os.getenv("EMBEDDING_MODEL_DIR", "data/models")
+    EMBEDDING_PRELOAD = os.getenv("EMBEDDING_PRELOAD", "false").lower() == "true"
+
+    # Chunking: tokens per chunk including special tokens (keep at or below
+    # the model's max sequence length, 256 for all-MiniLM-L6-v2, or the rest
+    # is truncated away), and tokens of trailing sentences repeated as overlap
+    CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "256"))
+    CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+
+    # FAISS index type: flat, hnsw, ivfflat or ivfpq
+    FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")
+
+    # IVF settings: number of inverted lists, lists probed per query and
+    # minimum vectors collected before the index is trained
+    FAISS_NLIST = int(os.getenv("FAISS_NLIST", "100"))
+    FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "8"))
+    FAISS_MIN_TRAIN_VECTORS = int(os.getenv("FAISS_MIN_TRAIN_VECTORS", "4000"))
+
+    # Product quantizer sub-vectors (must divide the embedding dimension)
+    FAISS_PQ_M = int(os.getenv("FAISS_PQ_M", "48"))
+
+    # HNSW graph degree and candidate list sizes
+    FAISS_HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+    FAISS_EF_CONSTRUCTION = int(os.getenv("FAISS_EF_CONSTRUCTION", "200"))
+    FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))
+
+    # Background compaction: how often to check, and how many segments
+    # accumulate before they are merged and the indexes checkpointed
+    COMPACTION_INTERVAL_SECONDS = float(os.getenv("COMPACTION_INTERVAL_SECONDS", "60"))
+    COMPACTION_MIN_SEGMENTS = int(os.getenv("COMPACTION_MIN_SEGMENTS", "8"))
+    # Fraction of tombstoned (deleted) chunks that triggers a purging compaction
+    COMPACTION_PURGE_RATIO = float(os.getenv("COMPACTION_PURGE_RATIO", "0.1"))
+
+    # How often each worker checks the shared segment manifest for changes
+    # made by other processes (0 disables hot reload)
+    INDEX_RELOAD_INTERVAL_SECONDS = float(os.getenv("INDEX_RELOAD_INTERVAL_SECONDS", "1.0"))
+
+    # Background ingestion: worker threads, documents sharing one embedding
+    # pass, how long a worker waits to fill a batch, and finished jobs kept
+    INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+    INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "8"))
+    INGEST_BATCH_WINDOW_SECONDS = float(os.getenv("INGEST_BATCH_WINDOW_SECONDS", "0.2"))
+    INGEST_MAX_JOBS = int(os.getenv("INGEST_MAX_JOBS", "1000"))
+
+    # Streaming ingestion: PDFs with more pages are chunked and embedded as
+    # their pages are extracted, INGEST_STREAM_BATCH_CHUNKS chunks at a time,
+    # instead of joining the batched path
+    INGEST_STREAM_MIN_PAGES = int(os.getenv("INGEST_STREAM_MIN_PAGES", "50"))
+    INGEST_STREAM_BATCH_CHUNKS = int(os.getenv("INGEST_STREAM_BATCH_CHUNKS", "256"))
+
+    # PDF extraction: processes extracting pages in parallel, and pages per task
+    PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+    PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+
 # Instantiate config
-config = Config()
\ No newline at end of file
+config = Config()
+
+# Configure logging once for the server and the command line tools
+logging.basicConfig(level=config.LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
@@ -1,6 +1,10 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from app.routes import upload, search, ask
+from app.services.collection_manager import collection_manager
+from app.services.llm import close_session
+from app.services.metrics import metrics
 
 app = FastAPI(title="RAG Backend")
 
@@ -18,6 +22,21 @@ app.include_router(upload.router, prefix="/upload", tags=["Upload"])
 app.include_router(search.router, prefix="/search", tags=["Search"])
 app.include_router(ask.router, prefix="/ask", tags=["Ask"])
 
+@app.on_event("shutdown")
+async def shutdown():
+    # Release pooled OpenRouter connections
+    await close_session()
+
 @app.get("/")
 async def root():
-    return {"message": "Welcome to the RAG API!"}
\ No newline at end of file
+    return {"message": "Welcome to the RAG API!"}
+
+@app.get("/collections")
+async def list_collections():
+    """List collections on disk and those loaded in memory, with chunk counts."""
+    return collection_manager.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Stage latency histograms in the Prometheus text exposition format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
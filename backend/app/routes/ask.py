@@ -1,34 +1,170 @@
+import asyncio
+import json
+from datetime import datetime
+from typing import List, Optional
 from fastapi import APIRouter, Query, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import StreamingResponse
-from app.services.retriever import search
+from pydantic import BaseModel
+from app.config import config
+from app.routes.search import get_collection, search_filters, validate_batch
 from app.services.llm import ask_llm, ask_llm_streaming
+from app.services.reranker import rerank
+from app.services.context import build_context
+from app.services.answer_cache import (
+    answer_cache, context_fingerprint, record_stream, replay_stream
+)
 
 router = APIRouter()
 
+class BatchAskRequest(BaseModel):
+    queries: List[str]
+    document_ids: Optional[List[str]] = None
+    uploaded_after: Optional[datetime] = None
+    uploaded_before: Optional[datetime] = None
+    collection: Optional[str] = None
+
+def context_stats(context):
+    """Prompt context size report (everything from build_context but the text)."""
+    return {key: value for key, value in context.items() if key != "text"}
+
+async def with_context_stats(context, events):
+    """Precede an answer's events with one reporting the prompt context size."""
+    yield f"data: {json.dumps({'context': context_stats(context)})}\n\n"
+    async for event in events:
+        yield event
+
+def retrieve(embedder, query, filters):
+    """
+    Passages to answer a question from.
+
+    With RERANK_ENABLED, RERANK_CANDIDATES search results are reranked by
+    the cross-encoder and only the RERANK_TOP_K best are kept.
+    """
+    if not config.RERANK_ENABLED:
+        return embedder.search(query, **filters)
+    candidates = embedder.search(query, top_k=config.RERANK_CANDIDATES, **filters)
+    if not candidates or isinstance(candidates, dict):
+        return candidates
+    return rerank(query, candidates)
+
 @router.get("/")
 async def ask_question(
     query: str = Query(..., min_length=3, description="The question to answer"),
-    stream: bool = Query(True, description="Whether to stream the response")
+    stream: bool = Query(True, description="Whether to stream the response"),
+    document_id: Optional[List[str]] = Query(None, description="Only answer from these documents (repeatable)"),
+    uploaded_after: Optional[datetime] = Query(None, description="Only use documents uploaded at or after this time"),
+    uploaded_before: Optional[datetime] = Query(None, description="Only use documents uploaded before this time"),
+    collection: Optional[str] = Query(None, description="Collection to answer from (default: the default collection)")
 ):
     """
     Retrieves relevant document passages and sends them to the LLM.
+
+    Answers are cached per retrieved context; a repeated or near-identical
+    question over the same passages is answered from the cache. Retrieval
+    can be restricted to some documents or an upload time range.
     """
-    relevant_chunks = search(query)
-    if not relevant_chunks:
+    embedder = await run_in_threadpool(get_collection, collection)
+    relevant_chunks = await run_in_threadpool(
+        retrieve, embedder, query, search_filters(document_id, uploaded_after, uploaded_before)
+    )
+    if not relevant_chunks or isinstance(relevant_chunks, dict):
         raise HTTPException(status_code=404, detail="No relevant documents found")
 
+    # Look up a cached answer: exact question first, then nearest question embedding
+    fingerprint = context_fingerprint(relevant_chunks)
+    query_embedding = None
+    cached = None
+    if config.ANSWER_CACHE_ENABLED:
+        cached = answer_cache.get_exact(query, fingerprint)
+        if cached is None:
+            query_embedding = await run_in_threadpool(embedder.encode_query, query)
+            cached = answer_cache.get_similar(query_embedding, fingerprint)
+
+    if cached is not None:
+        if stream:
+            return StreamingResponse(replay_stream(cached), media_type="text/event-stream")
+        return {"answer": cached}
+
+    # Fit the most relevant passages into the prompt's token budget
+    context = await run_in_threadpool(build_context, relevant_chunks)
+
     # If streaming is requested
     if stream:
-        return StreamingResponse(
-            ask_llm_streaming(query, relevant_chunks),
-            media_type="text/event-stream"
-        )
-    
-    # For non-streaming, extract text from chunks if they are dictionaries
-    if relevant_chunks and isinstance(relevant_chunks[0], dict):
-        text_chunks = [chunk.get('text', '') for chunk in relevant_chunks]
-        context = "\n".join(text_chunks)
-    else:
-        context = "\n".join(relevant_chunks)
-        
-    return ask_llm(query, context)
\ No newline at end of file
+        events = ask_llm_streaming(query, context["text"])
+        if config.ANSWER_CACHE_ENABLED:
+            events = record_stream(events, answer_cache, query, fingerprint, query_embedding)
+        return StreamingResponse(with_context_stats(context, events), media_type="text/event-stream")
+
+    response = await ask_llm(query, context["text"])
+    if config.ANSWER_CACHE_ENABLED and "answer" in response:
+        answer_cache.put(query, fingerprint, query_embedding, response["answer"])
+    response["context"] = context_stats(context)
+    return response
+
+@router.post("/batch")
+async def ask_questions_batch(request: BatchAskRequest):
+    """
+    Answer many questions in one request.
+
+    Passages for all questions are retrieved with one batched search, then
+    up to ASK_BATCH_CONCURRENCY LLM calls run at once. Answers are streamed
+    back as NDJSON in completion order, one line per question with "index",
+    "query" and "answer" (or "error").
+    """
+    queries = request.queries
+    validate_batch(queries)
+    filters = search_filters(request.document_ids, request.uploaded_after, request.uploaded_before)
+    if config.RERANK_ENABLED:
+        filters["top_k"] = config.RERANK_CANDIDATES
+    embedder = await run_in_threadpool(get_collection, request.collection)
+    retrieved = await run_in_threadpool(lambda: list(embedder.search_batch(queries, **filters)))
+    query_embeddings = None
+    if config.ANSWER_CACHE_ENABLED:
+        # Already cached by the batched search, so this costs no forward pass
+        query_embeddings = await run_in_threadpool(embedder.encode_queries, queries)
+    semaphore = asyncio.Semaphore(config.ASK_BATCH_CONCURRENCY)
+
+    async def answer(index, query, relevant_chunks):
+        line = {"index": index, "query": query}
+        if not relevant_chunks or isinstance(relevant_chunks, dict):
+            line["error"] = "No relevant documents found"
+            return line
+        if config.RERANK_ENABLED:
+            relevant_chunks = await run_in_threadpool(rerank, query, relevant_chunks)
+        fingerprint = context_fingerprint(relevant_chunks)
+        if config.ANSWER_CACHE_ENABLED:
+            cached = answer_cache.get_exact(query, fingerprint)
+            if cached is None:
+                cached = answer_cache.get_similar(query_embeddings[index], fingerprint)
+            if cached is not None:
+                line["answer"] = cached
+                return line
+        context = await run_in_threadpool(build_context, relevant_chunks)
+        async with semaphore:
+            response = await ask_llm(query, context["text"])
+        if config.ANSWER_CACHE_ENABLED and "answer" in response:
+            answer_cache.put(query, fingerprint, query_embeddings[index], response["answer"])
+        line.update(response)
+        line["context"] = context_stats(context)
+        return line
+
+    async def lines():
+        tasks = [
+            asyncio.create_task(answer(index, query, relevant_chunks))
+            for index, (query, relevant_chunks) in enumerate(zip(queries, retrieved))
+        ]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield json.dumps(await task) + "\n"
+        finally:
+            # The client went away: stop calling the LLM
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@router.get("/cache")
+async def answer_cache_stats():
+    """Report answer cache size and hit/miss counters."""
+    return answer_cache.stats()
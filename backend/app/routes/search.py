@@ -1,14 +1,87 @@
-from fastapi import APIRouter, Query
-from app.services.embedder import document_embedder
+import json
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from app.config import config
+from app.services.collection_manager import CollectionNotFound, collection_manager
+from app.services.fusion import STRATEGIES as FUSION_STRATEGIES
 
 router = APIRouter()
 
+class BatchSearchRequest(BaseModel):
+    queries: List[str]
+    top_k: int = 5
+    semantic_weight: float = 0.7
+    keyword_weight: float = 0.3
+    nprobe: Optional[int] = None
+    ef_search: Optional[int] = None
+    fusion: Optional[str] = None
+    candidate_depth: Optional[int] = None
+    document_ids: Optional[List[str]] = None
+    uploaded_after: Optional[datetime] = None
+    uploaded_before: Optional[datetime] = None
+    collection: Optional[str] = None
+
+def get_collection(name, create=False):
+    """
+    The embedder of a collection (the default one for None).
+
+    Loading a collection reads it from disk, so call this in the threadpool.
+    """
+    try:
+        return collection_manager.get(name, create=create)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except CollectionNotFound:
+        raise HTTPException(status_code=404, detail=f"Collection not found: {name}")
+
+def search_filters(document_ids, uploaded_after, uploaded_before):
+    """Document filter keyword arguments for DocumentEmbedder.search."""
+    return {
+        "document_ids": document_ids,
+        "uploaded_after": uploaded_after.timestamp() if uploaded_after else None,
+        "uploaded_before": uploaded_before.timestamp() if uploaded_before else None,
+    }
+
+def normalize_weights(semantic_weight, keyword_weight):
+    """Scale the two search weights to sum to 1."""
+    total_weight = semantic_weight + keyword_weight
+    if total_weight != 1.0:
+        semantic_weight = semantic_weight / total_weight
+        keyword_weight = keyword_weight / total_weight
+    return semantic_weight, keyword_weight
+
+def validate_fusion(fusion, candidate_depth):
+    """Reject unknown fusion strategies and non-positive candidate depths."""
+    if fusion is not None and fusion not in FUSION_STRATEGIES:
+        raise HTTPException(status_code=400, detail=f"fusion must be one of {', '.join(FUSION_STRATEGIES)}")
+    if candidate_depth is not None and candidate_depth < 1:
+        raise HTTPException(status_code=400, detail="candidate_depth must be positive")
+
+def validate_batch(queries):
+    """Reject empty or oversized query batches."""
+    if not queries:
+        raise HTTPException(status_code=400, detail="No queries given")
+    if len(queries) > config.BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=413, detail=f"At most {config.BATCH_MAX_QUERIES} queries per batch")
+
 @router.get("/")
 async def search_documents(
     query: str = Query(..., description="Search query"),
-    top_k: int = Query(5, description="Number of results to return"),
+    top_k: int = Query(5, ge=1, description="Number of results to return"),
     semantic_weight: float = Query(0.7, description="Weight for semantic search (0-1)"),
-    keyword_weight: float = Query(0.3, description="Weight for keyword search (0-1)")
+    keyword_weight: float = Query(0.3, description="Weight for keyword search (0-1)"),
+    nprobe: Optional[int] = Query(None, ge=1, description="IVF lists to probe (higher = better recall, slower)"),
+    ef_search: Optional[int] = Query(None, ge=1, description="HNSW search depth (higher = better recall, slower)"),
+    fusion: Optional[str] = Query(None, description="Score fusion: minmax, zscore or rrf"),
+    candidate_depth: Optional[int] = Query(None, ge=1, description="Candidates taken from each retriever"),
+    document_id: Optional[List[str]] = Query(None, description="Only search these documents (repeatable)"),
+    uploaded_after: Optional[datetime] = Query(None, description="Only search documents uploaded at or after this time"),
+    uploaded_before: Optional[datetime] = Query(None, description="Only search documents uploaded before this time"),
+    collection: Optional[str] = Query(None, description="Collection to search (default: the default collection)")
 ):
     """
     Search documents using hybrid semantic and keyword search.
@@ -18,21 +91,81 @@ async def search_documents(
         top_k (int): Number of results to return
         semantic_weight (float): Weight for semantic search component (0-1)
         keyword_weight (float): Weight for keyword search component (0-1)
+        nprobe (int): IVF lists to probe, only used by IVF indexes
+        ef_search (int): HNSW search depth, only used by HNSW indexes
+        fusion (str): Score fusion strategy, defaults to SEARCH_FUSION
+        candidate_depth (int): Candidates per retriever, defaults to SEARCH_CANDIDATE_DEPTH
+        document_id (list): Restrict the search to these documents
+        uploaded_after (datetime): Restrict to documents uploaded at or after this time
+        uploaded_before (datetime): Restrict to documents uploaded before this time
+        collection (str): Collection to search, loaded on first use
         
     Returns:
         list: Top matching results with text and metadata
     """
+    validate_fusion(fusion, candidate_depth)
+
     # Normalize weights if needed
-    total_weight = semantic_weight + keyword_weight
-    if total_weight != 1.0:
-        semantic_weight = semantic_weight / total_weight
-        keyword_weight = keyword_weight / total_weight
-        
-    results = document_embedder.search(
-        query, 
+    semantic_weight, keyword_weight = normalize_weights(semantic_weight, keyword_weight)
+
+    # Run off the event loop so concurrent queries can share an encode batch
+    embedder = await run_in_threadpool(get_collection, collection)
+    results = await run_in_threadpool(
+        embedder.search,
+        query,
         bm25_weight=keyword_weight, 
         semantic_weight=semantic_weight,
-        top_k=top_k
+        top_k=top_k,
+        nprobe=nprobe,
+        ef_search=ef_search,
+        fusion=fusion,
+        candidate_depth=candidate_depth,
+        **search_filters(document_id, uploaded_after, uploaded_before)
     )
     
-    return {"results": results, "query": query, "total_results": len(results)}
\ No newline at end of file
+    return {"results": results, "query": query, "total_results": len(results)}
+
+@router.post("/batch")
+async def search_documents_batch(request: BatchSearchRequest):
+    """
+    Run many hybrid searches in one request.
+
+    Queries are embedded, searched and scored in batches, and results are
+    streamed back as NDJSON: one line per query, in request order, each
+    with "index", "query", "results" and "total_results" (or "error").
+    """
+    validate_batch(request.queries)
+    if request.top_k < 1 or (request.nprobe or 1) < 1 or (request.ef_search or 1) < 1:
+        raise HTTPException(status_code=400, detail="top_k, nprobe and ef_search must be positive")
+    validate_fusion(request.fusion, request.candidate_depth)
+    semantic_weight, keyword_weight = normalize_weights(request.semantic_weight, request.keyword_weight)
+    embedder = await run_in_threadpool(get_collection, request.collection)
+
+    def lines():
+        # A plain generator: the response iterates it in the threadpool
+        results = embedder.search_batch(
+            request.queries,
+            bm25_weight=keyword_weight,
+            semantic_weight=semantic_weight,
+            top_k=request.top_k,
+            nprobe=request.nprobe,
+            ef_search=request.ef_search,
+            fusion=request.fusion,
+            candidate_depth=request.candidate_depth,
+            **search_filters(request.document_ids, request.uploaded_after, request.uploaded_before)
+        )
+        for index, (query, result) in enumerate(zip(request.queries, results)):
+            line = {"index": index, "query": query}
+            if isinstance(result, dict):
+                line.update(result)
+            else:
+                line.update(results=result, total_results=len(result))
+            yield json.dumps(line) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@router.get("/cache")
+async def search_cache_stats(collection: Optional[str] = Query(None, description="Collection to report on")):
+    """Report query embedding and search result cache hit/miss counters."""
+    embedder = await run_in_threadpool(get_collection, collection)
+    return embedder.cache_stats()
\ No newline at end of file
@@ -1,10 +1,16 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException
+from typing import List, Optional
+from fastapi import APIRouter, File, Query, UploadFile, HTTPException
+from fastapi.concurrency import run_in_threadpool
 import os
+import shutil
 import uuid
-import pypdf
-from bs4 import BeautifulSoup
 import datetime
-from app.services.embedder import document_embedder
+import logging
+from app.services.extractor import is_supported
+from app.routes.search import get_collection
+from app.services.ingest import ingest_jobs, remove_stored_files
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -13,108 +19,190 @@ UPLOAD_DIR = "data/uploads/"
 # Ensure upload directory exists
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-def extract_text_from_pdf(filepath):
-    """Extract text from PDF."""
-    try:
-        reader = pypdf.PdfReader(filepath)
-        extracted_text = "\n".join([page.extract_text() for page in reader.pages if page.extract_text()])
-        print(f"📝 Extracted {len(extracted_text)} characters from PDF", flush=True)
-        return extracted_text
-    except Exception as e:
-        print(f"❌ Error extracting text from PDF: {str(e)}", flush=True)
-        raise HTTPException(status_code=400, detail=f"Error processing PDF: {str(e)}")
-
-def extract_text_from_html(filepath):
-    """Extract text from HTML file."""
-    try:
-        with open(filepath, "r", encoding="utf-8") as f:
-            soup = BeautifulSoup(f.read(), "html.parser")
-        # Remove script and style elements
-        for script in soup(["script", "style"]):
-            script.extract()
-        # Get text
-        extracted_text = soup.get_text()
-        # Break into lines and remove leading and trailing space on each
-        lines = (line.strip() for line in extracted_text.splitlines())
-        # Break multi-headlines into a line each
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        # Remove blank lines
-        extracted_text = '\n'.join(chunk for chunk in chunks if chunk)
-        
-        print(f"📝 Extracted {len(extracted_text)} characters from HTML", flush=True)
-        return extracted_text
-    except Exception as e:
-        print(f"❌ Error extracting text from HTML: {str(e)}", flush=True)
-        raise HTTPException(status_code=400, detail=f"Error processing HTML: {str(e)}")
+COLLECTION_QUERY = Query(None, description="Collection of the document (default: the default collection)")
+
+def upload_dir(embedder):
+    """Upload directory of a collection (UPLOAD_DIR for the default collection)."""
+    directory = os.path.join(embedder.data_dir, "uploads")
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+def save_upload(file, document_id, directory=UPLOAD_DIR, replace=False):
+    """
+    Copy an uploaded file to the upload directory without loading it into memory.
+
+    A replacement gets a name of its own, so the stored version survives
+    until the new one has been ingested.
+    """
+    unique_filename = f"{document_id}_{file.filename}"
+    if replace:
+        unique_filename = f"{document_id}_{uuid.uuid4().hex[:8]}_{file.filename}"
+    filepath = os.path.join(directory, unique_filename)
+    with open(filepath, "wb") as f:
+        shutil.copyfileobj(file.file, f)
+    return unique_filename, filepath
+
+async def queue_upload(file, document_id=None, collection=None):
+    """
+    Save an upload and queue it for background ingestion.
+
+    Passing the id of a stored document replaces that document; its old
+    file is removed once the replacement has been ingested. The collection
+    is created if it does not exist yet.
+    """
+    embedder = await run_in_threadpool(get_collection, collection, True)
+    directory = upload_dir(embedder)
+    replace = document_id is not None
+    # Generate a unique document ID
+    document_id = document_id or str(uuid.uuid4())
+
+    # Create a timestamp for the upload
+    timestamp = datetime.datetime.now().isoformat()
+
+    # Save uploaded file off the event loop
+    unique_filename, filepath = await run_in_threadpool(save_upload, file, document_id, directory, replace)
+    logger.debug("📂 File saved at: %s", filepath)
+
+    return ingest_jobs.submit(
+        filepath,
+        file.filename,
+        document_id=document_id,
+        metadata={
+            "stored_filename": unique_filename,
+            "upload_timestamp": timestamp,
+            "file_size_bytes": os.path.getsize(filepath)
+        },
+        replace=replace,
+        collection=collection
+    )
+
+def job_response(job):
+    return {
+        "message": "Document uploaded and queued for processing",
+        "job_id": job["job_id"],
+        "document_id": job["document_id"],
+        "filename": job["filename"],
+        "status": job["status"],
+        "timestamp": job["upload_timestamp"]
+    }
 
 @router.post("/")
-async def upload_document(file: UploadFile = File(...)):
+async def upload_document(file: UploadFile = File(...), collection: Optional[str] = COLLECTION_QUERY):
     """
-    Upload and process a document file.
-    
+    Upload a document and queue it for processing.
+
+    Extraction, chunking, embedding and indexing run on background workers;
+    poll `GET /upload/jobs/{job_id}` for progress.
+
     Args:
         file (UploadFile): The file to upload
-        
+        collection (str): Collection to add the document to, created if needed
+
     Returns:
-        dict: Status message and document details
+        dict: Job id and document details
     """
-    # Generate a unique document ID
-    document_id = str(uuid.uuid4())
-    
-    # Create a timestamp for the upload
-    timestamp = datetime.datetime.now().isoformat()
-    
-    # Get original filename and create unique filename for storage
-    original_filename = file.filename
-    unique_filename = f"{document_id}_{original_filename}"
-    filepath = os.path.join(UPLOAD_DIR, unique_filename)
+    if not is_supported(file.filename):
+        return {"error": "Unsupported file format. Please upload PDF or HTML files."}
 
-    # Save uploaded file
-    with open(filepath, "wb") as f:
-        f.write(file.file.read())
+    job = await queue_upload(file, collection=collection)
+    return job_response(job)
+
+@router.post("/batch")
+async def upload_documents(files: List[UploadFile] = File(...), collection: Optional[str] = COLLECTION_QUERY):
+    """
+    Upload several documents at once.
+
+    The documents are queued together so they share one embedding pass.
 
-    print(f"📂 File saved at: {filepath}", flush=True)
+    Args:
+        files (List[UploadFile]): The files to upload
+        collection (str): Collection to add the documents to, created if needed
+
+    Returns:
+        dict: One job per accepted file, plus rejected filenames
+    """
+    jobs = []
+    rejected = []
+    for file in files:
+        if not is_supported(file.filename):
+            rejected.append(file.filename)
+            continue
+        jobs.append(job_response(await queue_upload(file, collection=collection)))
+
+    return {"jobs": jobs, "rejected": rejected}
+
+@router.get("/dedup-report")
+async def dedup_report(collection: Optional[str] = COLLECTION_QUERY):
+    """
+    Report duplicate content across a collection and space saved by deduplication.
+
+    Returns:
+        dict: Unique/duplicate chunk counts, skipped documents, reused embeddings and bytes saved
+    """
+    embedder = await run_in_threadpool(get_collection, collection)
+    return embedder.dedup_report()
+
+@router.get("/jobs/{job_id}")
+async def get_upload_job(job_id: str):
+    """
+    Report the status and progress of an ingestion job.
+
+    Args:
+        job_id (str): Id returned by the upload endpoint
+
+    Returns:
+        dict: Job status, progress (0-1), and results once completed
+    """
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.put("/{document_id}")
+async def replace_document(
+    document_id: str, file: UploadFile = File(...), collection: Optional[str] = COLLECTION_QUERY
+):
+    """
+    Replace a stored document with a new version.
+
+    The new version is ingested in the background; the old chunks stay
+    searchable until it is indexed, then are swapped out atomically.
 
-    # Extract text based on file type
-    if file.filename.lower().endswith(".pdf"):
-        text = extract_text_from_pdf(filepath)
-    elif file.filename.lower().endswith((".html", ".htm")):
-        text = extract_text_from_html(filepath)
-    else:
-        os.remove(filepath)  # Clean up the file
+    Args:
+        document_id (str): Id of the document to replace
+        file (UploadFile): The new version of the document
+        collection (str): Collection holding the document
+
+    Returns:
+        dict: Job id and document details
+    """
+    if not is_supported(file.filename):
         return {"error": "Unsupported file format. Please upload PDF or HTML files."}
+    embedder = await run_in_threadpool(get_collection, collection)
+    if not await run_in_threadpool(embedder.has_document, document_id):
+        raise HTTPException(status_code=404, detail="Document not found")
 
-    if not text.strip():
-        os.remove(filepath)  # Clean up the file
-        return {"error": "No text could be extracted from the document."}
-
-    print(f"🔹 Storing text embeddings for {len(text)} characters", flush=True)
-
-    # Document metadata
-    doc_metadata = {
-        "id": document_id,
-        "original_filename": original_filename,
-        "stored_filename": unique_filename,
-        "upload_timestamp": timestamp,
-        "file_path": filepath,
-        "file_size_bytes": os.path.getsize(filepath),
-        "character_count": len(text)
-    }
+    job = await queue_upload(file, document_id=document_id, collection=collection)
+    return job_response(job)
 
-    # Store text in search index with document metadata
-    chunks_processed = document_embedder.store_text_embeddings(
-        text, 
-        document_id=document_id, 
-        filename=original_filename
-    )
+@router.delete("/{document_id}")
+async def delete_document(document_id: str, collection: Optional[str] = COLLECTION_QUERY):
+    """
+    Delete a document from the index.
 
-    print(f"✅ Text embeddings stored successfully! Processed {chunks_processed} chunks.", flush=True)
+    Its chunks are excluded from search immediately and purged from disk by
+    background compaction.
 
-    return {
-        "message": "Document uploaded and processed successfully",
-        "document_id": document_id,
-        "filename": original_filename,
-        "chunks_processed": chunks_processed,
-        "character_count": len(text),
-        "timestamp": timestamp
-    }
\ No newline at end of file
+    Args:
+        document_id (str): Id of the document to delete
+        collection (str): Collection holding the document
+
+    Returns:
+        dict: The document id and number of chunks deleted
+    """
+    embedder = await run_in_threadpool(get_collection, collection)
+    deleted = await run_in_threadpool(embedder.delete_document, document_id)
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Document not found")
+    await run_in_threadpool(remove_stored_files, document_id, upload_dir(embedder))
+    return {"message": "Document deleted", "document_id": document_id, "chunks_deleted": deleted}
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from app.config import config
+
+
+def normalize_query(query):
+    """Lower-case and collapse whitespace/punctuation so trivial variants match."""
+    return " ".join(re.sub(r"[^\w\s]", " ", query.lower()).split())
+
+
+def context_fingerprint(chunks):
+    """
+    Hash the retrieved chunk set, in order.
+
+    Answers are only reused for the same context, so a new upload that
+    changes what a question retrieves naturally bypasses stale answers.
+    """
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        text = chunk.get("text", "") if isinstance(chunk, dict) else chunk
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class AnswerCache:
+    """
+    LRU/TTL cache of LLM answers keyed on (context fingerprint, question).
+
+    Lookups first try the exact normalized question, then the most similar
+    cached question (cosine similarity of query embeddings) with the same
+    context fingerprint.
+    """
+
+    def __init__(self, max_entries=None, ttl_seconds=None, similarity_threshold=None):
+        self.max_entries = max_entries or config.ANSWER_CACHE_SIZE
+        self.ttl_seconds = config.ANSWER_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.similarity_threshold = similarity_threshold or config.ANSWER_CACHE_SIMILARITY
+        self.entries = OrderedDict()
+        self.by_fingerprint = {}
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _expired(self, entry):
+        return self.ttl_seconds > 0 and time.monotonic() - entry["created"] > self.ttl_seconds
+
+    def _remove(self, key):
+        self.entries.pop(key, None)
+        keys = self.by_fingerprint.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.by_fingerprint[key[0]]
+
+    def get_exact(self, query, fingerprint):
+        """Return a cached answer for the same normalized question and context."""
+        key = (fingerprint, normalize_query(query))
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None or self._expired(entry):
+                if entry is not None:
+                    self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry["answer"]
+
+    def get_similar(self, query_embedding, fingerprint):
+        """Return the answer of the most similar cached question above the threshold."""
+        query_embedding = np.asarray(query_embedding, dtype=np.float32)
+        query_embedding = query_embedding / (np.linalg.norm(query_embedding) or 1.0)
+        with self._lock:
+            keys = [k for k in self.by_fingerprint.get(fingerprint, ()) if not self._expired(self.entries[k])]
+            if keys:
+                matrix = np.stack([self.entries[k]["embedding"] for k in keys])
+                similarities = matrix @ query_embedding
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.similarity_threshold:
+                    self.entries.move_to_end(keys[best])
+                    self.semantic_hits += 1
+                    return self.entries[keys[best]]["answer"]
+            self.misses += 1
+            return None
+
+    def put(self, query, fingerprint, query_embedding, answer):
+        """Store an answer, evicting the least recently used entries beyond capacity."""
+        key = (fingerprint, normalize_query(query))
+        embedding = np.asarray(query_embedding, dtype=np.float32)
+        embedding = embedding / (np.linalg.norm(embedding) or 1.0)
+        with self._lock:
+            self._remove(key)
+            self.entries[key] = {"answer": answer, "embedding": embedding, "created": time.monotonic()}
+            self.by_fingerprint.setdefault(fingerprint, set()).add(key)
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+            }
+
+
+async def replay_stream(answer):
+    """Replay a cached answer in the same SSE format as ask_llm_streaming."""
+    yield f"data: {json.dumps({'content': answer})}\n\n"
+    yield f"data: {json.dumps({'content': '', 'end': True})}\n\n"
+
+
+async def record_stream(events, cache, query, fingerprint, query_embedding):
+    """
+    Pass SSE events through and cache the full answer once the stream ends cleanly.
+
+    Streams that report an error or are cut short are not cached.
+    """
+    parts = []
+    completed = False
+    async for event in events:
+        yield event
+        payload = json.loads(event[len("data: "):])
+        if "error" in payload:
+            return
+        parts.append(payload.get("content", ""))
+        completed = completed or payload.get("end", False)
+    if completed:
+        cache.put(query, fingerprint, query_embedding, "".join(parts))
+
+
+# Create a singleton instance to be imported by other modules
+answer_cache = AnswerCache()
@@ -0,0 +1,224 @@
+import json
+import math
+import os
+import numpy as np
+
+
+def tokenize(text):
+    """Tokenize text the same way for indexing and querying."""
+    return text.split()
+
+
+def bm25_idf(document_frequency, corpus_size):
+    """Non-negative BM25 idf, so rare and common terms never cancel out."""
+    return math.log(1 + (corpus_size - document_frequency + 0.5) / (document_frequency + 0.5))
+
+
+class IncrementalBM25:
+    """
+    Inverted-index BM25 (Okapi) that can grow one batch of documents at a time.
+
+    Postings map each term to {doc_index: term_frequency}. Document frequency
+    is the size of a term's postings and the average document length is kept
+    as a running total, so adding documents never re-tokenizes the corpus and
+    scoring only touches the postings of the query terms. Document lengths
+    live in a growable float32 array, so scoring reads them in place.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}
+        self._doc_lengths = np.zeros(0, dtype=np.float32)
+        self._size = 0
+        self.total_length = 0
+
+    @property
+    def corpus_size(self):
+        return self._size
+
+    @property
+    def doc_lengths(self):
+        """Token count per document (a view, valid until the next add)."""
+        return self._doc_lengths[:self._size]
+
+    def _append_lengths(self, lengths):
+        lengths = np.asarray(lengths, dtype=np.float32)
+        needed = self._size + len(lengths)
+        if needed > len(self._doc_lengths):
+            # Grow geometrically so appends one document at a time stay amortized O(1)
+            grown = np.zeros(max(needed, 2 * len(self._doc_lengths), 1024), dtype=np.float32)
+            grown[:self._size] = self.doc_lengths
+            self._doc_lengths = grown
+        self._doc_lengths[self._size:needed] = lengths
+        self._size = needed
+
+    @property
+    def avgdl(self):
+        return self.total_length / self.corpus_size if self.corpus_size else 0.0
+
+    def add_documents(self, documents):
+        """
+        Add new documents to the index.
+
+        Args:
+            documents (list): Raw document strings, appended in order
+
+        Returns:
+            int: Index of the first added document
+        """
+        start = self.corpus_size
+        for offset, doc in enumerate(documents):
+            self.add_tokens(tokenize(doc), start + offset)
+        return start
+
+    def add_tokens(self, tokens, doc_index=None):
+        """Add a single pre-tokenized document at the next position."""
+        if doc_index is None:
+            doc_index = self.corpus_size
+        term_freqs = {}
+        for token in tokens:
+            term_freqs[token] = term_freqs.get(token, 0) + 1
+        for term, freq in term_freqs.items():
+            self.postings.setdefault(term, {})[doc_index] = freq
+        self._append_lengths([len(tokens)])
+        self.total_length += len(tokens)
+
+    def document_frequency(self, term):
+        return len(self.postings.get(term, ()))
+
+    def idf(self, term):
+        """Non-negative BM25 idf, so rare and common terms never cancel out."""
+        return bm25_idf(self.document_frequency(term), self.corpus_size)
+
+    def get_scores(self, query_tokens, idfs=None, avgdl=None):
+        """
+        Score every document against the query.
+
+        Only documents present in the query terms' postings are touched; the
+        rest keep a score of zero.
+
+        Args:
+            query_tokens (list): Tokenized query
+            idfs (dict): Per-term idf overrides, for scoring one part of a
+                larger corpus with corpus-wide statistics
+            avgdl (float): Average document length override, likewise
+
+        Returns:
+            np.ndarray: BM25 score per document
+        """
+        scores = np.zeros(self.corpus_size, dtype=np.float32)
+        if not self.corpus_size:
+            return scores
+
+        doc_lengths = self.doc_lengths
+        avgdl = avgdl or self.avgdl or 1.0
+        for term in set(query_tokens):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = idfs[term] if idfs is not None else self.idf(term)
+            doc_ids = np.fromiter(postings.keys(), dtype=np.int64, count=len(postings))
+            tfs = np.fromiter(postings.values(), dtype=np.float32, count=len(postings))
+            norm = self.k1 * (1 - self.b + self.b * doc_lengths[doc_ids] / avgdl)
+            scores[doc_ids] += idf * tfs * (self.k1 + 1) / (tfs + norm)
+        return scores
+
+    def get_scores_batch(self, query_token_lists, idfs=None, avgdl=None, start=0, end=None):
+        """
+        Score documents against several queries at once.
+
+        Each distinct term's postings are scored once and added to the rows
+        of every query containing it, so terms shared between queries cost
+        nothing extra. With a document range, each term costs at most the
+        size of the range, however common it is in the whole index.
+
+        Args:
+            start, end (int): Only score documents [start, end)
+
+        Returns:
+            np.ndarray: Scores of shape (queries, documents in range)
+        """
+        end = self.corpus_size if end is None else end
+        scores = np.zeros((len(query_token_lists), max(end - start, 0)), dtype=np.float32)
+        if end <= start:
+            return scores
+
+        rows_by_term = {}
+        for row, tokens in enumerate(query_token_lists):
+            for term in set(tokens):
+                rows_by_term.setdefault(term, []).append(row)
+
+        doc_lengths = self.doc_lengths[start:end]
+        avgdl = avgdl or self.avgdl or 1.0
+        whole = start == 0 and end == self.corpus_size
+        for term, rows in rows_by_term.items():
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = idfs[term] if idfs is not None else self.idf(term)
+            if whole or len(postings) <= end - start:
+                doc_ids = np.fromiter(postings.keys(), dtype=np.int64, count=len(postings))
+                tfs = np.fromiter(postings.values(), dtype=np.float32, count=len(postings))
+                if not whole:
+                    in_range = (doc_ids >= start) & (doc_ids < end)
+                    doc_ids, tfs = doc_ids[in_range] - start, tfs[in_range]
+            else:
+                # Common term, small range: look the range's documents up instead
+                tfs = np.fromiter((postings.get(doc, 0) for doc in range(start, end)), dtype=np.float32, count=end - start)
+                doc_ids = np.flatnonzero(tfs)
+                tfs = tfs[doc_ids]
+            norm = self.k1 * (1 - self.b + self.b * doc_lengths[doc_ids] / avgdl)
+            scores[np.ix_(rows, doc_ids)] += idf * tfs * (self.k1 + 1) / (tfs + norm)
+        return scores
+
+    @classmethod
+    def concat(cls, indexes):
+        """Combine indexes of consecutive document ranges into one."""
+        combined = cls(k1=indexes[0].k1, b=indexes[0].b) if indexes else cls()
+        for index in indexes:
+            offset = combined.corpus_size
+            for term, docs in index.postings.items():
+                target = combined.postings.setdefault(term, {})
+                for doc, freq in docs.items():
+                    target[doc + offset] = freq
+            combined._append_lengths(index.doc_lengths)
+            combined.total_length += index.total_length
+        return combined
+
+    def to_dict(self):
+        """Serialize index state to plain JSON types."""
+        return {
+            "k1": self.k1,
+            "b": self.b,
+            "doc_lengths": self.doc_lengths.astype(np.int64).tolist(),
+            "postings": {
+                term: [[doc, freq] for doc, freq in docs.items()]
+                for term, docs in self.postings.items()
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        """Restore an index produced by `to_dict`."""
+        index = cls(k1=state.get("k1", 1.5), b=state.get("b", 0.75))
+        index._append_lengths(state["doc_lengths"])
+        index.total_length = int(sum(state["doc_lengths"]))
+        index.postings = {
+            term: {doc: freq for doc, freq in docs}
+            for term, docs in state["postings"].items()
+        }
+        return index
+
+    def save(self, path):
+        """Persist the index to a JSON file."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Load an index persisted by `save`."""
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
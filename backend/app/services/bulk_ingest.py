@@ -0,0 +1,215 @@
+"""
+Bulk-ingest a directory or tarball of PDF/HTML documents.
+
+Text is extracted across a process pool, documents are embedded in large
+batches, and the BM25/FAISS checkpoints are written once at the end. A
+manifest of ingested files makes interrupted runs resumable.
+
+It can run while the API server is up: writes to the shared data directory
+are serialized by a file lock, and the server's workers pick up the new
+segments within INDEX_RELOAD_INTERVAL_SECONDS.
+
+Usage (from the backend directory):
+    python -m app.services.bulk_ingest /path/to/docs
+    python -m app.services.bulk_ingest archive.tar.gz --workers 8 --batch-docs 64
+    python -m app.services.bulk_ingest /path/to/papers --collection papers
+"""
+import argparse
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import multiprocessing
+from app.services.extractor import is_supported, iter_pages
+from app.services.segment_store import atomic_write_json
+
+DEFAULT_MANIFEST = "data/ingest_manifest.json"
+
+
+def load_manifest(path):
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def stat_signature(size, mtime):
+    return f"{size}:{int(mtime)}"
+
+
+def file_signature(path):
+    stat = os.stat(path)
+    return stat_signature(stat.st_size, stat.st_mtime)
+
+
+def discover_files(source, workdir, skip=None):
+    """
+    Yield (key, filepath, filename, signature) for every supported file in a directory or tarball.
+
+    Tarball members are extracted into `workdir` as they are reached; their
+    keys are prefixed with the archive path so the manifest stays stable
+    across runs.
+
+    Args:
+        skip (callable): Called with (key, signature); files it returns True
+            for are not yielded (nor extracted from the tarball)
+    """
+    skip = skip or (lambda key, signature: False)
+    if os.path.isdir(source):
+        for root, _, names in os.walk(source):
+            for name in sorted(names):
+                if is_supported(name):
+                    path = os.path.join(root, name)
+                    key, signature = os.path.abspath(path), file_signature(path)
+                    if not skip(key, signature):
+                        yield key, path, name, signature
+        return
+
+    with tarfile.open(source) as archive:
+        for member in archive:
+            if not member.isfile() or not is_supported(member.name):
+                continue
+            key = f"{os.path.abspath(source)}::{member.name}"
+            # Extraction keeps the member's size and mtime, so this matches file_signature
+            signature = stat_signature(member.size, member.mtime)
+            if skip(key, signature):
+                continue
+            target = os.path.join(workdir, f"{uuid.uuid4()}_{os.path.basename(member.name)}")
+            with archive.extractfile(member) as src, open(target, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.utime(target, (member.mtime, member.mtime))
+            yield key, target, os.path.basename(member.name), signature
+
+
+def extract_worker(key, filepath, filename):
+    """Process-pool entry point: extract (page, text) pairs, returning errors instead of raising."""
+    try:
+        # Files are already spread across processes, so pages are extracted serially
+        return key, filename, list(iter_pages(filepath, filename, workers=1)), None
+    except Exception as e:
+        return key, filename, None, str(e)
+
+
+def ingest(source, workers=None, batch_docs=32, manifest_path=None, collection=None):
+    """
+    Ingest every supported document under `source`.
+
+    Files are discovered, extracted and embedded as a stream: at most two
+    files per worker are extracted at a time, so memory (and for tarballs,
+    temp disk space) does not grow with the size of the corpus.
+
+    Args:
+        source (str): Directory or tar archive (optionally compressed)
+        workers (int): Extraction processes, defaults to the CPU count
+        batch_docs (int): Documents embedded and appended per batch
+        manifest_path (str): JSON manifest of already-ingested files
+            (default: ingest_manifest.json in the collection's directory)
+        collection (str): Collection to ingest into, created if needed
+            (None for the default collection)
+
+    Returns:
+        dict: Counts and throughput for the run
+    """
+    # Imported here so pool workers do not load the model and indexes
+    from app.services.collection_manager import collection_manager
+    document_embedder = collection_manager.get(collection, create=True)
+
+    manifest_path = manifest_path or os.path.join(document_embedder.data_dir, os.path.basename(DEFAULT_MANIFEST))
+    manifest = load_manifest(manifest_path)
+    stats = {"documents": 0, "chunks": 0, "skipped": 0, "duplicates": 0, "failed": 0}
+    start = time.perf_counter()
+
+    def commit(batch):
+        results = document_embedder.store_documents([
+            {"pages": pages, "document_id": document_id, "filename": filename}
+            for _, _, document_id, filename, pages in batch
+        ])
+        for (key, signature, document_id, filename, _), result in zip(batch, results):
+            manifest[key] = {
+                "document_id": result["duplicate_of"] or document_id,
+                "filename": filename,
+                "signature": signature,
+                "chunks": result["chunks"]
+            }
+            stats["chunks"] += result["chunks"]
+            stats["duplicates"] += result["duplicate_of"] is not None
+        stats["documents"] += len(batch)
+        # The segment for this batch is durable, so record it before moving on
+        atomic_write_json(manifest_path, manifest)
+        elapsed = time.perf_counter() - start
+        print(f"🔹 {stats['documents']} docs, {stats['chunks']} chunks "
+              f"({stats['documents'] / elapsed:.1f} docs/s, {stats['chunks'] / elapsed:.1f} chunks/s)", flush=True)
+
+    def already_ingested(key, signature):
+        if manifest.get(key, {}).get("signature") == signature:
+            stats["skipped"] += 1
+            return True
+        return False
+
+    with tempfile.TemporaryDirectory() as workdir:
+        print(f"🔄 Ingesting {source}...", flush=True)
+        batch = []
+        # Extracted files not yet consumed: future -> (signature, filepath)
+        pending = {}
+
+        def consume(futures):
+            nonlocal batch
+            for future in futures:
+                signature, filepath = pending.pop(future)
+                if filepath.startswith(workdir):
+                    # Extracted from a tarball: no longer needed
+                    os.remove(filepath)
+                key, filename, pages, error = future.result()
+                if error or not any(text.strip() for _, text in pages):
+                    stats["failed"] += 1
+                    print(f"❌ {key}: {error or 'No text could be extracted'}", flush=True)
+                    continue
+                batch.append((key, signature, str(uuid.uuid4()), filename, pages))
+                if len(batch) >= batch_docs:
+                    commit(batch)
+                    batch = []
+
+        workers = workers or os.cpu_count() or 1
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        with pool:
+            for key, filepath, filename, signature in discover_files(source, workdir, already_ingested):
+                pending[pool.submit(extract_worker, key, filepath, filename)] = (signature, filepath)
+                if len(pending) >= 2 * workers:
+                    consume(wait(pending, return_when=FIRST_COMPLETED).done)
+            while pending:
+                consume(wait(pending, return_when=FIRST_COMPLETED).done)
+        if batch:
+            commit(batch)
+
+    # Single BM25/FAISS checkpoint for the whole run
+    document_embedder.compact()
+
+    elapsed = time.perf_counter() - start
+    stats.update(
+        seconds=elapsed,
+        docs_per_second=stats["documents"] / elapsed if elapsed else 0.0,
+        chunks_per_second=stats["chunks"] / elapsed if elapsed else 0.0,
+    )
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="Directory or tar archive of PDF/HTML files")
+    parser.add_argument("--workers", type=int, default=None, help="Extraction processes (default: CPU count)")
+    parser.add_argument("--batch-docs", type=int, default=32, help="Documents per embedding batch")
+    parser.add_argument("--manifest", default=None, help=f"Manifest path (default: {DEFAULT_MANIFEST} or the collection's)")
+    parser.add_argument("--collection", default=None, help="Collection to ingest into (default: the default collection)")
+    args = parser.parse_args()
+
+    result = ingest(
+        args.source, workers=args.workers, batch_docs=args.batch_docs,
+        manifest_path=args.manifest, collection=args.collection
+    )
+    print(f"✅ Ingested {result['documents']} documents ({result['chunks']} chunks) in {result['seconds']:.1f}s: "
+          f"{result['docs_per_second']:.1f} docs/s, {result['chunks_per_second']:.1f} chunks/s. "
+          f"Skipped {result['skipped']}, duplicates {result['duplicates']}, failed {result['failed']}.", flush=True)
@@ -0,0 +1,138 @@
+import re
+import threading
+import numpy as np
+from app.config import config
+
+# Sentence ends: terminal punctuation (plus closing quotes/brackets) followed
+# by whitespace, or a blank line
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])[\"')\]]*\s+|\n\s*\n")
+
+
+def split_sentences(text):
+    """Return (start, end) character spans of the sentences in text."""
+    spans = []
+    start = 0
+    for match in SENTENCE_BOUNDARY.finditer(text):
+        end = match.start() + len(match.group().rstrip())
+        if text[start:end].strip():
+            spans.append((start, end))
+        start = match.end()
+    if text[start:].strip():
+        spans.append((start, len(text.rstrip())))
+    return spans
+
+
+class TokenChunker:
+    """
+    Splits documents into chunks that fit the embedding model's input.
+
+    Each page's sentences are tokenized in one batch call of the model's
+    fast tokenizer. Sentences are packed greedily into chunks of at most
+    CHUNK_MAX_TOKENS tokens (including the model's special tokens), with
+    trailing sentences of up to CHUNK_OVERLAP_TOKENS repeated at the start
+    of the next chunk. Sentences longer than a whole chunk are cut at token
+    boundaries. Pages are consumed one at a time, so documents can be
+    streamed.
+    """
+
+    def __init__(self, model_name=None, max_tokens=None, overlap_tokens=None, tokenizer=None):
+        self.model_name = model_name or config.EMBEDDING_MODEL
+        self.max_tokens = max_tokens or config.CHUNK_MAX_TOKENS
+        self.overlap_tokens = config.CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+        self._tokenizer = tokenizer
+        self._load_lock = threading.Lock()
+
+    @property
+    def tokenizer(self):
+        """The model's fast tokenizer, loaded on first use."""
+        if self._tokenizer is None:
+            with self._load_lock:
+                if self._tokenizer is None:
+                    from tokenizers import Tokenizer
+                    tokenizer = Tokenizer.from_pretrained(self.model_name)
+                    tokenizer.no_truncation()
+                    tokenizer.no_padding()
+                    self._tokenizer = tokenizer
+        return self._tokenizer
+
+    @property
+    def budget(self):
+        """Tokens available for text once the special tokens are added."""
+        return self.max_tokens - self.tokenizer.num_special_tokens_to_add(False)
+
+    def _units(self, page_number, text):
+        """
+        Split a page into (page, text, start, end, tokens) units of at most
+        `budget` tokens: whole sentences, or token-aligned pieces of longer ones.
+        """
+        spans = split_sentences(text)
+        if not spans:
+            return []
+        budget = self.budget
+        encodings = self.tokenizer.encode_batch([text[s:e] for s, e in spans], add_special_tokens=False)
+        lengths = np.fromiter((len(e.ids) for e in encodings), dtype=np.int64, count=len(encodings))
+
+        units = []
+        for (start, end), length, encoding in zip(spans, lengths, encodings):
+            if length == 0:
+                continue
+            if length <= budget:
+                units.append((page_number, text, start, end, int(length)))
+                continue
+            offsets = encoding.offsets
+            for lo in range(0, int(length), budget):
+                hi = min(lo + budget, int(length))
+                units.append((page_number, text, start + offsets[lo][0], start + offsets[hi - 1][1], hi - lo))
+        return units
+
+    def _emit(self, window):
+        """Build a chunk dict from consecutive units."""
+        parts = []
+        first = 0
+        for i in range(1, len(window) + 1):
+            # Join runs of units from the same page as one slice of the page
+            if i == len(window) or window[i][0] != window[first][0] or window[i][1] is not window[first][1]:
+                parts.append(window[first][1][window[first][2]:window[i - 1][3]])
+                first = i
+        return {
+            "text": "\n".join(parts),
+            "page_start": window[0][0],
+            "page_end": window[-1][0],
+            "char_start": window[0][2],
+            "char_end": window[-1][3],
+            "token_count": sum(unit[4] for unit in window),
+        }
+
+    def chunk_pages(self, pages):
+        """
+        Stream chunks out of (page number, text) pairs.
+
+        Yields:
+            dict: "text", "page_start"/"page_end" (page numbers, None
+                without pages), "char_start" (offset in the first page),
+                "char_end" (offset in the last page) and "token_count"
+        """
+        budget = self.budget
+        window = []
+        window_tokens = 0
+        for page_number, text in pages:
+            for unit in self._units(page_number, text):
+                if window and window_tokens + unit[4] > budget:
+                    yield self._emit(window)
+                    # Carry trailing sentences forward as overlap
+                    keep = len(window)
+                    overlap = 0
+                    while keep > 0 and overlap + window[keep - 1][4] <= self.overlap_tokens \
+                            and overlap + window[keep - 1][4] + unit[4] <= budget:
+                        keep -= 1
+                        overlap += window[keep][4]
+                    window = window[keep:]
+                    window_tokens = overlap
+                window.append(unit)
+                window_tokens += unit[4]
+        if window:
+            yield self._emit(window)
+
+    def chunk_text(self, text):
+        """Chunk a single text without page numbers, returning the chunk strings."""
+        return [chunk["text"] for chunk in self.chunk_pages([(None, text)])]
@@ -0,0 +1,156 @@
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from app.config import config
+from app.services.embedder import DocumentEmbedder, document_embedder
+
+logger = logging.getLogger(__name__)
+
+# The collection stored directly in the data directory, used when none is named
+DEFAULT_COLLECTION = "default"
+# Collection names become directory names, so only allow safe characters
+COLLECTION_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
+
+
+class CollectionNotFound(KeyError):
+    """Raised for a collection that has never been created."""
+
+
+class CollectionManager:
+    """
+    Named document collections, each with its own segment store and indexes.
+
+    The default collection lives in `data/` and is always loaded. Other
+    collections live in COLLECTIONS_DIR/<name> and are loaded on first
+    access; once more than `max_loaded` collections (or more than
+    `max_chunks` chunks in total) are in memory, the least recently used
+    ones are closed and dropped until they are needed again. All
+    collections share one embedding model.
+
+    Eviction only drops the manager's reference: a request still holding an
+    evicted collection finishes normally. Its writes stay safe because all
+    instances of a collection serialize on the store's file lock, as with
+    several worker processes.
+
+    Args:
+        default (DocumentEmbedder): The default collection
+        root (str): Directory holding the named collections
+        max_loaded (int): Named collections kept in memory
+        max_chunks (int): Chunks kept in memory across named collections
+            (0 for no limit)
+    """
+
+    def __init__(self, default, root=None, max_loaded=None, max_chunks=None):
+        self.default = default
+        self.root = root or config.COLLECTIONS_DIR
+        self.max_loaded = config.COLLECTIONS_MAX_LOADED if max_loaded is None else max_loaded
+        self.max_chunks = config.COLLECTIONS_MAX_CHUNKS if max_chunks is None else max_chunks
+        self.loaded = OrderedDict()
+        self.loads = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # Per-collection locks, so one slow load does not block other collections
+        self._load_locks = {}
+
+    @staticmethod
+    def validate(name):
+        """Raise ValueError for names that are not valid collection names."""
+        if not COLLECTION_NAME.match(name):
+            raise ValueError(
+                "Collection names must start with a letter or digit and contain at most 64 "
+                "letters, digits, '-' or '_'"
+            )
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    def exists(self, name):
+        return name in (None, DEFAULT_COLLECTION) or os.path.isdir(self.path(name))
+
+    def get(self, name=None, create=False):
+        """
+        Return a collection's embedder, loading it if needed.
+
+        Args:
+            name (str): Collection name (None for the default collection)
+            create (bool): Create the collection if it does not exist
+
+        Returns:
+            DocumentEmbedder: The collection's embedder
+
+        Raises:
+            ValueError: The name is not a valid collection name
+            CollectionNotFound: The collection does not exist and create is False
+        """
+        if name is None or name == DEFAULT_COLLECTION:
+            return self.default
+        self.validate(name)
+        with self._lock:
+            embedder = self.loaded.get(name)
+            if embedder is not None:
+                self.loaded.move_to_end(name)
+                return embedder
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                embedder = self.loaded.get(name)
+            if embedder is None:
+                if not create and not os.path.isdir(self.path(name)):
+                    raise CollectionNotFound(name)
+                logger.info("🔄 Loading collection %s...", name)
+                embedder = DocumentEmbedder(data_dir=self.path(name), share_models_with=self.default)
+                with self._lock:
+                    self.loaded[name] = embedder
+                    self.loads += 1
+
+        with self._lock:
+            self.loaded.move_to_end(name)
+            evicted = self._evict()
+        for evicted_name, evicted_embedder in evicted:
+            logger.info("🗑️ Evicting collection %s from memory", evicted_name)
+            # Checkpointing may take a while, so do not hold up this request
+            threading.Thread(target=evicted_embedder.close, daemon=True).start()
+        return embedder
+
+    def _evict(self):
+        """Drop least recently used collections over the budget. Caller holds the lock."""
+        evicted = []
+        while len(self.loaded) > 1 and (
+            len(self.loaded) > self.max_loaded
+            or (self.max_chunks and sum(len(e.snapshot()) for e in self.loaded.values()) > self.max_chunks)
+        ):
+            name, embedder = self.loaded.popitem(last=False)
+            self._load_locks.pop(name, None)
+            evicted.append((name, embedder))
+            self.evictions += 1
+        return evicted
+
+    def names(self):
+        """Every collection on disk, the default first."""
+        names = []
+        if os.path.isdir(self.root):
+            names = sorted(
+                name for name in os.listdir(self.root)
+                if COLLECTION_NAME.match(name) and os.path.isdir(self.path(name))
+            )
+        return [DEFAULT_COLLECTION] + [name for name in names if name != DEFAULT_COLLECTION]
+
+    def stats(self):
+        with self._lock:
+            loaded = {name: len(embedder.snapshot()) for name, embedder in self.loaded.items()}
+            return {
+                "collections": self.names(),
+                "loaded": loaded,
+                "loaded_chunks": sum(loaded.values()),
+                "max_loaded": self.max_loaded,
+                "max_chunks": self.max_chunks,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
+
+
+# Create a singleton instance to be imported by other modules
+collection_manager = CollectionManager(document_embedder)
@@ -0,0 +1,202 @@
+import re
+import threading
+from app.config import config
+from app.services.chunker import TokenChunker
+from app.services.metrics import context_tokens
+
+# Separator between passages in the prompt
+PASSAGE_SEPARATOR = "\n\n---\n\n"
+# Words per shingle when comparing passages for near-duplicates
+SHINGLE_WORDS = 3
+WORD = re.compile(r"\w+")
+
+_chunker = None
+_chunker_lock = threading.Lock()
+
+
+def count_tokens(text):
+    """
+    Tokens in text, counted with the embedding model's tokenizer.
+
+    The LLM's own tokenizer is not available locally; for English text the
+    two counts are close enough to budget a prompt.
+    """
+    global _chunker
+    if _chunker is None:
+        with _chunker_lock:
+            if _chunker is None:
+                _chunker = TokenChunker()
+    return len(_chunker.tokenizer.encode(text, add_special_tokens=False).ids)
+
+
+def shingles(text):
+    """Set of overlapping word triples, for near-duplicate detection."""
+    words = WORD.findall(text.lower())
+    if len(words) < SHINGLE_WORDS:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def overlap_length(first, second):
+    """Length of the longest suffix of `first` that is a prefix of `second`."""
+    probe = second[:32]
+    if not probe:
+        return 0
+    position = first.find(probe)
+    while position != -1:
+        if second.startswith(first[position:]):
+            return len(first) - position
+        position = first.find(probe, position + 1)
+    return 0
+
+
+class Passage:
+    """Consecutive chunks of one document, merged into one span of text."""
+
+    def __init__(self, chunk, rank, tokens):
+        metadata = chunk.get("metadata", {})
+        self.document_id = metadata.get("document_id")
+        self.first_index = self.last_index = metadata.get("chunk_index")
+        self.text = chunk["text"]
+        self.tokens = tokens
+        self.rank = rank
+        self.chunks = [chunk]
+
+    def adjacent(self, chunk):
+        """-1 if the chunk directly precedes this passage, 1 if it directly follows it, else 0."""
+        metadata = chunk.get("metadata", {})
+        if self.document_id is None or metadata.get("document_id") != self.document_id:
+            return 0
+        index = metadata.get("chunk_index")
+        if index is None or self.first_index is None:
+            return 0
+        if index == self.first_index - 1:
+            return -1
+        if index == self.last_index + 1:
+            return 1
+        return 0
+
+    def new_text(self, text, side):
+        """The part of an adjacent chunk's text that does not repeat this passage."""
+        if side > 0:
+            overlap = overlap_length(self.text, text)
+            return text[overlap:] if overlap else "\n" + text
+        overlap = overlap_length(text, self.text)
+        return text[:len(text) - overlap] if overlap else text + "\n"
+
+    def extend(self, chunk, side, text, tokens):
+        """Add the new part of an adjacent chunk (see `new_text`)."""
+        if side < 0:
+            self.text = text + self.text
+            self.first_index -= 1
+        else:
+            self.text = self.text + text
+            self.last_index += 1
+        self.tokens += tokens
+        self.chunks.append(chunk)
+
+    def absorb(self, following):
+        """Append the passage that directly follows this one."""
+        text = self.new_text(following.text, 1)
+        self.tokens += count_tokens(text)
+        self.text += text
+        self.last_index = following.last_index
+        self.rank = min(self.rank, following.rank)
+        self.chunks.extend(following.chunks)
+
+
+def build_context(chunks, max_tokens=None, duplicate_similarity=None):
+    """
+    Assemble the prompt context from search results within a token budget.
+
+    Chunks are taken in relevance order until the budget is full; a chunk
+    that does not fit is skipped in favour of smaller, less relevant ones.
+    A chunk whose text is mostly contained in an already chosen chunk
+    (such as the overlap repeated between consecutive chunks) is dropped,
+    and consecutive chunks of the same document are merged into a single
+    passage with their shared overlap written once. Passages appear in the
+    order of their most relevant chunk.
+
+    Args:
+        chunks (list): Search results (dicts with "text" and "metadata") or
+            plain strings, most relevant first
+        max_tokens (int): Token budget (default CONTEXT_MAX_TOKENS; 0 or
+            less means no limit)
+        duplicate_similarity (float): Share of a chunk's word triples found
+            in a chosen chunk above which it counts as a duplicate (default
+            CONTEXT_DUPLICATE_SIMILARITY)
+
+    Returns:
+        dict: "text" (the context), "tokens" in it, "passages" and
+            "chunks" used, "duplicates" dropped and "over_budget" chunks
+            skipped
+    """
+    max_tokens = config.CONTEXT_MAX_TOKENS if max_tokens is None else max_tokens
+    if duplicate_similarity is None:
+        duplicate_similarity = config.CONTEXT_DUPLICATE_SIMILARITY
+    separator_tokens = count_tokens(PASSAGE_SEPARATOR)
+
+    passages = []
+    chosen_shingles = []
+    used = duplicates = over_budget = 0
+    tokens = 0
+    for rank, chunk in enumerate(chunks):
+        if not isinstance(chunk, dict):
+            chunk = {"text": chunk, "metadata": {}}
+        text = chunk["text"]
+        if not text.strip():
+            continue
+
+        chunk_shingles = shingles(text)
+        if chunk_shingles and any(
+            len(chunk_shingles & seen) >= duplicate_similarity * len(chunk_shingles) for seen in chosen_shingles
+        ):
+            duplicates += 1
+            continue
+
+        # Only the part not already in a neighbouring passage costs tokens
+        passage, side = next(((p, p.adjacent(chunk)) for p in passages if p.adjacent(chunk)), (None, 0))
+        if passage is not None:
+            new_text = passage.new_text(text, side)
+            cost = count_tokens(new_text) if new_text.strip() else 0
+        else:
+            token_count = chunk.get("metadata", {}).get("token_count")
+            cost = token_count if token_count is not None else count_tokens(text)
+
+        separator = separator_tokens if passage is None and passages else 0
+        if max_tokens > 0 and tokens + cost + separator > max_tokens:
+            over_budget += 1
+            continue
+        if passage is not None:
+            passage.extend(chunk, side, new_text, cost)
+            # The chunk may have closed the gap to the next passage of the document
+            following = next((
+                other for other in passages
+                if other.document_id == passage.document_id and other.first_index == passage.last_index + 1
+            ), None)
+            preceding = next((
+                other for other in passages
+                if other.document_id == passage.document_id and other.last_index == passage.first_index - 1
+            ), None)
+            if following is not None:
+                passage.absorb(following)
+                passages.remove(following)
+            elif preceding is not None:
+                preceding.absorb(passage)
+                passages.remove(passage)
+        else:
+            passages.append(Passage(chunk, rank, cost))
+        chosen_shingles.append(chunk_shingles)
+        tokens = sum(p.tokens for p in passages) + separator_tokens * (len(passages) - 1)
+        used += 1
+
+    passages.sort(key=lambda p: p.rank)
+    context_tokens.observe(tokens)
+    return {
+        "text": PASSAGE_SEPARATOR.join(passage.text for passage in passages),
+        "tokens": tokens,
+        "passages": len(passages),
+        "chunks": used,
+        "duplicates": duplicates,
+        "over_budget": over_budget,
+    }
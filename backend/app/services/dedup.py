@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+
+
+def content_hash(text):
+    """Hash text with whitespace collapsed, so re-extracted copies match."""
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+
+class StreamingContentHash:
+    """content_hash of text that arrives in pieces (e.g. pages), joined by whitespace."""
+
+    def __init__(self):
+        self._hash = hashlib.sha256()
+        self._empty = True
+
+    def update(self, text):
+        words = text.split()
+        if words:
+            self._hash.update((("" if self._empty else " ") + " ".join(words)).encode("utf-8"))
+            self._empty = False
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+
+class DedupIndex:
+    """
+    Content hashes of stored documents and chunks.
+
+    Maps document hashes to their document id and chunk hashes to the
+    position of a stored chunk, so duplicate documents can be skipped and
+    repeated chunks can reuse an existing embedding instead of re-encoding.
+    Also tracks the contiguous range of positions holding each document's
+    chunks and its upload time, for deletion and filtered search.
+    """
+
+    def __init__(self):
+        self.documents = {}
+        self.chunks = {}
+        self.document_ranges = {}
+        self.document_uploaded = {}
+        self.covered = 0
+        self.stats = {
+            "skipped_documents": 0,
+            "skipped_chunks": 0,
+            "skipped_bytes": 0,
+            "reused_embeddings": 0,
+        }
+
+    def add(self, position, metadata, text):
+        """Record a stored chunk (called in position order)."""
+        document_id = metadata.get("document_id")
+        document_range = self.document_ranges.get(document_id)
+        if document_range and sum(document_range) == position:
+            document_range[1] += 1
+        else:
+            if document_range:
+                # A later version of a replaced document supersedes the old one
+                self.remove_document(document_id)
+            self.document_ranges[document_id] = [position, 1]
+            self.document_uploaded[document_id] = metadata.get("uploaded_at")
+        chunk_hash = metadata.get("content_hash") or content_hash(text)
+        self.chunks.setdefault(chunk_hash, position)
+        if metadata.get("document_hash"):
+            self.documents.setdefault(metadata["document_hash"], document_id)
+        self.covered = position + 1
+
+    def remove_document(self, document_id):
+        """
+        Forget a document so it can be uploaded again.
+
+        Returns:
+            range: Positions of the document's chunks (empty if unknown)
+        """
+        start, count = self.document_ranges.pop(document_id, (0, 0))
+        self.document_uploaded.pop(document_id, None)
+        for document_hash in [h for h, d in self.documents.items() if d == document_id]:
+            del self.documents[document_hash]
+        return range(start, start + count)
+
+    def document_table(self):
+        """Map each stored document id to (start, end, uploaded_at)."""
+        return {
+            document_id: (start, start + count, self.document_uploaded.get(document_id))
+            for document_id, (start, count) in self.document_ranges.items()
+        }
+
+    def record_skipped_document(self, chunk_count, text_bytes, vector_bytes):
+        self.stats["skipped_documents"] += 1
+        self.stats["skipped_chunks"] += chunk_count
+        self.stats["skipped_bytes"] += text_bytes + chunk_count * vector_bytes
+
+    def report(self, total_chunks, vector_bytes):
+        """
+        Summarize duplication across the store.
+
+        Args:
+            total_chunks (int): Chunks currently stored
+            vector_bytes (int): Bytes per stored embedding
+
+        Returns:
+            dict: Unique/duplicate counts and bytes saved by deduplication
+        """
+        duplicate_chunks = total_chunks - len(self.chunks)
+        return {
+            "documents": len(self.documents),
+            "total_chunks": total_chunks,
+            "unique_chunks": len(self.chunks),
+            "duplicate_chunks": duplicate_chunks,
+            **self.stats,
+            "embedding_bytes_saved": self.stats["reused_embeddings"] * vector_bytes,
+            "bytes_saved": self.stats["skipped_bytes"],
+        }
+
+    def copy(self):
+        """An independent copy, to save while this index keeps changing."""
+        index = DedupIndex()
+        index.documents = dict(self.documents)
+        index.chunks = dict(self.chunks)
+        index.document_ranges = {document_id: list(r) for document_id, r in self.document_ranges.items()}
+        index.document_uploaded = dict(self.document_uploaded)
+        index.covered = self.covered
+        index.stats = dict(self.stats)
+        return index
+
+    def save(self, path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "documents": self.documents,
+                "chunks": self.chunks,
+                "document_ranges": self.document_ranges,
+                "document_uploaded": self.document_uploaded,
+                "covered": self.covered,
+                "stats": self.stats,
+            }, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        index = cls()
+        index.documents = state["documents"]
+        index.chunks = state["chunks"]
+        index.document_ranges = state.get("document_ranges", {})
+        index.document_uploaded = state.get("document_uploaded", {})
+        index.covered = state["covered"]
+        index.stats.update(state.get("stats", {}))
+        return index
@@ -1,202 +1,1122 @@
+import copy
 import faiss
 import numpy as np
 import json
+import logging
 import os
-from rank_bm25 import BM25Okapi
-from sentence_transformers import SentenceTransformer
+import queue
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from contextlib import contextmanager
+from app.services.bm25 import IncrementalBM25, tokenize
+from app.services.cache import LRUCache, MISSING
+from app.services.chunker import TokenChunker
+from app.services.dedup import DedupIndex, StreamingContentHash, content_hash
+from app.services.embedding_backends import create_backend
+from app.services.fusion import STRATEGIES as FUSION_STRATEGIES, hybrid_rank
+from app.services.metrics import ingest_stage_seconds, search_seconds, search_stage_seconds
+from app.config import config
+from app.services.segment_store import SegmentStore, atomic_write_json
+from app.services.snapshot import IndexLayer, IndexSnapshot
+from app.services.vector_index import add_vectors, all_vectors, index_type_of, migrate_index, min_training_vectors
+
+logger = logging.getLogger(__name__)
+
+# Objects whose background threads must be started again in forked children
+_thread_owners = weakref.WeakSet()
+
+def _restart_threads_after_fork():
+    """
+    Threads do not survive fork, so workers forked after import (e.g.
+    gunicorn --preload) would otherwise never batch, compact or reload.
+    """
+    for owner in list(_thread_owners):
+        owner._start_threads()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_threads_after_fork)
+
+class QueryEncodingBatcher:
+    """
+    Coalesces concurrent single-query encodes into one batched forward pass.
+
+    The first waiting query opens a window of `window_seconds`; every query
+    arriving within it (up to `max_batch_size`) is encoded together and each
+    caller receives its own vector.
+    """
+
+    def __init__(self, encode_fn, max_batch_size=64, window_seconds=0.002):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.window_seconds = window_seconds
+        self.batches = 0
+        self.queries = 0
+        self._start_threads()
+        _thread_owners.add(self)
+
+    def _start_threads(self):
+        # A fresh queue: the parent's may still list its now missing thread as a waiter
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def encode(self, query):
+        """Encode one query, blocking until its batch has been processed."""
+        future = Future()
+        self._queue.put((query, future))
+        return future.result()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window_seconds
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                embeddings = np.array(self.encode_fn([query for query, _ in batch]))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.queries += len(batch)
+            for (_, future), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "queries": self.queries,
+            "mean_batch_size": self.queries / self.batches if self.batches else 0.0,
+        }
 
 class DocumentEmbedder:
-    def __init__(self, model_name="sentence-transformers/all-MiniLM-L6-v2"):
-        """Initialize the document embedder with specified model."""
+    def __init__(self, model_name=None, backend=None, data_dir="data", share_models_with=None):
+        """
+        Initialize the document embedder with specified model and backend.
+
+        Args:
+            model_name (str): Embedding model, defaults to EMBEDDING_MODEL
+            backend (str): Embedding backend, defaults to EMBEDDING_BACKEND
+            data_dir (str): Directory holding this store's segments and indexes
+            share_models_with (DocumentEmbedder): Reuse this embedder's model,
+                tokenizer, query embedding cache and query batcher instead of
+                loading new ones (for several collections in one process)
+        """
         # Paths for saving index
-        self.BM25_FILE = "data/bm25_corpus.json"
-        self.METADATA_FILE = "data/chunk_metadata.json"
-        self.FAISS_FILE = "data/faiss.index"
+        self.data_dir = data_dir
+        self.SEGMENTS_DIR = os.path.join(data_dir, "segments")
+        self.BM25_INDEX_FILE = os.path.join(data_dir, "bm25_index.json")
+        self.DEDUP_FILE = os.path.join(data_dir, "dedup_index.json")
+        self.CHECKPOINT_FILE = os.path.join(data_dir, "checkpoint.json")
+        self.FAISS_FILE = os.path.join(data_dir, "faiss.index")
+
+        # Legacy whole-file layout, migrated into segments on first load
+        self.BM25_FILE = os.path.join(data_dir, "bm25_corpus.json")
+        self.METADATA_FILE = os.path.join(data_dir, "chunk_metadata.json")
         
         # Create data directory if it doesn't exist
-        os.makedirs("data", exist_ok=True)
+        os.makedirs(data_dir, exist_ok=True)
         
-        # Initialize embedding model
-        self.embedder = SentenceTransformer(model_name)
+        # Initialize embedding model (loaded lazily on first encode)
+        if share_models_with is not None:
+            self.embedder = share_models_with.embedder
+            self.chunker = share_models_with.chunker
+        else:
+            self.embedder = create_backend(backend, model_name)
+            if config.EMBEDDING_PRELOAD:
+                self.embedder.load()
+            self.chunker = TokenChunker(self.embedder.model_name)
         
-        # Initialize indices
-        self.bm25_corpus = []
-        self.chunk_metadata = []
-        self.bm25_index = None
-        self.faiss_index = None
+        # Initialize indices; chunk text and metadata are read lazily from segments
+        self.store = SegmentStore(self.SEGMENTS_DIR)
+        self.dedup_index = DedupIndex()
+        self._checkpoint_dirty = False
+        # Writers (uploads, deletes, compaction) serialize on the write lock,
+        # and with other processes on the store's file lock (see _writing);
+        # searches only ever read the current snapshot
+        self._write_lock = threading.RLock()
+        self._compaction_lock = threading.Lock()
+        self._compaction_wanted = threading.Event()
+        self._snapshot = IndexSnapshot(self.store.view(), [], 0)
+        # Layer backed by the memory-mapped checkpoint files, if any
+        self._checkpoint_layer = None
+        # Search results are per store; query embeddings only depend on the model
+        self.search_cache = LRUCache(config.SEARCH_CACHE_SIZE)
+        if share_models_with is not None:
+            self.query_embedding_cache = share_models_with.query_embedding_cache
+            self.query_batcher = share_models_with.query_batcher
+        else:
+            self.query_embedding_cache = LRUCache(config.QUERY_EMBEDDING_CACHE_SIZE)
+
+            # Micro-batch concurrent query encodes (disabled with a zero window)
+            self.query_batcher = None
+            if config.QUERY_BATCH_WINDOW_MS > 0 and config.QUERY_BATCH_MAX_SIZE > 1:
+                self.query_batcher = QueryEncodingBatcher(
+                    self.embedder.encode,
+                    max_batch_size=config.QUERY_BATCH_MAX_SIZE,
+                    window_seconds=config.QUERY_BATCH_WINDOW_MS / 1000
+                )
+        # Set by close() to stop the background threads
+        self._closed = threading.Event()
         
         # Load existing indices if available
         self.load_indexes()
 
-    def chunk_text(self, text, chunk_size=512, overlap=50):
-        """Split text into overlapping chunks of roughly equal size."""
-        words = text.split()
-        chunks = []
-        
-        for i in range(0, len(words), chunk_size - overlap):
-            chunk = ' '.join(words[i:i + chunk_size])
-            if len(chunk.strip()) > 0:
-                chunks.append(chunk)
-        
-        # If no chunks were created or text is very short, use the original text
-        if not chunks and text.strip():
-            chunks = [text]
-            
-        return chunks
-
-    def load_indexes(self):
-        """Loads BM25 and FAISS indexes from disk if available."""
-        print("🔄 Loading indexes from disk...", flush=True)
-
-        # Load BM25 corpus
-        if os.path.exists(self.BM25_FILE):
-            with open(self.BM25_FILE, "r", encoding="utf-8") as f:
-                self.bm25_corpus = json.load(f)
-            print(f"✅ Loaded BM25 corpus with {len(self.bm25_corpus)} documents.", flush=True)
-
-            tokenized_corpus = [doc.split() for doc in self.bm25_corpus]
-            self.bm25_index = BM25Okapi(tokenized_corpus)
-            print("✅ BM25 index rebuilt.", flush=True)
-        else:
-            print("❌ No BM25 corpus found.", flush=True)
+        self._start_threads()
+        _thread_owners.add(self)
+
+    def _start_threads(self):
+        if self._closed.is_set():
+            return
+        # Merge segments and checkpoint indexes in the background
+        threading.Thread(target=self._compaction_loop, daemon=True).start()
+
+        # Pick up uploads, deletes and compactions made by other worker processes
+        if config.INDEX_RELOAD_INTERVAL_SECONDS > 0:
+            threading.Thread(target=self._reload_loop, daemon=True).start()
+
+    def chunk_text(self, text):
+        """Split text into sentence-aligned chunks that fit the embedding model."""
+        return self.chunker.chunk_text(text)
+
+    def chunk_pages(self, pages):
+        """Stream chunk dicts (text, pages, offsets, token count) out of (page number, text) pairs."""
+        return self.chunker.chunk_pages(pages)
+
+    def snapshot(self):
+        """The current immutable index snapshot; all reads of one search should use it."""
+        return self._snapshot
+
+    @property
+    def generation(self):
+        """Bumped with every published snapshot; part of the search cache key."""
+        return self._snapshot.generation
+
+    def _publish(self, layers=None):
+        """
+        Swap in a snapshot of the current store view. Caller holds the write lock.
+
+        Args:
+            layers (list): New index layers, defaults to the current ones
+        """
+        layers = self._snapshot.layers if layers is None else layers
+        self._snapshot = IndexSnapshot(
+            self.store.view(), layers, self._snapshot.generation + 1, self.dedup_index.document_table()
+        )
+        if len(layers) >= config.COMPACTION_MIN_SEGMENTS:
+            # Every layer costs a search, so fold them without waiting for the timer
+            self._compaction_wanted.set()
+
+    @contextmanager
+    def _writing(self):
+        """
+        Hold the write lock across threads and processes, caught up with the store.
+
+        Other workers may have changed the shared store since this process
+        last looked, so the snapshot is refreshed before any write.
+        """
+        with self._write_lock, self.store.write_lock:
+            self._refresh_locked()
+            yield
+
+    def refresh(self):
+        """Publish changes other processes made to the shared store."""
+        with self._writing():
+            pass
+
+    def _refresh_locked(self):
+        """
+        Catch up with the store manifest. Caller holds both write locks.
+
+        New segments get a layer of their own and new tombstones are
+        applied, so an incremental refresh costs as much as indexing the
+        new chunks. Only after a purging compaction, which renumbers every
+        position, are the indexes reloaded from the checkpoints.
+        """
+        previous = self.store.refresh()
+        if previous is None:
+            return
+        _, previous_epoch = previous
+        if self.store.epoch != previous_epoch:
+            logger.info("🔄 Store was compacted by another process, reloading indexes...")
+            self.load_indexes(remove_orphans=False)
+            return
+
+        layers = self._snapshot.layers
+        covered = layers[-1].end if layers else 0
+        total = len(self.store)
+        if covered < total:
+            layers = layers + (IndexLayer.build(covered, self.store.texts[covered:], self.store.vectors(covered)),)
+            for position in range(covered, total):
+                record = self.store.record(position)
+                self.dedup_index.add(position, record["metadata"], record["text"])
+        self._forget_deleted_documents()
+        self._publish(layers)
+        logger.info("🔄 Reloaded shared store: %s chunks, generation %s.", total, self.generation)
+
+    def _reload_loop(self):
+        while not self._closed.wait(config.INDEX_RELOAD_INTERVAL_SECONDS):
+            # One stat call per tick; the locks are only taken when something changed
+            if not self.store.manifest_changed():
+                continue
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error("❌ Index reload failed: %s", e)
+
+    def load_indexes(self, remove_orphans=True):
+        """
+        Loads the segment store and BM25/FAISS checkpoints from disk.
 
-        # Load chunk metadata
+        Checkpoints may lag behind the segments (they are only rewritten
+        during compaction), so any chunks appended after the last checkpoint
+        are replayed from the memory-mapped segments.
+
+        Args:
+            remove_orphans (bool): Delete segment directories the manifest
+                does not list (left behind by crashes)
+        """
+        logger.info("🔄 Loading indexes from disk...")
+
+        with self._write_lock, self.store.write_lock:
+            self.store.load(remove_orphans=remove_orphans)
+            if not self.store.exists() and os.path.exists(self.BM25_FILE):
+                self._migrate_legacy_files()
+
+            logger.info("✅ Loaded %s chunks from %s segments.", len(self.store), len(self.store.segments))
+
+            # Checkpoints taken before compaction renumbered the store are unusable
+            checkpoint_valid = self._checkpoint_epoch() == self.store.epoch
+            if not checkpoint_valid:
+                logger.info("🔄 Index checkpoints are stale, rebuilding from segments...")
+
+            # Load the BM25 and FAISS (memory-mapped where supported) checkpoints as the base layer
+            layers = []
+            self._checkpoint_layer = None
+            if checkpoint_valid and os.path.exists(self.BM25_INDEX_FILE) and os.path.exists(self.FAISS_FILE):
+                bm25_index = IncrementalBM25.load(self.BM25_INDEX_FILE)
+                faiss_index = faiss.read_index(self.FAISS_FILE, faiss.IO_FLAG_MMAP)
+                if bm25_index.corpus_size == faiss_index.ntotal <= len(self.store):
+                    self._checkpoint_layer = IndexLayer(0, bm25_index, faiss_index)
+                    layers.append(self._checkpoint_layer)
+
+            # Replay chunks appended after the checkpoint
+            covered = layers[0].count if layers else 0
+            if covered < len(self.store):
+                layers.append(IndexLayer.build(covered, self.store.texts[covered:], self.store.vectors(covered)))
+            logger.info("✅ BM25 index ready with %s chunks.", len(self.store))
+
+            # Load content-hash checkpoint and replay newer chunks
+            self.dedup_index = None
+            if checkpoint_valid and os.path.exists(self.DEDUP_FILE):
+                self.dedup_index = DedupIndex.load(self.DEDUP_FILE)
+                if self.dedup_index.covered > len(self.store):
+                    self.dedup_index = None
+            if self.dedup_index is None:
+                self.dedup_index = DedupIndex()
+            for position in range(self.dedup_index.covered, len(self.store)):
+                record = self.store.record(position)
+                self.dedup_index.add(position, record["metadata"], record["text"])
+            self._forget_deleted_documents()
+
+            if layers:
+                logger.info("✅ FAISS index loaded with %s vectors in %s layer(s).", len(self.store), len(layers))
+
+                # Convert a legacy flat index to the configured type once it is large enough
+                base = layers[0]
+                current_type = index_type_of(base.faiss_index)
+                if (current_type != config.FAISS_INDEX_TYPE
+                        and base.count >= min_training_vectors(config.FAISS_INDEX_TYPE)):
+                    logger.info("🔄 Migrating FAISS index from %s to %s...", current_type, config.FAISS_INDEX_TYPE)
+                    layers[0] = IndexLayer(0, base.bm25_index, migrate_index(self._writable_faiss(base)))
+                    self._publish(layers)
+                    self._save_checkpoints()
+                    return
+            else:
+                logger.warning("❌ No FAISS index found.")
+            self._publish(layers)
+
+    def _migrate_legacy_files(self):
+        """Convert the old whole-file JSON/FAISS layout into a single segment."""
+        with open(self.BM25_FILE, "r", encoding="utf-8") as f:
+            corpus = json.load(f)
+        metadata = []
         if os.path.exists(self.METADATA_FILE):
             with open(self.METADATA_FILE, "r", encoding="utf-8") as f:
-                self.chunk_metadata = json.load(f)
-            print(f"✅ Loaded chunk metadata for {len(self.chunk_metadata)} chunks.", flush=True)
-        else:
-            print("❌ No chunk metadata found.", flush=True)
+                metadata = json.load(f)
+        if not corpus or not os.path.exists(self.FAISS_FILE):
+            return
+        vectors = all_vectors(faiss.read_index(self.FAISS_FILE))
+        if len(vectors) != len(corpus):
+            logger.warning("❌ Legacy corpus and FAISS index differ in length, skipping migration.")
+            return
+        metadata = metadata + [{"global_index": i} for i in range(len(metadata), len(corpus))]
+        self.store.append(corpus, metadata[:len(corpus)], vectors)
+        logger.info("✅ Migrated %s legacy chunks to segment storage.", len(corpus))
+
+    def _writable_faiss(self, layer):
+        """A private, mutable copy of a layer's FAISS index."""
+        if layer is self._checkpoint_layer:
+            # Positions are stable within a store epoch, so unless another
+            # process has since checkpointed a different number of vectors,
+            # the file holds exactly the vectors currently mapped
+            faiss_index = faiss.read_index(self.FAISS_FILE)
+            if faiss_index.ntotal == layer.count:
+                return faiss_index
+        return faiss.clone_index(layer.faiss_index)
+
+    def _save_checkpoints(self):
+        """Atomically rewrite the checkpoints from the base layer. Caller holds the write lock."""
+        checkpoint = self._checkpoint_state()
+        self._write_checkpoints(checkpoint)
+        self._mark_checkpoints(checkpoint)
+
+    def _checkpoint_state(self):
+        """
+        Capture what the next checkpoint holds. Caller holds the write lock.
+
+        The base layer always starts at position 0; layers after it are
+        replayed from the segments on load. The base layer is immutable, but
+        the dedup index changes with every upload, so it is copied.
+        """
+        return {
+            "base": self._snapshot.layers[0] if self._snapshot.layers else None,
+            "dedup_index": self.dedup_index.copy(),
+            "epoch": self.store.epoch,
+        }
+
+    def _write_checkpoints(self, checkpoint):
+        """
+        Atomically rewrite the checkpoint files from a captured state.
 
-        # Load FAISS index
-        if os.path.exists(self.FAISS_FILE):
-            self.faiss_index = faiss.read_index(self.FAISS_FILE)
-            print(f"✅ FAISS index loaded with {self.faiss_index.ntotal} vectors.", flush=True)
+        Needs no write lock: the state is immutable, and only the process
+        holding the store's compaction lock writes checkpoints, so the
+        epoch cannot change meanwhile. Until `_mark_checkpoints`, loaders
+        check each file against the store and replay what it lacks.
+        """
+        base = checkpoint["base"]
+        if base is not None and base is not self._checkpoint_layer:
+            base.bm25_index.save(self.BM25_INDEX_FILE)
+            tmp_path = f"{self.FAISS_FILE}.tmp"
+            faiss.write_index(base.faiss_index, tmp_path)
+            os.replace(tmp_path, self.FAISS_FILE)
+        checkpoint["dedup_index"].save(self.DEDUP_FILE)
+
+    def _mark_checkpoints(self, checkpoint):
+        """Mark written checkpoints as matching their store epoch. Caller holds the write lock."""
+        # Written last: marks the checkpoints above as matching this store epoch
+        atomic_write_json(self.CHECKPOINT_FILE, {"epoch": checkpoint["epoch"]})
+        self._checkpoint_layer = checkpoint["base"]
+
+    def _checkpoint_epoch(self):
+        if not os.path.exists(self.CHECKPOINT_FILE):
+            # Checkpoints from before epochs existed match an unrenumbered store
+            return 0
+        with open(self.CHECKPOINT_FILE, "r", encoding="utf-8") as f:
+            return json.load(f).get("epoch", 0)
+
+    def _forget_deleted_documents(self):
+        """Drop hash/range entries of documents whose chunks are tombstoned."""
+        deleted = self.store.deleted
+        for document_id, (start, _) in list(self.dedup_index.document_ranges.items()):
+            if start in deleted:
+                self.dedup_index.remove_document(document_id)
+
+    def compact(self, force=False):
+        """
+        Merge segments and index layers, purge deleted chunks and checkpoint.
+
+        Writing the merged segment, building the merged indexes and writing
+        the checkpoints happen without the write lock, so searches and
+        uploads carry on; only the swap is serialized. Only one process compacts a shared store
+        at a time; the others skip their turn.
+
+        Args:
+            force (bool): Merge and purge regardless of the configured thresholds
+        """
+        with self._compaction_lock:
+            self._compaction_wanted.clear()
+            if not self.store.compaction_lock.acquire(blocking=False):
+                return
+            try:
+                self._compact(force)
+            finally:
+                self.store.compaction_lock.release()
+
+    def _compact(self, force):
+        with self._writing():
+            snapshot = self._snapshot
+        total = len(snapshot)
+        purge = bool(total) and (force or len(snapshot.view.deleted) / total >= config.COMPACTION_PURGE_RATIO)
+        plan = self.store.prepare_compaction(
+            min_segments=2 if force else config.COMPACTION_MIN_SEGMENTS,
+            purge=purge,
+            view=snapshot.view
+        )
+        dedup_index = None
+        if plan is not None and plan["purged"]:
+            base, dedup_index = self._build_indexes(plan["segment"])
+        elif len(snapshot.layers) > 1:
+            base = self._merge_layers(snapshot)
         else:
-            print("❌ No FAISS index found.", flush=True)
+            base = None
+
+        with self._writing():
+            if plan is not None:
+                self.store.commit_compaction(plan)
+            if base is not None:
+                # Layers published while the merged one was being built follow it
+                newer = self._snapshot.layers[len(snapshot.layers):]
+                shift = plan["merged_total"] - len(plan["kept"]) if dedup_index is not None else 0
+                layers = [base] + [layer.shifted(layer.start - shift) for layer in newer]
+                if dedup_index is not None:
+                    # Replay chunks appended while the indexes were being rebuilt
+                    for position in range(base.count, len(self.store)):
+                        record = self.store.record(position)
+                        dedup_index.add(position, record["metadata"], record["text"])
+                    dedup_index.stats = self.dedup_index.stats
+                    self.dedup_index = dedup_index
+                self._forget_deleted_documents()
+                self._publish(layers)
+            elif plan is not None:
+                self._publish()
+            checkpoint = None
+            if plan is not None or base is not None or self._checkpoint_dirty:
+                checkpoint = self._checkpoint_state()
+                # Uploads made while the checkpoint is written dirty it again
+                self._checkpoint_dirty = False
+
+        if checkpoint is not None:
+            try:
+                self._write_checkpoints(checkpoint)
+            except Exception:
+                self._checkpoint_dirty = True
+                raise
+            with self._write_lock, self.store.write_lock:
+                self._mark_checkpoints(checkpoint)
+
+        if plan is not None:
+            purged = plan["merged_total"] - len(plan["kept"])
+            logger.info("✅ Compacted store into %s segments, purged %s deleted chunks.", len(self.store.segments), purged)
+        if base is not None:
+            logger.info("✅ Merged %s index layers.", len(snapshot.layers))
+
+    def _merge_layers(self, snapshot):
+        """Fold every layer of a snapshot into one base layer starting at position 0."""
+        layers = snapshot.layers
+        bm25_index = IncrementalBM25.concat([layer.bm25_index for layer in layers])
+        faiss_index = self._writable_faiss(layers[0]) if layers[0].faiss_index is not None else None
+        for layer in layers[1:]:
+            if layer.count:
+                faiss_index = add_vectors(faiss_index, snapshot.view.vectors(layer.start, layer.end))
+        return IndexLayer(0, bm25_index, faiss_index)
+
+    def _build_indexes(self, segment):
+        """Build a fresh base layer and dedup index over a merged segment."""
+        dedup_index = DedupIndex()
+        texts = []
+        for position in range(len(segment)):
+            record = segment.record(position)
+            texts.append(record["text"])
+            dedup_index.add(position, record["metadata"], record["text"])
+        return IndexLayer.build(0, texts, np.asarray(segment.vectors)), dedup_index
+
+    def _compaction_loop(self):
+        while True:
+            self._compaction_wanted.wait(config.COMPACTION_INTERVAL_SECONDS)
+            if self._closed.is_set():
+                return
+            snapshot = self._snapshot
+            deleted_ratio = len(snapshot.view.deleted) / len(snapshot) if len(snapshot) else 0.0
+            if (len(self.store.segments) >= config.COMPACTION_MIN_SEGMENTS
+                    or len(snapshot.layers) >= config.COMPACTION_MIN_SEGMENTS
+                    or deleted_ratio >= config.COMPACTION_PURGE_RATIO
+                    or self._checkpoint_dirty):
+                try:
+                    self.compact()
+                except Exception as e:
+                    logger.error("❌ Compaction failed: %s", e)
+
+    def close(self):
+        """
+        Stop the background threads, checkpointing any unsaved index changes.
+
+        Searches and writes still work afterwards (a request may be holding
+        the embedder), but nothing reloads or compacts in the background.
+        """
+        self._closed.set()
+        if self._checkpoint_dirty:
+            self.compact()
+        self._compaction_wanted.set()
+
+    def delete_document(self, document_id):
+        """
+        Delete a document by tombstoning its chunks.
+
+        The chunks disappear from search results immediately; their space is
+        reclaimed by the next purging compaction.
+
+        Returns:
+            int: Number of chunks deleted (0 if the document is unknown)
+        """
+        with self._writing():
+            deleted = self._delete_document_locked(document_id)
+        if deleted:
+            logger.info("🗑️ Deleted document %s (%s chunks).", document_id, deleted)
+        return deleted
+
+    def has_document(self, document_id):
+        """Whether a document with this id is stored and not deleted."""
+        if self.store.manifest_changed():
+            self.refresh()
+        return document_id in self.dedup_index.document_ranges
+
+    def _delete_document_locked(self, document_id, publish=True):
+        positions = self.dedup_index.remove_document(document_id)
+        if not positions:
+            return 0
+        self.store.delete(positions)
+        self._checkpoint_dirty = True
+        if publish:
+            self._publish()
+        return len(positions)
 
     def store_text_embeddings(self, text, document_id=None, filename=None):
         """Stores document text in BM25 and FAISS index with document tracking."""
         if not text.strip():
-            print("❌ No valid text to index!", flush=True)
+            logger.warning("❌ No valid text to index!")
             return
 
+        return self.store_documents([
+            {"text": text, "document_id": document_id, "filename": filename}
+        ])[0]["chunks"]
+
+    def _find_duplicate(self, document_hash, batch_hashes):
+        """Return the id of a stored or earlier-in-batch document with the same content."""
+        if document_hash in self.dedup_index.documents:
+            return self.dedup_index.documents[document_hash]
+        return batch_hashes.get(document_hash)
+
+    def _embed_chunks(self, chunks, chunk_hashes):
+        """
+        Embed chunks, reusing stored vectors for content already indexed.
+
+        Stored vectors are looked up and copied under the write lock: a
+        purging compaction renumbers the store and swaps in a new dedup
+        index, and positions are only meaningful against the matching
+        store. Encoding the rest happens without the lock.
+
+        Returns:
+            tuple: (embeddings matrix, list of booleans marking reused rows)
+        """
+        vectors = [None] * len(chunks)
+        reused = [False] * len(chunks)
+        to_encode = {}
+        with self._write_lock:
+            total = len(self.store)
+            for i, chunk_hash in enumerate(chunk_hashes):
+                position = self.dedup_index.chunks.get(chunk_hash)
+                if position is not None and position < total:
+                    vectors[i] = np.array(self.store.vectors(position, position + 1)[0])
+                    reused[i] = True
+                elif chunk_hash in to_encode:
+                    # Repeated within this batch: encode once
+                    to_encode[chunk_hash].append(i)
+                    reused[i] = True
+                else:
+                    to_encode[chunk_hash] = [i]
+
+        if to_encode:
+            encoded = np.array(self.embedder.encode([chunks[rows[0]] for rows in to_encode.values()]))
+            for vector, rows in zip(encoded, to_encode.values()):
+                for i in rows:
+                    vectors[i] = vector
+        return np.stack(vectors).astype(np.float32), reused
+
+    def store_documents(self, documents):
+        """
+        Index several documents with a single embedding pass and one segment.
+
+        Documents whose content is already stored are skipped, and chunks
+        seen before reuse their stored embeddings instead of being encoded.
+        A document with "replace" set atomically replaces the stored
+        document with the same id.
+
+        Args:
+            documents (list): Dicts with "text" (or "pages", a list of
+                (page number, text) pairs), "document_id", "filename" and
+                optionally "replace"
+
+        Returns:
+            list: Per document, a dict with "chunks" stored, "duplicate_of"
+                (id of the existing copy, or None) and "reused_embeddings"
+        """
+        results = [{"chunks": 0, "duplicate_of": None, "reused_embeddings": 0} for _ in documents]
+        doc_pages = [doc.get("pages") or [(None, doc["text"])] for doc in documents]
+        document_hashes = [content_hash("\n".join(text for _, text in pages)) for pages in doc_pages]
+
         # Create chunks with better strategy
-        chunks = self.chunk_text(text)
-        print(f"✅ Created {len(chunks)} chunks from document.", flush=True)
-        
-        # If adding to existing corpus, get the current length as starting index
-        starting_index = len(self.bm25_corpus)
-        
-        # Store chunks and metadata
-        for i, chunk in enumerate(chunks):
-            # Add to BM25 corpus
-            self.bm25_corpus.append(chunk)
-            
-            # Create and store metadata for this chunk
-            chunk_info = {
-                "document_id": document_id or filename or f"doc_{len(self.chunk_metadata)}",
-                "chunk_index": i,
-                "global_index": starting_index + i,
-                "chunk_size": len(chunk),
-                "word_count": len(chunk.split())
-            }
-            self.chunk_metadata.append(chunk_info)
-
-        # Rebuild BM25 index with all documents
-        tokenized_corpus = [doc.split() for doc in self.bm25_corpus]
-        self.bm25_index = BM25Okapi(tokenized_corpus)
-        print("✅ BM25 indexing complete.", flush=True)
-
-        # Save BM25 corpus
-        with open(self.BM25_FILE, "w", encoding="utf-8") as f:
-            json.dump(self.bm25_corpus, f)
-        print("✅ BM25 corpus saved to disk.", flush=True)
-        
-        # Save chunk metadata
-        with open(self.METADATA_FILE, "w", encoding="utf-8") as f:
-            json.dump(self.chunk_metadata, f)
-        print("✅ Chunk metadata saved to disk.", flush=True)
+        doc_chunks = [list(self.chunk_pages(pages)) for pages in doc_pages]
 
-        # Create or update FAISS index
-        new_embeddings = self.embedder.encode(chunks)
-        
-        if self.faiss_index is None:
-            # Create new index
-            self.faiss_index = faiss.IndexFlatL2(new_embeddings.shape[1])
-            self.faiss_index.add(np.array(new_embeddings))
-        else:
-            # Add to existing index
-            self.faiss_index.add(np.array(new_embeddings))
-        
-        print(f"✅ FAISS index updated. Total vectors: {self.faiss_index.ntotal}", flush=True)
+        # Drop exact duplicates before paying for embeddings
+        batch_hashes = {}
+        keep = []
+        for i, doc in enumerate(documents):
+            duplicate_of = self._find_duplicate(document_hashes[i], batch_hashes)
+            if duplicate_of is not None and not (doc.get("replace") and duplicate_of != doc.get("document_id")):
+                results[i]["duplicate_of"] = duplicate_of
+            elif doc_chunks[i]:
+                batch_hashes[document_hashes[i]] = doc.get("document_id") or doc.get("filename") or f"batch_doc_{i}"
+                keep.append(i)
 
-        # Save FAISS index
-        faiss.write_index(self.faiss_index, self.FAISS_FILE)
-        print("✅ FAISS index saved to disk.", flush=True)
-        
-        return len(chunks)
+        chunks = [chunk["text"] for i in keep for chunk in doc_chunks[i]]
+        if chunks:
+            logger.info("✅ Created %s chunks from %s document(s).", len(chunks), len(keep))
+            chunk_hashes = [content_hash(chunk) for chunk in chunks]
 
-    def search(self, query, bm25_weight=0.3, semantic_weight=0.7, top_k=5):
-        """Performs weighted hybrid search using BM25 and FAISS."""
-        if not self.bm25_index or not self.faiss_index or not self.bm25_corpus:
-            print("❌ No documents indexed yet.", flush=True)
-            return {"error": "No documents indexed yet"}
+            # Embed outside the write lock so concurrent uploads overlap their encode passes
+            with ingest_stage_seconds.time("embed"):
+                new_embeddings, reused = self._embed_chunks(chunks, chunk_hashes)
 
-        print(f"🔍 Searching for: {query}", flush=True)
-        print(f"📂 Total Documents Indexed: {len(self.bm25_corpus)}", flush=True)
+        with self._writing():
+            # Re-check duplicates that another writer stored while we were embedding
+            still_new = [
+                i for i in keep
+                if documents[i].get("replace") or document_hashes[i] not in self.dedup_index.documents
+            ]
+            if chunks and len(still_new) != len(keep):
+                rows = []
+                offset = 0
+                for i in keep:
+                    if i in still_new:
+                        rows.extend(range(offset, offset + len(doc_chunks[i])))
+                    else:
+                        results[i]["duplicate_of"] = self.dedup_index.documents[document_hashes[i]]
+                    offset += len(doc_chunks[i])
+                chunks = [chunks[r] for r in rows]
+                chunk_hashes = [chunk_hashes[r] for r in rows]
+                reused = [reused[r] for r in rows]
+                new_embeddings = new_embeddings[rows]
+            keep = still_new
 
-        # Get BM25 scores for all documents
-        bm25_scores = self.bm25_index.get_scores(query.split())
-        
-        # Normalize BM25 scores to [0,1] range
-        bm25_scores_norm = bm25_scores / np.max(bm25_scores) if np.max(bm25_scores) > 0 else bm25_scores
-        
-        # Get semantic search results
-        query_embedding = self.embedder.encode([query])
-        D, I = self.faiss_index.search(np.array(query_embedding), k=min(len(self.bm25_corpus), 20))
-        
-        # Normalize semantic scores (convert distances to similarities)
-        # FAISS returns L2 distances, so smaller is better. Convert to similarity where higher is better.
-        semantic_scores = 1 - (D[0] / np.max(D[0])) if np.max(D[0]) > 0 else 1 - D[0]
-        
-        # Combine scores using weighted approach
-        combined_scores = {}
-        
-        # Add BM25 scores
-        for i, score in enumerate(bm25_scores_norm):
-            combined_scores[i] = bm25_weight * score
-        
-        # Add semantic scores
-        for idx_pos, idx in enumerate(I[0]):
-            if idx in combined_scores:
-                combined_scores[idx] += semantic_weight * semantic_scores[idx_pos]
+            for i, result in enumerate(results):
+                if result["duplicate_of"] is not None:
+                    logger.info("⏭️ Skipping duplicate of document %s", result['duplicate_of'])
+                    self.dedup_index.record_skipped_document(
+                        len(doc_chunks[i]),
+                        sum(len(chunk["text"].encode("utf-8")) for chunk in doc_chunks[i]),
+                        self._vector_bytes()
+                    )
+                    self._checkpoint_dirty = True
+
+            if not chunks:
+                if not any(result["duplicate_of"] for result in results):
+                    logger.warning("❌ No valid text to index!")
+                return results
+
+            # If adding to existing corpus, get the current length as starting index
+            starting_index = len(self.store)
+            uploaded_at = time.time()
+
+            chunk_metadata = []
+            for i in keep:
+                doc = documents[i]
+                for chunk_index, chunk in enumerate(doc_chunks[i]):
+                    row = len(chunk_metadata)
+                    chunk_metadata.append({
+                        "document_id": doc.get("document_id") or doc.get("filename") or f"doc_{starting_index}",
+                        "chunk_index": chunk_index,
+                        "global_index": starting_index + row,
+                        **self._chunk_metadata(chunk),
+                        "content_hash": chunk_hashes[row],
+                        "document_hash": document_hashes[i],
+                        "uploaded_at": uploaded_at
+                    })
+                    results[i]["chunks"] += 1
+                    results[i]["reused_embeddings"] += int(reused[row])
+
+            # Index only the new chunks, as a new layer of the next snapshot.
+            # Built before anything is written, so a failure (such as FAISS
+            # training) leaves the store and the snapshot as they were
+            with ingest_stage_seconds.time("index"):
+                layer = IndexLayer.build(starting_index, chunks, new_embeddings)
+
+            # Tombstone the previous version of replaced documents; published
+            # together with the new chunks so searches never see neither
+            for i in keep:
+                if documents[i].get("replace"):
+                    self._delete_document_locked(documents[i]["document_id"], publish=False)
+
+            # Durably append only this batch's chunks, metadata and vectors
+            with ingest_stage_seconds.time("persist"):
+                self.store.append(chunks, chunk_metadata, new_embeddings)
+            logger.debug("✅ Chunks appended to segment store.")
+
+            for row, (chunk, meta) in enumerate(zip(chunks, chunk_metadata)):
+                self.dedup_index.add(starting_index + row, meta, chunk)
+            self.dedup_index.stats["reused_embeddings"] += sum(reused)
+            self._publish(self._snapshot.layers + (layer,))
+            self._checkpoint_dirty = True
+            logger.info("✅ Indexes updated. Total vectors: %s", len(self._snapshot))
+
+        return results
+
+    def store_document_stream(self, pages, document_id, filename=None, replace=False):
+        """
+        Index one document while its pages are still being extracted.
+
+        Chunks are embedded INGEST_STREAM_BATCH_CHUNKS at a time, indexed and
+        written straight to a staged segment on disk, so memory stays bounded however
+        large the document is. The segment only becomes visible once the
+        whole document is written. Whole-document duplicates can only be
+        detected at the end, but their chunks are then found in the chunk
+        hash index and reuse the stored embeddings instead of re-encoding.
+
+        Args:
+            pages (iterable): (page number, text) pairs, e.g. from iter_pages
+            document_id (str): Id of the document
+            filename (str): Original filename
+            replace (bool): Replace the stored document with the same id
+
+        Returns:
+            dict: "chunks" stored, "duplicate_of" (id of the existing copy,
+                or None) and "reused_embeddings"
+        """
+        result = {"chunks": 0, "duplicate_of": None, "reused_embeddings": 0}
+        document_hash = StreamingContentHash()
+        uploaded_at = time.time()
+        writer = self.store.writer()
+        text_bytes = 0
+        # Embedding, indexing and writing alternate per batch, so each stage's time is summed
+        stage_seconds = {"embed": 0.0, "index": 0.0, "persist": 0.0}
+        # The document's layer, built before the segment is committed so a
+        # failure (such as FAISS training) leaves the store untouched
+        bm25_index = IncrementalBM25()
+        faiss_index = None
+
+        def hashed(pages):
+            for page_number, text in pages:
+                document_hash.update(text)
+                yield page_number, text
+
+        def flush(batch, final):
+            nonlocal faiss_index
+            started = time.perf_counter()
+            chunk_hashes = [content_hash(chunk["text"]) for chunk in batch]
+            embeddings, reused = self._embed_chunks([chunk["text"] for chunk in batch], chunk_hashes)
+            stage_seconds["embed"] += time.perf_counter() - started
+            started = time.perf_counter()
+            bm25_index.add_documents([chunk["text"] for chunk in batch])
+            faiss_index = add_vectors(faiss_index, embeddings)
+            stage_seconds["index"] += time.perf_counter() - started
+            records = []
+            for row, chunk in enumerate(batch):
+                metadata = {
+                    "document_id": document_id,
+                    "chunk_index": result["chunks"] + row,
+                    **self._chunk_metadata(chunk),
+                    "content_hash": chunk_hashes[row],
+                    "uploaded_at": uploaded_at
+                }
+                if final:
+                    # The document hash is only known once the stream ends
+                    metadata["document_hash"] = document_hash.hexdigest()
+                records.append({"text": chunk["text"], "metadata": metadata})
+            started = time.perf_counter()
+            writer.write(records, embeddings)
+            stage_seconds["persist"] += time.perf_counter() - started
+            result["chunks"] += len(batch)
+            result["reused_embeddings"] += sum(reused)
+
+        try:
+            batch = []
+            for chunk in self.chunk_pages(hashed(pages)):
+                if len(batch) == config.INGEST_STREAM_BATCH_CHUNKS:
+                    flush(batch, final=False)
+                    logger.debug("🔹 %s: %s chunks embedded", document_id, result['chunks'])
+                    batch = []
+                batch.append(chunk)
+                text_bytes += len(chunk["text"].encode("utf-8"))
+            if not batch:
+                writer.abort()
+                logger.warning("❌ No valid text to index!")
+                return result
+            flush(batch, final=True)
+        except BaseException:
+            writer.abort()
+            raise
+        ingest_stage_seconds.observe(stage_seconds["embed"], "embed")
+
+        with self._writing():
+            duplicate_of = self.dedup_index.documents.get(document_hash.hexdigest())
+            if duplicate_of is not None and not (replace and duplicate_of != document_id):
+                writer.abort()
+                logger.info("⏭️ Skipping duplicate of document %s", duplicate_of)
+                self.dedup_index.record_skipped_document(result["chunks"], text_bytes, self._vector_bytes())
+                self._checkpoint_dirty = True
+                return {"chunks": 0, "duplicate_of": duplicate_of, "reused_embeddings": 0}
+
+            if replace:
+                self._delete_document_locked(document_id, publish=False)
+            started = time.perf_counter()
+            start = self.store.commit(writer)
+            end = len(self.store)
+            ingest_stage_seconds.observe(stage_seconds["persist"] + time.perf_counter() - started, "persist")
+            logger.info("✅ Segment with %s chunks committed.", end - start)
+
+            started = time.perf_counter()
+            for position in range(start, end):
+                record = self.store.record(position)
+                self.dedup_index.add(position, record["metadata"], record["text"])
+            self.dedup_index.stats["reused_embeddings"] += result["reused_embeddings"]
+            self._publish(self._snapshot.layers + (IndexLayer(start, bm25_index, faiss_index),))
+            ingest_stage_seconds.observe(stage_seconds["index"] + time.perf_counter() - started, "index")
+            self._checkpoint_dirty = True
+            logger.info("✅ Indexes updated. Total vectors: %s", len(self._snapshot))
+
+        return result
+
+    @staticmethod
+    def _chunk_metadata(chunk):
+        """Per-chunk metadata produced by the chunker."""
+        return {
+            "chunk_size": len(chunk["text"]),
+            "token_count": chunk["token_count"],
+            "page_start": chunk["page_start"],
+            "page_end": chunk["page_end"],
+            "char_start": chunk["char_start"],
+            "char_end": chunk["char_end"],
+        }
+
+    def _vector_bytes(self):
+        return (self.store.dim or 0) * np.dtype(np.float32).itemsize
+
+    def dedup_report(self):
+        """Store-wide duplicate counts and space saved by content-hash deduplication."""
+        return self.dedup_index.report(len(self.store), self._vector_bytes())
+
+    def encode_query(self, query):
+        """Embed a single query string, reusing cached embeddings of repeated queries."""
+        embedding = self.query_embedding_cache.get(query)
+        if embedding is MISSING:
+            if self.query_batcher is not None:
+                embedding = self.query_batcher.encode(query)
             else:
-                combined_scores[idx] = semantic_weight * semantic_scores[idx_pos]
-        
-        # Get top results
-        top_indices = sorted(combined_scores.keys(), key=lambda x: combined_scores[x], reverse=True)[:top_k]
-        
+                embedding = np.array(self.embedder.encode([query]))[0]
+            embedding.setflags(write=False)
+            self.query_embedding_cache.put(query, embedding)
+        return embedding
+
+    def encode_queries(self, queries):
+        """
+        Embed many query strings in one forward pass.
+
+        Cached embeddings are reused and repeated queries encoded once.
+
+        Returns:
+            np.ndarray: One embedding row per query
+        """
+        embeddings = [self.query_embedding_cache.get(query) for query in queries]
+        missing = {}
+        for i, (query, embedding) in enumerate(zip(queries, embeddings)):
+            if embedding is MISSING:
+                missing.setdefault(query, []).append(i)
+        if missing:
+            encoded = np.array(self.embedder.encode(list(missing)))
+            for embedding, (query, rows) in zip(encoded, missing.items()):
+                embedding = embedding.copy()
+                embedding.setflags(write=False)
+                self.query_embedding_cache.put(query, embedding)
+                for i in rows:
+                    embeddings[i] = embedding
+        return np.stack(embeddings)
+
+    def cache_stats(self):
+        """Hit/miss counters for the query embedding and search result caches."""
+        return {
+            "generation": self.generation,
+            "query_embeddings": self.query_embedding_cache.stats(),
+            "search_results": self.search_cache.stats(),
+            "query_batching": self.query_batcher.stats() if self.query_batcher else None,
+        }
+
+    def search(self, query, bm25_weight=0.3, semantic_weight=0.7, top_k=5, nprobe=None, ef_search=None,
+               fusion=None, candidate_depth=None, document_ids=None, uploaded_after=None, uploaded_before=None):
+        """
+        Performs weighted hybrid search using BM25 and FAISS.
+
+        `nprobe` (IVF) and `ef_search` (HNSW) trade recall for latency per
+        request; they are ignored by flat indexes. `fusion` selects how the
+        two retrievers' scores are combined (see app.services.fusion) and
+        `candidate_depth` how many candidates each contributes; both default
+        to the configured values. Results are cached per index generation.
+
+        `document_ids` and the Unix times `uploaded_after` (inclusive) and
+        `uploaded_before` (exclusive) restrict the search to matching
+        documents. The filter is applied inside both retrievers, so a search
+        of one document costs time proportional to that document.
+
+        Reads a single index snapshot without locking, so any number of
+        searches can run in parallel with each other and with uploads.
+        """
+        with search_seconds.time():
+            snapshot = self._snapshot
+            options = self._search_options(
+                bm25_weight, semantic_weight, top_k, nprobe, ef_search, fusion, candidate_depth,
+                document_ids, uploaded_after, uploaded_before
+            )
+            key = (query, *options.values(), snapshot.generation)
+            results = self.search_cache.get(key)
+            if results is MISSING:
+                results = self._search(snapshot, query, **options)
+                if isinstance(results, list):
+                    self.search_cache.put(key, results)
+            # Callers may annotate results, so never hand out the cached objects
+            return copy.deepcopy(results)
+
+    def search_batch(self, queries, bm25_weight=0.3, semantic_weight=0.7, top_k=5, nprobe=None, ef_search=None,
+                     fusion=None, candidate_depth=None, document_ids=None, uploaded_after=None, uploaded_before=None):
+        """
+        Hybrid search for many queries against one index snapshot.
+
+        Queries are processed SEARCH_BATCH_SIZE at a time: each batch is
+        embedded in one forward pass, searched with one multi-row FAISS
+        call and scored with one vectorized BM25 pass. Results are shared
+        with the single-query search cache.
+
+        Yields:
+            list | dict: Per query, in order, the same result as `search`
+        """
+        snapshot = self._snapshot
+        options = self._search_options(
+            bm25_weight, semantic_weight, top_k, nprobe, ef_search, fusion, candidate_depth,
+            document_ids, uploaded_after, uploaded_before
+        )
+        for lo in range(0, len(queries), config.SEARCH_BATCH_SIZE):
+            batch = queries[lo:lo + config.SEARCH_BATCH_SIZE]
+            keys = [(query, *options.values(), snapshot.generation) for query in batch]
+            results = [self.search_cache.get(key) for key in keys]
+            # Each distinct uncached query is searched once
+            pending = list(dict.fromkeys(query for query, result in zip(batch, results) if result is MISSING))
+            if pending:
+                with search_stage_seconds.time("query_embed"):
+                    query_embeddings = self.encode_queries(pending)
+                computed = dict(zip(pending, self._search_batch(snapshot, pending, query_embeddings, **options)))
+                for i, key in enumerate(keys):
+                    if results[i] is MISSING:
+                        results[i] = computed[batch[i]]
+                        if isinstance(results[i], list):
+                            self.search_cache.put(key, results[i])
+            for result in results:
+                yield copy.deepcopy(result)
+
+    @staticmethod
+    def _search_options(bm25_weight, semantic_weight, top_k, nprobe, ef_search, fusion, candidate_depth,
+                        document_ids, uploaded_after, uploaded_before):
+        """Search parameters with configured defaults filled in, in cache key order."""
+        fusion = fusion or config.SEARCH_FUSION
+        if fusion not in FUSION_STRATEGIES:
+            raise ValueError(f"Unknown fusion strategy: {fusion}")
+        return {
+            "bm25_weight": bm25_weight,
+            "semantic_weight": semantic_weight,
+            "top_k": top_k,
+            "nprobe": nprobe,
+            "ef_search": ef_search,
+            "fusion": fusion,
+            "candidate_depth": max(candidate_depth or config.SEARCH_CANDIDATE_DEPTH, top_k),
+            "document_ids": None if document_ids is None else tuple(sorted(set(document_ids))),
+            "uploaded_after": uploaded_after,
+            "uploaded_before": uploaded_before,
+        }
+
+    def _search(self, snapshot, query, **options):
+        logger.debug("🔍 Searching for: %s", query)
+        query_embedding = None
+        if snapshot.live > 0:
+            with search_stage_seconds.time("query_embed"):
+                query_embedding = self.encode_query(query)[None, :]
+        results = self._search_batch(snapshot, [query], query_embedding, **options)[0]
+        if isinstance(results, list):
+            logger.debug("✅ Found %s results.", len(results))
+        return results
+
+    def _search_batch(self, snapshot, queries, query_embeddings, bm25_weight, semantic_weight, top_k,
+                      nprobe, ef_search, fusion, candidate_depth, document_ids, uploaded_after, uploaded_before):
+        live = snapshot.live
+        if live <= 0:
+            logger.debug("❌ No documents indexed yet.")
+            return [{"error": "No documents indexed yet"} for _ in queries]
+
+        # Resolve a document filter to the position ranges it covers
+        ranges = None
+        if document_ids is not None or uploaded_after is not None or uploaded_before is not None:
+            ranges = snapshot.filter_ranges(document_ids, uploaded_after, uploaded_before)
+            filtered = sum(end - start for start, end in ranges)
+            if not filtered:
+                return [[] for _ in queries]
+            logger.debug("📂 Searching %s queries over %s filtered chunks", len(queries), filtered)
+        else:
+            logger.debug("📂 Searching %s queries over %s indexed chunks", len(queries), live)
+
+        # BM25 scores of every (filtered) chunk for every query (tombstoned chunks score zero)
+        with search_stage_seconds.time("bm25"):
+            query_tokens = [tokenize(query) for query in queries]
+            if ranges is None:
+                positions = None
+                bm25_scores = snapshot.bm25_scores_batch(query_tokens)
+            else:
+                positions, bm25_scores = snapshot.bm25_scores_in(query_tokens, ranges)
+
+        # Nearest neighbours of every query in one call; small filtered
+        # ranges are cheaper to scan exactly than to search through FAISS
+        query_embeddings = np.asarray(query_embeddings, dtype=np.float32)
+        depth = min(live, candidate_depth)
+        with search_stage_seconds.time("vector_search"):
+            if ranges is not None and filtered <= config.FILTER_EXACT_MAX_CHUNKS:
+                _, I = snapshot.exact_neighbours(query_embeddings, depth, ranges)
+            else:
+                _, I = snapshot.search_vectors(query_embeddings, depth, nprobe=nprobe, ef_search=ef_search, ranges=ranges)
+
+        with search_stage_seconds.time("fusion"):
+            ranked = [
+                hybrid_rank(
+                    bm25_scores[row], I[row], snapshot.view.vectors_at, query_embeddings[row],
+                    bm25_weight, semantic_weight, top_k, candidate_depth,
+                    strategy=fusion, rrf_k=config.RRF_K, positions=positions
+                )
+                for row in range(len(queries))
+            ]
+
         # Retrieve text and metadata for top results
-        top_results = []
-        for idx in top_indices:
-            if idx < len(self.bm25_corpus):
-                result = {
-                    "text": self.bm25_corpus[idx],
-                    "score": combined_scores[idx],
-                }
-                
-                # Find and add metadata if available
-                for meta in self.chunk_metadata:
-                    if meta.get("global_index") == idx:
-                        result["metadata"] = meta
-                        break
-                
-                top_results.append(result)
-        
-        print(f"✅ Found {len(top_results)} results.", flush=True)
-        
-        return top_results
+        with search_stage_seconds.time("metadata_join"):
+            batch_results = []
+            for top_positions, top_scores in ranked:
+                top_results = []
+                for position, score in zip(top_positions, top_scores):
+                    record = snapshot.view.record(int(position))
+                    top_results.append({
+                        "text": record["text"],
+                        "score": float(score),
+                        # Metadata is stored at the same position as the chunk
+                        "metadata": record["metadata"],
+                    })
+                batch_results.append(top_results)
+
+        return batch_results
 
 # Create a singleton instance to be imported by other modules
 document_embedder = DocumentEmbedder()
@@ -205,5 +1125,5 @@ document_embedder = DocumentEmbedder()
 def store_text_embeddings(text, document_id=None, filename=None):
     return document_embedder.store_text_embeddings(text, document_id, filename)
 
-def search(query, top_k=5):
-    return document_embedder.search(query, top_k=top_k)
\ No newline at end of file
+def search(query, top_k=5, **filters):
+    return document_embedder.search(query, top_k=top_k, **filters)
\ No newline at end of file
@@ -0,0 +1,185 @@
+import logging
+import os
+import threading
+import numpy as np
+from app.config import config
+
+logger = logging.getLogger(__name__)
+
+# Supported values for EMBEDDING_BACKEND
+BACKENDS = ("sentence-transformers", "onnx", "onnx-int8")
+
+
+class EmbeddingBackend:
+    """
+    Base class for embedding backends.
+
+    Models are loaded lazily on the first `encode` call (or an explicit
+    `load`), so importing the app does not pay the model's startup cost.
+    """
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self._loaded = False
+        self._load_lock = threading.Lock()
+
+    def load(self):
+        """Load the model now if it has not been loaded yet."""
+        if not self._loaded:
+            with self._load_lock:
+                if not self._loaded:
+                    self._load()
+                    self._loaded = True
+                    logger.info("✅ Loaded %s for %s", type(self).__name__, self.model_name)
+        return self
+
+    def encode(self, texts):
+        """
+        Embed a list of texts.
+
+        Args:
+            texts (list): Strings to embed
+
+        Returns:
+            np.ndarray: float32 matrix with one L2-normalized row per text
+        """
+        self.load()
+        return self._encode(list(texts))
+
+    def _load(self):
+        raise NotImplementedError
+
+    def _encode(self, texts):
+        raise NotImplementedError
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """Full PyTorch SentenceTransformer model."""
+
+    def _load(self):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(self.model_name)
+
+    def _encode(self, texts):
+        return np.asarray(self.model.encode(texts), dtype=np.float32)
+
+
+class OnnxBackend(EmbeddingBackend):
+    """
+    ONNX Runtime CPU backend, optionally with int8 dynamic quantization.
+
+    The transformer is exported to ONNX once and cached under
+    EMBEDDING_MODEL_DIR; mean pooling and normalization match the
+    sentence-transformers pipeline of all-MiniLM-L6-v2.
+    """
+
+    def __init__(self, model_name, quantize=False, cache_dir=None, max_length=256, batch_size=32):
+        super().__init__(model_name)
+        self.quantize = quantize
+        self.cache_dir = cache_dir or config.EMBEDDING_MODEL_DIR
+        self.max_length = max_length
+        self.batch_size = batch_size
+
+    @property
+    def model_dir(self):
+        return os.path.join(self.cache_dir, self.model_name.replace("/", "__"))
+
+    def export(self):
+        """
+        Export (and quantize) the model if not already cached.
+
+        Files are written under a temp name and renamed, so workers racing
+        to export never load a partial model.
+
+        Returns:
+            str: Path of the ONNX model to load
+        """
+        os.makedirs(self.model_dir, exist_ok=True)
+        fp32_path = os.path.join(self.model_dir, "model.onnx")
+        int8_path = os.path.join(self.model_dir, "model.int8.onnx")
+
+        if not os.path.exists(fp32_path):
+            import torch
+            from transformers import AutoModel, AutoTokenizer
+
+            logger.info("🔄 Exporting %s to ONNX...", self.model_name)
+            tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+            model = AutoModel.from_pretrained(self.model_name).eval()
+            dummy = tokenizer(["export example"], return_tensors="pt")
+            input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in dummy]
+            tmp_path = f"{fp32_path}.{os.getpid()}.tmp"
+            with torch.no_grad():
+                torch.onnx.export(
+                    model,
+                    tuple(dummy[name] for name in input_names),
+                    tmp_path,
+                    input_names=input_names,
+                    output_names=["last_hidden_state"],
+                    dynamic_axes={name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]},
+                    opset_version=14
+                )
+            os.replace(tmp_path, fp32_path)
+
+        if not self.quantize:
+            return fp32_path
+
+        if not os.path.exists(int8_path):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            logger.info("🔄 Quantizing %s to int8...", self.model_name)
+            tmp_path = f"{int8_path}.{os.getpid()}.tmp"
+            quantize_dynamic(fp32_path, tmp_path, weight_type=QuantType.QInt8)
+            os.replace(tmp_path, int8_path)
+        return int8_path
+
+    def _load(self):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        model_path = self.export()
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def _encode(self, texts):
+        outputs = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start:start + self.batch_size]
+            tokens = self.tokenizer(
+                batch, padding=True, truncation=True, max_length=self.max_length, return_tensors="np"
+            )
+            inputs = {name: tokens[name].astype(np.int64) for name in self.input_names}
+            hidden = self.session.run(None, inputs)[0]
+
+            # Mean pooling over real tokens, then L2 normalization
+            mask = tokens["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            outputs.append(pooled.astype(np.float32))
+        if not outputs:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.concatenate(outputs)
+
+
+def create_backend(name=None, model_name=None):
+    """
+    Create an embedding backend by name.
+
+    Args:
+        name (str): One of BACKENDS, defaults to config.EMBEDDING_BACKEND
+        model_name (str): Model id, defaults to config.EMBEDDING_MODEL
+
+    Returns:
+        EmbeddingBackend: The (not yet loaded) backend
+    """
+    name = name or config.EMBEDDING_BACKEND
+    model_name = model_name or config.EMBEDDING_MODEL
+    if name == "sentence-transformers":
+        return SentenceTransformerBackend(model_name)
+    if name == "onnx":
+        return OnnxBackend(model_name)
+    if name == "onnx-int8":
+        return OnnxBackend(model_name, quantize=True)
+    raise ValueError(f"Unknown embedding backend: {name}")
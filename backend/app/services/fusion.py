@@ -0,0 +1,132 @@
+import numpy as np
+
+# Ways of combining keyword (BM25) and semantic scores
+MINMAX = "minmax"
+ZSCORE = "zscore"
+RRF = "rrf"
+STRATEGIES = (MINMAX, ZSCORE, RRF)
+
+
+def top_k_indices(scores, k):
+    """
+    Indices of the k highest scores, best first, ties broken by index.
+
+    Selects in linear time, so only the k winners are sorted.
+    """
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if k < len(scores):
+        threshold = np.partition(scores, len(scores) - k)[len(scores) - k]
+        above = np.flatnonzero(scores > threshold)
+        ties = np.flatnonzero(scores == threshold)[:k - len(above)]
+        top = np.concatenate([above, ties])
+    else:
+        top = np.arange(len(scores))
+    return top[np.lexsort((top, -scores[top]))]
+
+
+def minmax_normalize(scores):
+    """Scale scores to [0, 1]; all-equal scores carry no signal and become 0."""
+    lo, hi = scores.min(), scores.max()
+    if hi <= lo:
+        return np.zeros_like(scores)
+    return (scores - lo) / (hi - lo)
+
+
+def zscore_normalize(scores):
+    """Center scores on their mean in units of standard deviation."""
+    std = scores.std()
+    if std == 0:
+        return np.zeros_like(scores)
+    return (scores - scores.mean()) / std
+
+
+def reciprocal_ranks(scores, k):
+    """1 / (k + rank) for each score, with rank 1 for the highest."""
+    order = np.argsort(-scores, kind="stable")
+    ranks = np.empty(len(scores), dtype=np.float64)
+    ranks[order] = np.arange(1, len(scores) + 1)
+    return 1.0 / (k + ranks)
+
+
+def fuse(keyword_scores, semantic_scores, keyword_weight, semantic_weight, strategy=MINMAX, rrf_k=60):
+    """
+    Combine both retrievers' scores for one set of candidates.
+
+    Args:
+        keyword_scores (np.ndarray): BM25 score per candidate (0 = no match)
+        semantic_scores (np.ndarray): Embedding similarity per candidate
+        keyword_weight (float): Weight of the keyword scores
+        semantic_weight (float): Weight of the semantic scores
+        strategy (str): "minmax" or "zscore" (weighted sum of normalized
+            scores), or "rrf" (weighted reciprocal rank fusion)
+        rrf_k (int): Rank offset for reciprocal rank fusion
+
+    Returns:
+        np.ndarray: Fused score per candidate, higher is better
+    """
+    keyword_scores = np.asarray(keyword_scores, dtype=np.float64)
+    semantic_scores = np.asarray(semantic_scores, dtype=np.float64)
+    if not len(keyword_scores):
+        return keyword_scores
+    if strategy == MINMAX:
+        return keyword_weight * minmax_normalize(keyword_scores) + semantic_weight * minmax_normalize(semantic_scores)
+    if strategy == ZSCORE:
+        return keyword_weight * zscore_normalize(keyword_scores) + semantic_weight * zscore_normalize(semantic_scores)
+    if strategy == RRF:
+        # Candidates without a keyword match are not in the keyword ranking
+        keyword_ranks = np.where(keyword_scores > 0, reciprocal_ranks(keyword_scores, rrf_k), 0.0)
+        return keyword_weight * keyword_ranks + semantic_weight * reciprocal_ranks(semantic_scores, rrf_k)
+    raise ValueError(f"Unknown fusion strategy: {strategy}")
+
+
+def hybrid_rank(keyword_scores, semantic_ids, vectors_at, query_embedding, keyword_weight, semantic_weight,
+                top_k, depth, strategy=MINMAX, rrf_k=60, positions=None):
+    """
+    Rank one query's candidates from both retrievers.
+
+    The candidates are the `depth` best keyword matches plus the nearest
+    neighbours found by the vector search. Every candidate is scored by both
+    retrievers: BM25 scores come from the full score array, and semantic
+    similarities are recomputed exactly from the stored embeddings, so a
+    keyword-only candidate is not treated as semantically irrelevant and
+    scores do not depend on which neighbours an approximate index returned.
+
+    Args:
+        keyword_scores (np.ndarray): BM25 score of every position (or of
+            `positions`), with deleted positions scored 0
+        semantic_ids (np.ndarray): Positions found by the vector search
+            (-1 for padding)
+        vectors_at (callable): Returns the stored embeddings of positions
+        query_embedding (np.ndarray): L2-normalized query embedding
+        keyword_weight, semantic_weight (float): Retriever weights
+        top_k (int): Results to return
+        depth (int): Keyword candidates to consider
+        strategy (str): Fusion strategy, see `fuse`
+        rrf_k (int): Rank offset for reciprocal rank fusion
+        positions (np.ndarray): Sorted positions scored by `keyword_scores`
+            when the search is filtered; vector search results must lie
+            among them
+
+    Returns:
+        tuple: (positions, fused scores), best first
+    """
+    # Queries match few chunks, so select among the matches only
+    keyword_ids = np.flatnonzero(keyword_scores > 0)
+    if len(keyword_ids) > depth:
+        keyword_ids = keyword_ids[top_k_indices(keyword_scores[keyword_ids], depth)]
+    if positions is not None:
+        keyword_ids = positions[keyword_ids]
+    candidates = np.union1d(keyword_ids, semantic_ids[semantic_ids >= 0])
+    if not len(candidates):
+        return candidates, np.zeros(0, dtype=np.float64)
+    if positions is None:
+        candidate_keyword_scores = keyword_scores[candidates]
+    else:
+        candidate_keyword_scores = keyword_scores[np.searchsorted(positions, candidates)]
+
+    # Embeddings are L2-normalized, so the dot product is cosine similarity
+    semantic_scores = vectors_at(candidates) @ np.asarray(query_embedding, dtype=np.float32)
+    fused = fuse(candidate_keyword_scores, semantic_scores, keyword_weight, semantic_weight, strategy, rrf_k)
+    order = top_k_indices(fused, top_k)
+    return candidates[order], fused[order]
@@ -0,0 +1,280 @@
+import datetime
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from app.config import config
+from app.services.collection_manager import collection_manager
+from app.services.extractor import iter_pages, pdf_page_count
+from app.services.metrics import ingest_stage_seconds, timed_iter
+
+logger = logging.getLogger(__name__)
+
+# Job states, in the order a successful job moves through them
+QUEUED = "queued"
+EXTRACTING = "extracting"
+EMBEDDING = "embedding"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+def remove_stored_files(document_id, directory, keep=None):
+    """Delete stored upload files of a document in `directory`, except `keep`."""
+    for filename in os.listdir(directory):
+        if filename.startswith(f"{document_id}_") and filename != keep:
+            os.remove(os.path.join(directory, filename))
+
+
+class IngestJobManager:
+    """
+    Runs document ingestion on background worker threads.
+
+    Uploads are queued and return immediately with a job id. Each worker
+    takes up to INGEST_BATCH_SIZE queued jobs, extracts their text, and
+    indexes them together so they share one embedding pass and one segment.
+    PDFs over INGEST_STREAM_MIN_PAGES pages are instead streamed page by
+    page, so their memory use does not grow with their size.
+
+    Job state is mirrored to JOBS_DIR, so when several server processes
+    share the data directory, any of them can report on any job. Jobs are
+    indexed into the collection they name, and a batch is split by
+    collection.
+    """
+
+    JOBS_DIR = "data/jobs"
+
+    def __init__(self, collections, workers=None, batch_size=None, batch_window=None, max_jobs=None):
+        self.collections = collections
+        os.makedirs(self.JOBS_DIR, exist_ok=True)
+        self.batch_size = batch_size or config.INGEST_BATCH_SIZE
+        self.batch_window = config.INGEST_BATCH_WINDOW_SECONDS if batch_window is None else batch_window
+        self.max_jobs = max_jobs or config.INGEST_MAX_JOBS
+        self.jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self.workers = workers or config.INGEST_WORKERS
+        self._start_workers()
+        if hasattr(os, "register_at_fork"):
+            # Threads do not survive fork (e.g. gunicorn --preload): start them again
+            os.register_at_fork(after_in_child=self._start_workers)
+
+    def _start_workers(self):
+        # A fresh queue: the parent's may still list its now missing threads as waiters
+        self._queue = queue.Queue()
+        for _ in range(self.workers):
+            threading.Thread(target=self._worker, daemon=True).start()
+
+    def submit(self, filepath, filename, document_id=None, metadata=None, replace=False, collection=None):
+        """
+        Queue a stored file for ingestion.
+
+        Args:
+            filepath (str): Path of the saved upload
+            filename (str): Original filename
+            document_id (str): Document id, generated if omitted
+            metadata (dict): Extra document details returned with the job
+            replace (bool): Replace the stored document with the same id
+            collection (str): Collection to index into (None for the default)
+
+        Returns:
+            dict: Snapshot of the new job
+        """
+        now = datetime.datetime.now().isoformat()
+        job = {
+            "job_id": str(uuid.uuid4()),
+            "document_id": document_id or str(uuid.uuid4()),
+            "filename": filename,
+            "file_path": filepath,
+            "replace": replace,
+            "collection": collection,
+            "status": QUEUED,
+            "progress": 0.0,
+            "created_at": now,
+            "updated_at": now,
+            "chunks_processed": None,
+            "duplicate_of": None,
+            "reused_embeddings": None,
+            "character_count": None,
+            "error": None,
+            **(metadata or {}),
+        }
+        with self._lock:
+            self.jobs[job["job_id"]] = job
+            self._save_job(job)
+            self._evict_finished()
+        self._queue.put(job["job_id"])
+        return dict(job)
+
+    def get(self, job_id):
+        """Return a snapshot of a job, or None if unknown."""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job:
+                return dict(job)
+        # Possibly submitted to another server process
+        try:
+            with open(self._job_path(job_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _job_path(self, job_id):
+        # Job ids are UUIDs; never let a request path escape the jobs directory
+        return os.path.join(self.JOBS_DIR, f"{os.path.basename(job_id)}.json")
+
+    def _save_job(self, job):
+        """Mirror a job to disk. Caller holds the lock."""
+        path = self._job_path(job["job_id"])
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(job, f)
+        os.replace(tmp_path, path)
+
+    def _evict_finished(self):
+        """Drop the oldest finished jobs once more than max_jobs are tracked."""
+        excess = len(self.jobs) - self.max_jobs
+        for job_id in [j for j, job in self.jobs.items() if job["status"] in (COMPLETED, FAILED)][:max(excess, 0)]:
+            del self.jobs[job_id]
+            try:
+                os.remove(self._job_path(job_id))
+            except OSError:
+                pass
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job:
+                job.update(fields, updated_at=datetime.datetime.now().isoformat())
+                self._save_job(job)
+
+    def _next_batch(self):
+        """Block for one job, then collect more arriving within the batch window."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self._process(batch)
+            except Exception as e:
+                logger.error("❌ Ingestion batch failed: %s", e)
+                for job_id in batch:
+                    self._update(job_id, status=FAILED, error=str(e))
+
+    def _process(self, job_ids):
+        documents = []
+        for job_id in job_ids:
+            job = self.get(job_id)
+            if job is None:
+                continue
+            self._update(job_id, status=EXTRACTING, progress=0.1)
+            try:
+                if self._should_stream(job):
+                    self._process_stream(job)
+                    continue
+                with ingest_stage_seconds.time("extract"):
+                    pages = list(iter_pages(job["file_path"], job["filename"]))
+            except Exception as e:
+                self._fail(job, str(e))
+                continue
+            character_count = sum(len(text) for _, text in pages)
+            if not any(text.strip() for _, text in pages):
+                self._fail(job, "No text could be extracted from the document.")
+                continue
+            self._update(job_id, status=EMBEDDING, progress=0.4, character_count=character_count)
+            documents.append((job, pages))
+
+        if not documents:
+            return
+
+        by_collection = {}
+        for job, pages in documents:
+            by_collection.setdefault(job.get("collection"), []).append((job, pages))
+        for collection, documents in by_collection.items():
+            logger.info("🔹 Indexing %s document(s) in one batch", len(documents))
+            results = self.collections.get(collection, create=True).store_documents([
+                {"pages": pages, "document_id": job["document_id"], "filename": job["filename"], "replace": job["replace"]}
+                for job, pages in documents
+            ])
+            for (job, _), result in zip(documents, results):
+                self._complete(job, result)
+
+    def _should_stream(self, job):
+        """Large PDFs are streamed on their own rather than joining a batch."""
+        if not job["filename"].lower().endswith(".pdf"):
+            return False
+        job["page_count"] = pdf_page_count(job["file_path"])
+        self._update(job["job_id"], page_count=job["page_count"])
+        return job["page_count"] > config.INGEST_STREAM_MIN_PAGES
+
+    def _process_stream(self, job):
+        """Extract, chunk and embed a document page by page."""
+        character_count = 0
+
+        def pages():
+            nonlocal character_count
+            # Extraction overlaps embedding, so only time spent producing pages counts
+            extracted = timed_iter(iter_pages(job["file_path"], job["filename"]), ingest_stage_seconds, "extract")
+            for page_number, text in extracted:
+                character_count += len(text)
+                self._update(
+                    job["job_id"],
+                    status=EMBEDDING,
+                    progress=0.1 + 0.8 * page_number / job["page_count"],
+                    character_count=character_count
+                )
+                yield page_number, text
+
+        logger.info("🔹 Streaming %s (%s pages)", job['filename'], job['page_count'])
+        result = self.collections.get(job.get("collection"), create=True).store_document_stream(
+            pages(), job["document_id"], job["filename"], replace=job["replace"]
+        )
+        if not result["chunks"] and result["duplicate_of"] is None:
+            self._fail(job, "No text could be extracted from the document.")
+            return
+        self._complete(job, result)
+
+    def _complete(self, job, result):
+        self._update(
+            job["job_id"],
+            status=COMPLETED,
+            progress=1.0,
+            chunks_processed=result["chunks"],
+            duplicate_of=result["duplicate_of"],
+            reused_embeddings=result["reused_embeddings"]
+        )
+        if result["duplicate_of"] is not None:
+            # The original copy is already stored and indexed (an unchanged
+            # replacement keeps its new file, and the old one is removed below)
+            if result["duplicate_of"] != job["document_id"] and os.path.exists(job["file_path"]):
+                os.remove(job["file_path"])
+            logger.info("⏭️ %s duplicates document %s, skipped.", job['filename'], result['duplicate_of'])
+        else:
+            logger.info("✅ Text embeddings stored for %s! Processed %s chunks.", job['filename'], result['chunks'])
+        if job["replace"]:
+            # Only now that the new version is indexed can the old file go
+            directory, keep = os.path.split(job["file_path"])
+            remove_stored_files(job["document_id"], directory, keep=keep)
+
+    def _fail(self, job, error):
+        self._update(job["job_id"], status=FAILED, error=error)
+        if os.path.exists(job["file_path"]):
+            os.remove(job["file_path"])  # Clean up the file
+
+
+# Create a singleton instance to be imported by other modules
+ingest_jobs = IngestJobManager(collection_manager)
@@ -1,9 +1,20 @@
-import requests
-import json
+import aiohttp
 import asyncio
+import json
+import logging
+import time
 from app.config import config
+from app.services.context import build_context
+from app.services.metrics import llm_request_seconds, llm_time_to_first_token_seconds, llm_tokens_per_second
+
+logger = logging.getLogger(__name__)
 
 OPENROUTER_API_KEY = config.OPENROUTER_API_KEY
+CHAT_COMPLETIONS_URL = f"{config.OPENROUTER_BASE_URL}/chat/completions"
+
+# Shared client state, created lazily inside the running event loop
+_session = None
+_semaphore = None
 
 def create_prompt(question, context):
     """Format the prompt for the LLM."""
@@ -16,140 +27,162 @@ Question: {question}
 
 Answer:"""
 
-async def ask_llm_streaming(question, context_chunks):
+def get_session():
     """
-    Stream responses from OpenRouter.
-    
-    Args:
-        question (str): User's question
-        context_chunks (list): List of relevant text chunks from search
-        
-    Yields:
-        str: Text chunks formatted as Server-Sent Events
+    Return the shared aiohttp session, creating it on first use.
+
+    The session keeps a pool of keep-alive connections to OpenRouter so
+    requests skip the TCP/TLS handshake, and a semaphore bounds how many
+    LLM calls run at once.
     """
-    # Extract text from each context chunk if they are dictionaries
-    if context_chunks and isinstance(context_chunks[0], dict):
-        text_chunks = [chunk.get('text', '') for chunk in context_chunks]
-    else:
-        text_chunks = context_chunks
-    
-    # Format context with clear separations
-    context = "\n\n---\n\n".join(text_chunks)
-    
-    # Format prompt with instructions
-    prompt = create_prompt(question, context)
-    
-    # Prepare the API request
+    global _session, _semaphore
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=config.LLM_POOL_SIZE,
+            keepalive_timeout=config.LLM_KEEPALIVE_SECONDS
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=config.LLM_TOTAL_TIMEOUT_SECONDS,
+            sock_connect=config.LLM_CONNECT_TIMEOUT_SECONDS
+        )
+        _session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        _semaphore = asyncio.Semaphore(config.LLM_MAX_CONCURRENCY)
+    return _session
+
+async def close_session():
+    """Close the shared session (called on application shutdown)."""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+def build_request(question, context, stream):
+    """Build headers and JSON body for a chat completion request."""
     headers = {
         "Authorization": f"Bearer {OPENROUTER_API_KEY}",
         "Content-Type": "application/json"
     }
-    
     data = {
         "model": "mistralai/mixtral-8x7b-instruct",
         "messages": [
             {"role": "system", "content": "You are a helpful assistant that provides accurate information based on context from retrieved documents."},
-            {"role": "user", "content": prompt}
+            {"role": "user", "content": create_prompt(question, context)}
         ],
-        "stream": True,
-        "temperature": 0.1  
+        "stream": stream,
+        "temperature": 0.1
     }
-    
+    return headers, data
+
+async def ask_llm_streaming(question, context):
+    """
+    Stream responses from OpenRouter.
+
+    Args:
+        question (str): User's question
+        context (str | list): Assembled context (see build_context), or
+            relevant chunks from search, which are assembled here
+
+    Yields:
+        str: Text chunks formatted as Server-Sent Events
+    """
+    if not isinstance(context, str):
+        context = build_context(context)["text"]
+
+    # Prepare the API request
+    headers, data = build_request(question, context, stream=True)
+
     try:
-        response = requests.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            json=data,
-            headers=headers,
-            stream=True
-        )
-        
-        # Check for errors
-        if response.status_code != 200:
-            error_msg = f"Error from OpenRouter API: {response.status_code} - {response.text}"
-            yield f"data: {json.dumps({'error': error_msg})}\n\n"
-            return
-            
-        # Process the streaming response
-        for line in response.iter_lines():
-            if line:
-                # Remove the "data: " prefix if present
-                line_text = line.decode('utf-8')
-                if line_text.startswith("data: "):
-                    line_text = line_text[6:]  # Remove "data: " prefix
-                
-                # Skip empty lines or "[DONE]"
-                if line_text == "[DONE]" or not line_text.strip():
-                    continue
-                    
-                try:
-                    # Parse the JSON response
-                    json_data = json.loads(line_text)
-                    
-                    # Extract content if available
-                    if "choices" in json_data and json_data["choices"]:
-                        choice = json_data["choices"][0]
-                        if "delta" in choice and "content" in choice["delta"]:
-                            content = choice["delta"]["content"]
-                            if content:
-                                # Yield as server-sent event
-                                yield f"data: {json.dumps({'content': content})}\n\n"
-                                await asyncio.sleep(0.01)  # Small delay for smoother streaming
-                except json.JSONDecodeError:
-                    # Skip lines that aren't valid JSON
-                    continue
-                
+        session = get_session()
+        async with _semaphore:
+            # Timed from when the request is sent, not while waiting for the semaphore
+            started = time.perf_counter()
+            first_token_at = None
+            tokens = 0
+            async with session.post(CHAT_COMPLETIONS_URL, json=data, headers=headers) as response:
+                # Check for errors
+                if response.status != 200:
+                    error_msg = f"Error from OpenRouter API: {response.status} - {await response.text()}"
+                    yield f"data: {json.dumps({'error': error_msg})}\n\n"
+                    return
+
+                # Process the streaming response line by line as it arrives
+                async for line in response.content:
+                    # Remove the "data: " prefix if present
+                    line_text = line.decode('utf-8').strip()
+                    if line_text.startswith("data: "):
+                        line_text = line_text[6:]  # Remove "data: " prefix
+
+                    # Skip empty lines or "[DONE]"
+                    if line_text == "[DONE]" or not line_text:
+                        continue
+
+                    try:
+                        # Parse the JSON response
+                        json_data = json.loads(line_text)
+
+                        # Extract content if available
+                        if "choices" in json_data and json_data["choices"]:
+                            choice = json_data["choices"][0]
+                            if "delta" in choice and "content" in choice["delta"]:
+                                content = choice["delta"]["content"]
+                                if content:
+                                    # OpenRouter streams about one token per delta
+                                    tokens += 1
+                                    if first_token_at is None:
+                                        first_token_at = time.perf_counter()
+                                        llm_time_to_first_token_seconds.observe(first_token_at - started)
+                                    # Yield as server-sent event
+                                    yield f"data: {json.dumps({'content': content})}\n\n"
+                    except json.JSONDecodeError:
+                        # Skip lines that aren't valid JSON
+                        continue
+
+            finished = time.perf_counter()
+            llm_request_seconds.observe(finished - started, "stream")
+            if tokens > 1 and finished > first_token_at:
+                llm_tokens_per_second.observe((tokens - 1) / (finished - first_token_at))
+
         # End of stream marker
         yield f"data: {json.dumps({'content': '', 'end': True})}\n\n"
-        
+
     except Exception as e:
         # Handle any exceptions
         error_msg = f"Error generating response: {str(e)}"
         yield f"data: {json.dumps({'error': error_msg})}\n\n"
-        print(f"❌ {error_msg}", flush=True)
+        logger.error("❌ %s", error_msg)
 
-def ask_llm(question, context):
+async def ask_llm(question, context):
     """
     Non-streaming version for backwards compatibility.
     Generates a complete response from OpenRouter.
-    
+
     Args:
         question (str): User's question
         context (str): Context information
-        
+
     Returns:
         dict: The LLM's response
     """
-    headers = {
-        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    
-    prompt = create_prompt(question, context)
-    
-    data = {
-        "model": "mistralai/mixtral-8x7b-instruct",
-        "messages": [
-            {"role": "system", "content": "You are a helpful assistant that provides accurate information based on context from retrieved documents."},
-            {"role": "user", "content": prompt}
-        ],
-        "stream": False,
-        "temperature": 0.1
-    }
-    
+    headers, data = build_request(question, context, stream=False)
+
     try:
-        response = requests.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            json=data,
-            headers=headers
-        )
-        
-        response_data = response.json()
-        
+        session = get_session()
+        async with _semaphore:
+            started = time.perf_counter()
+            async with session.post(CHAT_COMPLETIONS_URL, json=data, headers=headers) as response:
+                response_data = await response.json(content_type=None)
+            elapsed = time.perf_counter() - started
+
         if "choices" in response_data and response_data["choices"]:
+            llm_request_seconds.observe(elapsed, "complete")
+            # Without streaming the first token is not observable, so this includes it
+            completion_tokens = (response_data.get("usage") or {}).get("completion_tokens")
+            if completion_tokens and elapsed > 0:
+                llm_tokens_per_second.observe(completion_tokens / elapsed)
             answer = response_data["choices"][0]["message"]["content"]
             return {"answer": answer}
         else:
             return {"error": "Failed to get response from LLM"}
-            
+
     except Exception as e:
-        return {"error": f"Error: {str(e)}"}
\ No newline at end of file
+        return {"error": f"Error: {str(e)}"}
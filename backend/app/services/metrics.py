@@ -0,0 +1,145 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# Upper bounds of prompt context size buckets (tokens)
+TOKEN_BUCKETS = (100, 250, 500, 750, 1000, 1500, 2000, 3000, 4000, 6000, 8000, 16000)
+# Upper bounds of generation throughput buckets (tokens per second)
+THROUGHPUT_BUCKETS = (1, 5, 10, 20, 30, 50, 75, 100, 150, 200, 300, 500)
+
+
+class Histogram:
+    """
+    Cumulative histogram in the Prometheus text exposition format.
+
+    Observations cost one bisect and a few additions under a lock, so they
+    are cheap enough for every request.
+
+    Args:
+        name (str): Metric name
+        description (str): HELP text
+        label_name (str): Optional single label (such as "stage") that splits
+            the histogram into one series per label value
+        buckets (tuple): Increasing bucket upper bounds; +Inf is implied
+    """
+
+    def __init__(self, name, description, label_name=None, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_name = label_name
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, label=None):
+        """Record one observation, under `label` if the histogram has a label."""
+        with self._lock:
+            series = self._series.get(label)
+            if series is None:
+                series = self._series[label] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0}
+            series["counts"][bisect.bisect_left(self.buckets, value)] += 1
+            series["sum"] += value
+
+    @contextmanager
+    def time(self, label=None):
+        """Observe the wall time spent in a `with` block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, label)
+
+    def _labels(self, label, le=None):
+        pairs = []
+        if self.label_name is not None:
+            pairs.append(f'{self.label_name}="{label}"')
+        if le is not None:
+            pairs.append(f'le="{le}"')
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self):
+        """Exposition-format lines for this histogram."""
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {label: (list(s["counts"]), s["sum"]) for label, s in self._series.items()}
+        for label, (counts, total) in sorted(series.items(), key=lambda item: str(item[0])):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{self._labels(label, bound)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(label)} {total}")
+            lines.append(f"{self.name}_count{self._labels(label)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Every histogram exported on /metrics."""
+
+    def __init__(self):
+        self.histograms = []
+
+    def histogram(self, name, description, label_name=None, buckets=LATENCY_BUCKETS):
+        histogram = Histogram(name, description, label_name, buckets)
+        self.histograms.append(histogram)
+        return histogram
+
+    def render(self):
+        """The whole registry in the Prometheus text exposition format."""
+        return "\n".join(line for histogram in self.histograms for line in histogram.render()) + "\n"
+
+
+def timed_iter(iterable, histogram, label=None):
+    """
+    Yield from an iterable, observing the total time spent producing its
+    items (not the time the consumer spends on them) once it is exhausted.
+    """
+    elapsed = 0.0
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            elapsed += time.perf_counter() - start
+            break
+        elapsed += time.perf_counter() - start
+        yield item
+    histogram.observe(elapsed, label)
+
+
+# Create a singleton registry and the application's metrics
+metrics = MetricsRegistry()
+
+search_seconds = metrics.histogram(
+    "rag_search_seconds", "Hybrid search latency, including result cache hits"
+)
+search_stage_seconds = metrics.histogram(
+    "rag_search_stage_seconds",
+    "Time per search stage: query_embed, bm25, vector_search, fusion, metadata_join",
+    label_name="stage"
+)
+llm_time_to_first_token_seconds = metrics.histogram(
+    "rag_llm_time_to_first_token_seconds", "Time from sending an LLM request to its first streamed token"
+)
+llm_request_seconds = metrics.histogram(
+    "rag_llm_request_seconds", "Total LLM request time", label_name="mode"
+)
+llm_tokens_per_second = metrics.histogram(
+    "rag_llm_tokens_per_second", "LLM generation throughput after the first token",
+    buckets=THROUGHPUT_BUCKETS
+)
+rerank_seconds = metrics.histogram(
+    "rag_rerank_seconds", "Cross-encoder reranking time per request, by outcome: reranked or fallback",
+    label_name="outcome"
+)
+context_tokens = metrics.histogram(
+    "rag_context_tokens", "Tokens of retrieved context per LLM prompt", buckets=TOKEN_BUCKETS
+)
+ingest_stage_seconds = metrics.histogram(
+    "rag_ingest_stage_seconds",
+    "Time per upload stage: extract, embed, persist, index",
+    label_name="stage"
+)
@@ -0,0 +1,111 @@
+import logging
+import threading
+import time
+import numpy as np
+from app.config import config
+from app.services.cache import LRUCache, MISSING
+from app.services.dedup import content_hash
+from app.services.metrics import rerank_seconds
+
+logger = logging.getLogger(__name__)
+
+
+class CrossEncoderReranker:
+    """
+    Re-scores search results with a cross-encoder, within a latency budget.
+
+    A cross-encoder reads the query and a passage together, so it ranks
+    passages more precisely than the fused BM25 and embedding scores, at
+    the cost of one forward pass per pair. Scores are cached per (query,
+    chunk content) pair, and pairs are scored in batches on the CPU. Before
+    each batch the expected time of the batch is checked against the
+    budget; if it would not fit, the results keep their fused order.
+
+    The model is loaded on first use (or an explicit `load`).
+
+    Args:
+        model_name (str): sentence-transformers CrossEncoder model
+        batch_size (int): Pairs per forward pass
+        cache_size (int): Cached (query, chunk) scores
+    """
+
+    def __init__(self, model_name, batch_size=16, cache_size=10000):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.scores = LRUCache(cache_size)
+        # Moving average of the seconds one pair takes to score
+        self.pair_seconds = None
+        self._model = None
+        self._load_lock = threading.Lock()
+
+    def load(self):
+        """Load the model now if it has not been loaded yet."""
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+                    self._model = CrossEncoder(self.model_name, device="cpu", max_length=config.CHUNK_MAX_TOKENS * 2)
+                    logger.info("✅ Loaded cross-encoder %s", self.model_name)
+        return self
+
+    def _predict(self, pairs):
+        start = time.perf_counter()
+        scores = self._model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+        per_pair = (time.perf_counter() - start) / len(pairs)
+        self.pair_seconds = per_pair if self.pair_seconds is None else 0.8 * self.pair_seconds + 0.2 * per_pair
+        return np.asarray(scores, dtype=np.float64)
+
+    def rerank(self, query, results, top_k, budget_seconds=None, min_score=None):
+        """
+        Reorder search results by cross-encoder score.
+
+        Args:
+            query (str): The search query
+            results (list): Search results in fused order (the candidate pool)
+            top_k (int): Results to return
+            budget_seconds (float): Give up and keep the fused order if
+                scoring would take longer (None: no limit)
+            min_score (float): Drop reranked results scoring below this,
+                keeping at least one (None: keep all)
+
+        Returns:
+            list: Up to top_k results, each with a "rerank_score" unless the
+                budget ran out and the fused order was kept
+        """
+        start = time.perf_counter()
+        self.load()
+        keys = [(query, result["metadata"].get("content_hash") or content_hash(result["text"])) for result in results]
+        scores = [self.scores.get(key) for key in keys]
+        missing = [i for i, score in enumerate(scores) if score is MISSING]
+
+        for lo in range(0, len(missing), self.batch_size):
+            batch = missing[lo:lo + self.batch_size]
+            if budget_seconds is not None and self.pair_seconds is not None:
+                expected = time.perf_counter() - start + len(batch) * self.pair_seconds
+                if expected > budget_seconds:
+                    rerank_seconds.observe(time.perf_counter() - start, "fallback")
+                    logger.debug("⏱️ Rerank budget exceeded for: %s", query)
+                    return results[:top_k]
+            # Scores computed before running out of budget are still cached
+            for i, score in zip(batch, self._predict([(query, results[i]["text"]) for i in batch])):
+                scores[i] = float(score)
+                self.scores.put(keys[i], scores[i])
+
+        order = np.argsort(-np.asarray(scores), kind="stable")[:top_k]
+        reranked = [dict(results[i], rerank_score=scores[i]) for i in order]
+        if min_score is not None:
+            reranked = reranked[:1] + [result for result in reranked[1:] if result["rerank_score"] >= min_score]
+        rerank_seconds.observe(time.perf_counter() - start, "reranked")
+        return reranked
+
+
+# Create a singleton instance to be imported by other modules
+reranker = CrossEncoderReranker(config.RERANK_MODEL, config.RERANK_BATCH_SIZE, config.RERANK_CACHE_SIZE)
+if config.RERANK_ENABLED and config.EMBEDDING_PRELOAD:
+    reranker.load()
+
+
+def rerank(query, results):
+    """Rerank search results with the configured pool size, budget and cutoff."""
+    budget = config.RERANK_BUDGET_MS / 1000 if config.RERANK_BUDGET_MS > 0 else None
+    return reranker.rerank(query, results, config.RERANK_TOP_K, budget, config.RERANK_MIN_SCORE)
@@ -1,6 +1,6 @@
 from app.services.embedder import document_embedder
 
-def search(query, top_k=5):
+def search(query, top_k=5, **filters):
     """
     Performs hybrid search on the indexed documents.
     
@@ -10,11 +10,13 @@ def search(query, top_k=5):
     Args:
         query (str): The search query
         top_k (int): Number of results to return
+        **filters: document_ids, uploaded_after and uploaded_before, see
+            DocumentEmbedder.search
         
     Returns:
         list: Top matching results with text and metadata
     """
-    return document_embedder.search(query, top_k=top_k)
+    return document_embedder.search(query, top_k=top_k, **filters)
 
 def load_indexes():
     """
@@ -0,0 +1,617 @@
+import bisect
+import json
+import mmap
+import os
+import shutil
+import threading
+import time
+import uuid
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: locks only cover threads of one process
+    fcntl = None
+
+MANIFEST_FILE = "manifest.json"
+CHUNKS_FILE = "chunks.jsonl"
+OFFSETS_FILE = "offsets.npy"
+VECTORS_FILE = "vectors.npy"
+WRITE_LOCK_FILE = ".write.lock"
+COMPACTION_LOCK_FILE = ".compaction.lock"
+
+# Temp segment dirs younger than this may belong to a writer in another process
+ORPHAN_TMP_AGE_SECONDS = 3600
+# Chunks copied at a time when compaction merges segments
+COMPACTION_BATCH_CHUNKS = 4096
+
+
+def _fsync_dir(path):
+    """Flush a directory entry so a rename survives a crash (no-op where unsupported)."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write_json(path, data):
+    """Write JSON to a temp file, fsync it, then rename it over `path`."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    _fsync_dir(os.path.dirname(path) or ".")
+
+
+class InterProcessLock:
+    """
+    Exclusive lock shared by every thread and process using one store.
+
+    Backed by flock on a lock file, so API workers and the bulk ingest CLI
+    can write to the same data directory. Reentrant within a thread.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def acquire(self, blocking=True):
+        """
+        Returns:
+            bool: False if `blocking` is off and the lock is held elsewhere
+        """
+        if not self._thread_lock.acquire(blocking):
+            return False
+        if self._depth == 0 and fcntl is not None:
+            self._file = open(self.path, "a")
+            try:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                self._file.close()
+                self._file = None
+                self._thread_lock.release()
+                return False
+        self._depth += 1
+        return True
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0 and self._file is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class Segment:
+    """
+    An immutable, memory-mapped batch of chunks.
+
+    Each record is one JSON line ({"text": ..., "metadata": ...}) located via
+    a byte-offset table, and the embeddings live in a .npy file opened with
+    mmap, so nothing is read into RAM until it is accessed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.offsets = np.load(os.path.join(path, OFFSETS_FILE))
+        self.vectors = np.load(os.path.join(path, VECTORS_FILE), mmap_mode="r")
+        self._file = open(os.path.join(path, CHUNKS_FILE), "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def record(self, i):
+        return json.loads(self._data[self.offsets[i]:self.offsets[i + 1]])
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
+
+    @staticmethod
+    def write(path, records, vectors):
+        """Atomically create a segment directory from in-memory records and vectors."""
+        writer = SegmentWriter(path)
+        writer.write(records, vectors)
+        writer.close()
+        writer.install()
+
+
+class SegmentWriter:
+    """
+    Builds a segment incrementally, so large uploads never sit in memory.
+
+    Files are written into a hidden temp directory and fsynced by `close`;
+    `install` then renames the directory into place, so a crash never
+    leaves a partial segment behind under its final name.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.tmp_path = os.path.join(os.path.dirname(path), f".tmp-{os.path.basename(path)}")
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+        os.makedirs(self.tmp_path)
+        self.offsets = [0]
+        self.dim = None
+        self._chunks = open(os.path.join(self.tmp_path, CHUNKS_FILE), "wb")
+        # Vectors are streamed raw and given their .npy header on close
+        self._raw_vectors_path = os.path.join(self.tmp_path, f"{VECTORS_FILE}.raw")
+        self._vectors = open(self._raw_vectors_path, "wb")
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def write(self, records, vectors):
+        """Append {"text", "metadata"} records and their embeddings."""
+        for record in records:
+            line = json.dumps(record).encode("utf-8") + b"\n"
+            self._chunks.write(line)
+            self.offsets.append(self.offsets[-1] + len(line))
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if vectors.ndim == 2 and vectors.shape[1]:
+            self.dim = int(vectors.shape[1])
+        self._vectors.write(vectors.tobytes())
+
+    def close(self):
+        """Finish and fsync the segment files (still under the temp name)."""
+        for f in (self._chunks, self._vectors):
+            f.flush()
+            os.fsync(f.fileno())
+            f.close()
+
+        with open(os.path.join(self.tmp_path, OFFSETS_FILE), "wb") as f:
+            np.save(f, np.asarray(self.offsets, dtype=np.int64))
+            f.flush()
+            os.fsync(f.fileno())
+
+        with open(os.path.join(self.tmp_path, VECTORS_FILE), "wb") as f:
+            np.lib.format.write_array_header_1_0(f, {
+                "descr": np.lib.format.dtype_to_descr(np.dtype(np.float32)),
+                "fortran_order": False,
+                "shape": (len(self), self.dim or 0),
+            })
+            with open(self._raw_vectors_path, "rb") as raw:
+                shutil.copyfileobj(raw, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.remove(self._raw_vectors_path)
+
+    def install(self):
+        """Rename the closed segment to its final name."""
+        os.rename(self.tmp_path, self.path)
+        _fsync_dir(os.path.dirname(self.path))
+
+    def abort(self):
+        """Discard the partially written segment."""
+        self._chunks.close()
+        self._vectors.close()
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+
+
+class ChunkView:
+    """Read-only sequence over one field of every chunk in a SegmentStore or StoreView."""
+
+    def __init__(self, store, field):
+        self._store = store
+        self._field = field
+
+    def __len__(self):
+        return len(self._store)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return self._store.record(i)[self._field]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class StoreView:
+    """
+    Immutable view of the store's segments and tombstones at one moment.
+
+    Appends, deletes and compaction each publish a new view, so a reader
+    holding one keeps a consistent set of chunks however long it takes.
+    """
+
+    def __init__(self, segments, deleted, dim=None):
+        self.segments = list(segments)
+        self.starts = []
+        self.total = 0
+        for segment in self.segments:
+            self.starts.append(self.total)
+            self.total += len(segment)
+        self.deleted = frozenset(deleted)
+        self.deleted_array = np.fromiter(sorted(self.deleted), dtype=np.int64, count=len(self.deleted))
+        self.dim = dim
+        self.texts = ChunkView(self, "text")
+        self.metadata = ChunkView(self, "metadata")
+
+    def __len__(self):
+        return self.total
+
+    def deleted_ids(self):
+        """Tombstoned positions as a sorted int64 array."""
+        return self.deleted_array
+
+    def _locate(self, i):
+        if i < 0:
+            i += self.total
+        if not 0 <= i < self.total:
+            raise IndexError(i)
+        seg = bisect.bisect_right(self.starts, i) - 1
+        return self.segments[seg], i - self.starts[seg]
+
+    def record(self, i):
+        """Return the {"text", "metadata"} record at global position i."""
+        segment, local = self._locate(i)
+        record = segment.record(local)
+        # Positions are assigned when a segment is committed and shift when
+        # compaction purges, so the stored value is not authoritative
+        record["metadata"]["global_index"] = i if i >= 0 else i + self.total
+        return record
+
+    def vectors(self, start=0, end=None):
+        """Return stored embeddings for global positions [start, end)."""
+        end = self.total if end is None else end
+        parts = []
+        for segment, seg_start in zip(self.segments, self.starts):
+            seg_end = seg_start + len(segment)
+            lo, hi = max(start, seg_start), min(end, seg_end)
+            if lo < hi:
+                parts.append(segment.vectors[lo - seg_start:hi - seg_start])
+        if not parts:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        return np.concatenate(parts).astype(np.float32, copy=False)
+
+    def vectors_at(self, positions):
+        """Return stored embeddings for arbitrary global positions, in order."""
+        positions = np.asarray(positions, dtype=np.int64)
+        dim = self.dim or (self.segments[0].vectors.shape[1] if self.segments else 0)
+        vectors = np.empty((len(positions), dim), dtype=np.float32)
+        segs = np.searchsorted(self.starts, positions, side="right") - 1
+        for seg in np.unique(segs):
+            rows = np.flatnonzero(segs == seg)
+            vectors[rows] = self.segments[seg].vectors[positions[rows] - self.starts[seg]]
+        return vectors
+
+
+class SegmentStore:
+    """
+    Append-only, crash-safe storage for chunk text, metadata and vectors.
+
+    Every upload becomes a new segment, so write cost is proportional to the
+    upload rather than the corpus. Deleted chunks are recorded as tombstones
+    in the manifest, which is replaced atomically; compaction merges
+    segments in the background and drops tombstoned chunks.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.manifest_path = os.path.join(root, MANIFEST_FILE)
+        # Swapped as one object so readers never combine a new segment list
+        # with stale offsets
+        self._view = StoreView([], ())
+        self.next_segment = 0
+        # Bumped whenever compaction renumbers positions, so index checkpoints
+        # taken before the renumbering are recognized as stale
+        self.epoch = 0
+        self.dim = None
+        self._lock = threading.Lock()
+        # Identifies the manifest version last read or written by this process
+        self._manifest_key = None
+        self.texts = ChunkView(self, "text")
+        self.metadata = ChunkView(self, "metadata")
+        os.makedirs(root, exist_ok=True)
+        # Writers in every process hold write_lock; compaction runs in one process at a time
+        self.write_lock = InterProcessLock(os.path.join(root, WRITE_LOCK_FILE))
+        self.compaction_lock = InterProcessLock(os.path.join(root, COMPACTION_LOCK_FILE))
+
+    def view(self):
+        """The current immutable StoreView."""
+        return self._view
+
+    @property
+    def segments(self):
+        return self._view.segments
+
+    @property
+    def deleted(self):
+        """Positions of tombstoned chunks."""
+        return self._view.deleted
+
+    def deleted_ids(self):
+        """Tombstoned positions as a sorted int64 array."""
+        return self._view.deleted_ids()
+
+    def exists(self):
+        return os.path.exists(self.manifest_path)
+
+    def load(self, remove_orphans=True):
+        """
+        Open every segment listed in the manifest (memory-mapped).
+
+        Removing orphaned segment directories requires holding `write_lock`
+        when other processes share the store.
+        """
+        with self._lock:
+            self.next_segment = 0
+            self.epoch = 0
+            self._manifest_key = None
+            self._set_view([], frozenset())
+        self.refresh()
+        if remove_orphans:
+            with self._lock:
+                self._remove_orphans()
+
+    def _stat_manifest(self):
+        try:
+            stat = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def manifest_changed(self):
+        """Cheap check (one stat call) for a manifest written by another process."""
+        return self._stat_manifest() != self._manifest_key
+
+    def refresh(self):
+        """
+        Catch up with the manifest, e.g. after another process wrote to the store.
+
+        Segments that are already open are reused, so only new ones get mapped.
+
+        Returns:
+            tuple | None: (previous view, previous epoch), or None if unchanged
+        """
+        with self._lock:
+            key = self._stat_manifest()
+            if key is None or key == self._manifest_key:
+                return None
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            previous = (self._view, self.epoch)
+            opened = {segment.name: segment for segment in self.segments}
+            segments = [
+                opened.get(name) or Segment(os.path.join(self.root, name))
+                for name in manifest["segments"]
+            ]
+            self.next_segment = manifest["next_segment"]
+            self.epoch = manifest.get("epoch", 0)
+            self.dim = manifest.get("dim")
+            self._manifest_key = key
+            self._set_view(segments, frozenset(manifest.get("deleted", ())))
+            return previous
+
+    def _set_view(self, segments, deleted):
+        self._view = StoreView(segments, deleted, self.dim)
+
+    def _remove_orphans(self):
+        """Delete temp dirs and segments left behind by a crash or compaction."""
+        live = {segment.name for segment in self.segments}
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if not os.path.isdir(path) or name in live:
+                continue
+            if name.startswith(".tmp-") and time.time() - os.path.getmtime(path) < ORPHAN_TMP_AGE_SECONDS:
+                # May still be in progress in another process
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+
+    def _write_manifest(self, segments, deleted):
+        atomic_write_json(self.manifest_path, {
+            "segments": [segment.name for segment in segments],
+            "next_segment": self.next_segment,
+            "dim": self.dim,
+            "epoch": self.epoch,
+            "deleted": sorted(deleted),
+        })
+        self._manifest_key = self._stat_manifest()
+
+    def _segment_name(self):
+        """Reserve a segment name; the suffix keeps names unique across processes."""
+        name = f"seg_{self.next_segment:08d}_{uuid.uuid4().hex[:8]}"
+        self.next_segment += 1
+        return name
+
+    def __len__(self):
+        return len(self._view)
+
+    def record(self, i):
+        """Return the {"text", "metadata"} record at global position i."""
+        return self._view.record(i)
+
+    def vectors(self, start=0, end=None):
+        """Return stored embeddings for global positions [start, end)."""
+        return self._view.vectors(start, end)
+
+    def append(self, texts, metadatas, vectors):
+        """
+        Durably add a batch of chunks as a new segment.
+
+        Returns:
+            int: Global position of the first appended chunk
+        """
+        writer = self.writer()
+        writer.write(({"text": t, "metadata": m} for t, m in zip(texts, metadatas)), vectors)
+        return self.commit(writer)
+
+    def writer(self):
+        """
+        Start a new segment to be filled incrementally.
+
+        Nothing is visible to readers until the writer is passed to
+        `commit`; call `abort()` on it to discard it instead.
+        """
+        with self._lock:
+            name = self._segment_name()
+        return SegmentWriter(os.path.join(self.root, name))
+
+    def commit(self, writer):
+        """
+        Close a segment writer and append its segment to the store.
+
+        When other processes share the store, hold `write_lock` and call
+        `refresh` first, or their changes to the manifest are lost.
+
+        Returns:
+            int: Global position of the segment's first chunk
+        """
+        writer.close()
+        with self._lock:
+            writer.install()
+            if writer.dim:
+                self.dim = writer.dim
+            segments = self.segments + [Segment(writer.path)]
+            self._write_manifest(segments, self.deleted)
+            start = len(self)
+            self._set_view(segments, self.deleted)
+            return start
+
+    def delete(self, positions):
+        """
+        Tombstone chunks by position.
+
+        Only the manifest is rewritten; the chunks stay readable until
+        compaction, and searches must filter them out.
+
+        Returns:
+            int: Number of newly tombstoned chunks
+        """
+        with self._lock:
+            view = self._view
+            segments, deleted = view.segments, view.deleted
+            new = {int(p) for p in positions if 0 <= p < len(view)} - deleted
+            if new:
+                deleted = deleted | new
+                self._write_manifest(segments, deleted)
+                self._set_view(segments, deleted)
+            return len(new)
+
+    def prepare_compaction(self, min_segments=2, purge=True, view=None):
+        """
+        Write a merged segment of all segments in a view.
+
+        With `purge`, tombstoned chunks are dropped and later positions move
+        down. Runs without holding the store lock, so appends, deletes and
+        reads continue. Chunks are copied from the memory-mapped segments
+        COMPACTION_BATCH_CHUNKS at a time, so memory use does not grow with
+        the store. The result must be passed to `commit_compaction`.
+
+        Args:
+            min_segments (int): Skip merging fewer segments unless purging
+            purge (bool): Drop tombstoned chunks
+            view (StoreView): View to compact, defaults to the current one;
+                must not be older than the last committed compaction
+
+        Returns:
+            dict | None: Compaction plan, or None if there is nothing to do
+        """
+        with self._lock:
+            view = view or self._view
+            segments, starts, total = view.segments, view.starts, view.total
+            purged = set(view.deleted) if purge else set()
+            if len(segments) < min_segments and not purged:
+                return None
+            name = self._segment_name()
+
+        kept = np.array([p for p in range(total) if p not in purged], dtype=np.int64)
+
+        writer = SegmentWriter(os.path.join(self.root, name))
+        if not len(kept):
+            writer.write([], np.zeros((0, self.dim or 0), dtype=np.float32))
+        new_position = 0
+        for segment, start in zip(segments, starts):
+            rows = kept[(kept >= start) & (kept < start + len(segment))] - start
+            for lo in range(0, len(rows), COMPACTION_BATCH_CHUNKS):
+                batch = rows[lo:lo + COMPACTION_BATCH_CHUNKS]
+                records = []
+                for row in batch:
+                    record = segment.record(row)
+                    record["metadata"]["global_index"] = new_position
+                    new_position += 1
+                    records.append(record)
+                # Fancy indexing a memory-mapped array reads only these rows
+                writer.write(records, segment.vectors[batch])
+        writer.close()
+
+        return {
+            # Opened under its temp name until commit_compaction installs it
+            "segment": Segment(writer.tmp_path),
+            "writer": writer,
+            "merged": segments,
+            "merged_total": total,
+            "kept": kept,
+            "purged": bool(purged),
+        }
+
+    def commit_compaction(self, plan):
+        """
+        Swap a prepared merged segment into the manifest.
+
+        Segments appended since `prepare_compaction` follow the merged one,
+        shifted down by the number of purged chunks, and tombstones added
+        meanwhile are renumbered to match.
+        """
+        with self._lock:
+            segments, deleted = self.segments, self.deleted
+            merged_total = plan["merged_total"]
+            kept = plan["kept"]
+            shift = merged_total - len(kept)
+
+            remapped = set()
+            for position in deleted:
+                if position >= merged_total:
+                    remapped.add(position - shift)
+                else:
+                    new_position = int(np.searchsorted(kept, position))
+                    if new_position < len(kept) and kept[new_position] == position:
+                        # Deleted after the merged segment was written
+                        remapped.add(new_position)
+
+            plan["writer"].install()
+            segments = [Segment(plan["writer"].path)] + segments[len(plan["merged"]):]
+            if plan["purged"]:
+                self.epoch += 1
+            self._write_manifest(segments, remapped)
+            self._set_view(segments, frozenset(remapped))
+
+        for segment in plan["merged"]:
+            # Readers holding old segment objects keep their mmaps alive until GC
+            shutil.rmtree(segment.path, ignore_errors=True)
+
+    def compact(self, purge=True):
+        """
+        Merge all segments (and drop tombstoned chunks) in one step.
+
+        Returns:
+            bool: True if segments were merged
+        """
+        plan = self.prepare_compaction(purge=purge)
+        if plan is None:
+            return False
+        self.commit_compaction(plan)
+        return True
@@ -0,0 +1,270 @@
+import numpy as np
+from app.services.bm25 import IncrementalBM25, bm25_idf
+from app.services.vector_index import add_vectors, search_index
+
+
+class IndexLayer:
+    """
+    BM25 postings and FAISS vectors for a contiguous range of chunk positions.
+
+    Document ids inside a layer are local (0-based), so a layer never needs
+    rebuilding when compaction shifts it; only its `start` changes. Layers
+    are never mutated once published in a snapshot.
+    """
+
+    def __init__(self, start, bm25_index, faiss_index):
+        self.start = start
+        self.bm25_index = bm25_index
+        self.faiss_index = faiss_index
+
+    @property
+    def count(self):
+        return self.bm25_index.corpus_size
+
+    @property
+    def end(self):
+        return self.start + self.count
+
+    def shifted(self, start):
+        """The same layer placed at another start position."""
+        return IndexLayer(start, self.bm25_index, self.faiss_index)
+
+    @classmethod
+    def build(cls, start, texts, vectors):
+        """Index chunk texts and their embeddings as a new layer."""
+        bm25_index = IncrementalBM25()
+        bm25_index.add_documents(texts)
+        faiss_index = add_vectors(None, vectors) if len(vectors) else None
+        return cls(start, bm25_index, faiss_index)
+
+
+def range_positions(ranges):
+    """All positions in a list of [start, end) ranges, in order."""
+    if not ranges:
+        return np.zeros(0, dtype=np.int64)
+    return np.concatenate([np.arange(start, end, dtype=np.int64) for start, end in ranges])
+
+
+class IndexSnapshot:
+    """
+    Immutable, consistent view of the chunk store and its search indexes.
+
+    Searches read one snapshot reference and never take a lock. The single
+    writer builds a new snapshot (appending a layer, or replacing the store
+    view after a delete) and swaps it in with one assignment, so a reader
+    never sees a corpus and an index of different lengths.
+
+    Args:
+        view (StoreView): Chunk texts, metadata and tombstones
+        layers (list): IndexLayers covering positions [0, len(view)) in order
+        generation (int): Bumped with every new snapshot; keys result caches
+        documents (dict): Document id -> (start, end, uploaded_at) of every
+            live document, for filtered search
+    """
+
+    def __init__(self, view, layers, generation, documents=None):
+        self.view = view
+        self.layers = tuple(layers)
+        self.generation = generation
+        self.documents = documents or {}
+
+    def __len__(self):
+        return len(self.view)
+
+    @property
+    def live(self):
+        """Number of chunks that are not tombstoned."""
+        return len(self.view) - len(self.view.deleted)
+
+    def filter_ranges(self, document_ids=None, uploaded_after=None, uploaded_before=None):
+        """
+        Position ranges of the documents matching a filter.
+
+        Args:
+            document_ids (list): Only these documents
+            uploaded_after (float): Only documents uploaded at or after this
+                Unix time; documents without an upload time never match
+            uploaded_before (float): Only documents uploaded before this Unix time
+
+        Returns:
+            list: Sorted, non-overlapping [start, end) ranges; adjacent
+                documents are merged
+        """
+        if document_ids is not None:
+            entries = [self.documents[d] for d in dict.fromkeys(document_ids) if d in self.documents]
+        else:
+            entries = self.documents.values()
+        timed = uploaded_after is not None or uploaded_before is not None
+        ranges = []
+        for start, end, uploaded_at in sorted(entries):
+            if timed and (uploaded_at is None
+                          or (uploaded_after is not None and uploaded_at < uploaded_after)
+                          or (uploaded_before is not None and uploaded_at >= uploaded_before)):
+                continue
+            if ranges and ranges[-1][1] == start:
+                ranges[-1] = (ranges[-1][0], end)
+            else:
+                ranges.append((start, end))
+        return ranges
+
+    def _layer_ranges(self, ranges):
+        """Split global ranges into (layer, local start, local end) pieces."""
+        pieces = []
+        for start, end in ranges:
+            for layer in self.layers:
+                lo, hi = max(start, layer.start), min(end, layer.end)
+                if lo < hi:
+                    pieces.append((layer, lo - layer.start, hi - layer.start))
+        return pieces
+
+    def _bm25_statistics(self, terms):
+        """Corpus-wide idf per term and average document length across layers."""
+        corpus_size = sum(layer.count for layer in self.layers)
+        total_length = sum(layer.bm25_index.total_length for layer in self.layers)
+        avgdl = total_length / corpus_size if corpus_size else 0.0
+        idfs = {
+            term: bm25_idf(sum(layer.bm25_index.document_frequency(term) for layer in self.layers), corpus_size)
+            for term in terms
+        }
+        return idfs, avgdl
+
+    def bm25_scores(self, query_tokens):
+        """
+        Score every chunk with corpus-wide BM25 statistics.
+
+        Returns:
+            np.ndarray: Score per position; tombstoned chunks score zero
+        """
+        idfs, avgdl = self._bm25_statistics(set(query_tokens))
+        parts = [layer.bm25_index.get_scores(query_tokens, idfs=idfs, avgdl=avgdl) for layer in self.layers]
+        scores = np.concatenate(parts) if parts else np.zeros(0, dtype=np.float32)
+        scores[self.view.deleted_ids()] = 0.0
+        return scores
+
+    def bm25_scores_batch(self, query_token_lists):
+        """
+        Score every chunk against several queries at once.
+
+        Returns:
+            np.ndarray: Scores of shape (queries, positions); tombstoned
+                chunks score zero
+        """
+        idfs, avgdl = self._bm25_statistics({term for tokens in query_token_lists for term in tokens})
+        parts = [
+            layer.bm25_index.get_scores_batch(query_token_lists, idfs=idfs, avgdl=avgdl)
+            for layer in self.layers
+        ]
+        scores = np.concatenate(parts, axis=1) if parts else np.zeros((len(query_token_lists), 0), dtype=np.float32)
+        scores[:, self.view.deleted_ids()] = 0.0
+        return scores
+
+    def bm25_scores_in(self, query_token_lists, ranges):
+        """
+        Score only the chunks in some position ranges, with corpus-wide statistics.
+
+        Costs time proportional to the ranges, not the corpus.
+
+        Returns:
+            tuple: (positions, scores of shape (queries, positions));
+                tombstoned chunks score zero
+        """
+        idfs, avgdl = self._bm25_statistics({term for tokens in query_token_lists for term in tokens})
+        positions = range_positions(ranges)
+        parts = [
+            layer.bm25_index.get_scores_batch(query_token_lists, idfs=idfs, avgdl=avgdl, start=lo, end=hi)
+            for layer, lo, hi in self._layer_ranges(ranges)
+        ]
+        scores = np.concatenate(parts, axis=1) if parts else np.zeros((len(query_token_lists), 0), dtype=np.float32)
+        scores[:, self._deleted_mask(positions)] = 0.0
+        return positions, scores
+
+    def _deleted_mask(self, positions):
+        deleted = self.view.deleted_ids()
+        if not len(deleted):
+            return np.zeros(len(positions), dtype=bool)
+        found = np.minimum(np.searchsorted(deleted, positions), len(deleted) - 1)
+        return deleted[found] == positions
+
+    def exact_neighbours(self, query_vectors, k, ranges):
+        """
+        Nearest live neighbours within position ranges, by brute force over
+        the stored vectors (cheaper than an index search for small ranges).
+
+        Returns:
+            tuple: (squared L2 distances, positions), each of shape
+                (queries, <= k), padded with inf / -1
+        """
+        query_vectors = np.asarray(query_vectors, dtype=np.float32)
+        positions = range_positions(ranges)
+        live = ~self._deleted_mask(positions)
+        positions = positions[live]
+        k = min(k, len(positions))
+        if not k:
+            return (np.full((len(query_vectors), 0), np.inf, dtype=np.float32),
+                    np.full((len(query_vectors), 0), -1, dtype=np.int64))
+        vectors = np.concatenate([self.view.vectors(start, end) for start, end in ranges])[live]
+        distances = (
+            (vectors * vectors).sum(axis=1)[None, :]
+            - 2 * query_vectors @ vectors.T
+            + (query_vectors * query_vectors).sum(axis=1)[:, None]
+        )
+        nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        order = np.argsort(np.take_along_axis(distances, nearest, axis=1), axis=1, kind="stable")
+        nearest = np.take_along_axis(nearest, order, axis=1)
+        return np.take_along_axis(distances, nearest, axis=1), positions[nearest]
+
+    def search_vectors(self, query_vectors, k, nprobe=None, ef_search=None, ranges=None):
+        """
+        Nearest live neighbours across all layers.
+
+        Each layer is searched for up to k neighbours, skipping tombstones,
+        and the per-layer results are merged by distance. With `ranges`,
+        only positions inside them are searched, through FAISS id
+        selectors, and layers outside them are skipped.
+
+        Returns:
+            tuple: (distances, positions), each of shape (queries, <= k),
+                padded with inf / -1 where a layer found too few neighbours
+        """
+        query_vectors = np.asarray(query_vectors, dtype=np.float32)
+        deleted = self.view.deleted_ids()
+        distances = []
+        positions = []
+        if ranges is None:
+            pieces = [(layer, None) for layer in self.layers]
+        else:
+            by_layer = {}
+            for layer, lo, hi in self._layer_ranges(ranges):
+                by_layer.setdefault(id(layer), (layer, []))[1].append((lo, hi))
+            pieces = list(by_layer.values())
+        for layer, local_ranges in pieces:
+            if layer.faiss_index is None:
+                continue
+            lo, hi = np.searchsorted(deleted, [layer.start, layer.end])
+            size = layer.count - (hi - lo) if local_ranges is None else sum(end - start for start, end in local_ranges)
+            layer_k = int(min(k, size))
+            if layer_k <= 0:
+                continue
+            D, I = search_index(
+                layer.faiss_index,
+                query_vectors,
+                layer_k,
+                nprobe=nprobe,
+                ef_search=ef_search,
+                exclude_ids=deleted[lo:hi] - layer.start,
+                include_ranges=local_ranges
+            )
+            # ANN indexes pad with -1 when fewer than k neighbours are found
+            missing = I < 0
+            distances.append(np.where(missing, np.inf, D))
+            positions.append(np.where(missing, -1, I + layer.start))
+
+        if not distances:
+            return (np.full((len(query_vectors), 0), np.inf, dtype=np.float32),
+                    np.full((len(query_vectors), 0), -1, dtype=np.int64))
+        if len(distances) > 1:
+            distances = np.concatenate(distances, axis=1)
+            positions = np.concatenate(positions, axis=1)
+            order = np.argsort(distances, axis=1, kind="stable")[:, :k]
+            return np.take_along_axis(distances, order, axis=1), np.take_along_axis(positions, order, axis=1)
+        return distances[0], positions[0]
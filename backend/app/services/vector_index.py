@@ -0,0 +1,219 @@
+import faiss
+import logging
+import numpy as np
+from app.config import config
+
+logger = logging.getLogger(__name__)
+
+# Supported values for FAISS_INDEX_TYPE
+INDEX_TYPES = ("flat", "hnsw", "ivfflat", "ivfpq")
+# Bits per PQ code; each sub-quantizer learns 2**PQ_NBITS centroids
+PQ_NBITS = 8
+
+
+def index_type_of(index):
+    """Return the INDEX_TYPES name for an existing FAISS index."""
+    if index is None:
+        return None
+    base = faiss.downcast_index(index)
+    if isinstance(base, faiss.IndexIDMap):
+        base = faiss.downcast_index(base.index)
+    if isinstance(base, faiss.IndexHNSWFlat):
+        return "hnsw"
+    if isinstance(base, faiss.IndexIVFPQ):
+        return "ivfpq"
+    if isinstance(base, faiss.IndexIVFFlat):
+        return "ivfflat"
+    return "flat"
+
+
+def min_training_vectors(index_type):
+    """Number of vectors needed before an index of this type can be trained."""
+    if index_type == "ivfflat":
+        # FAISS warns below ~39 points per centroid
+        return max(config.FAISS_MIN_TRAIN_VECTORS, 39 * config.FAISS_NLIST)
+    if index_type == "ivfpq":
+        # The PQ codebooks also need a training point per centroid, or training raises
+        return max(config.FAISS_MIN_TRAIN_VECTORS, 39 * config.FAISS_NLIST, 2 ** PQ_NBITS)
+    return 0
+
+
+def create_index(dim, index_type=None):
+    """
+    Create an empty (possibly untrained) FAISS index.
+
+    Args:
+        dim (int): Embedding dimension
+        index_type (str): One of INDEX_TYPES, defaults to config.FAISS_INDEX_TYPE
+
+    Returns:
+        faiss.Index: The new index
+    """
+    index_type = index_type or config.FAISS_INDEX_TYPE
+    if index_type == "flat":
+        return faiss.IndexFlatL2(dim)
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, config.FAISS_HNSW_M)
+        index.hnsw.efConstruction = config.FAISS_EF_CONSTRUCTION
+        return index
+    quantizer = faiss.IndexFlatL2(dim)
+    if index_type == "ivfflat":
+        return faiss.IndexIVFFlat(quantizer, dim, config.FAISS_NLIST)
+    if index_type == "ivfpq":
+        return faiss.IndexIVFPQ(quantizer, dim, config.FAISS_NLIST, config.FAISS_PQ_M, PQ_NBITS)
+    raise ValueError(f"Unknown FAISS index type: {index_type}")
+
+
+def all_vectors(index):
+    """Reconstruct every stored vector of an index as a float32 matrix."""
+    if index.ntotal == 0:
+        return np.zeros((0, index.d), dtype="float32")
+    base = faiss.downcast_index(index)
+    if isinstance(base, faiss.IndexIVF):
+        base.make_direct_map()
+    return base.reconstruct_n(0, index.ntotal)
+
+
+def migrate_index(index, index_type=None):
+    """
+    Copy every vector of `index` into a new index of `index_type`.
+
+    Vector order is preserved, so positions still line up with the BM25
+    corpus and chunk metadata. IVF indexes are trained on the stored vectors.
+
+    Args:
+        index (faiss.Index): Source index, usually the legacy IndexFlatL2
+        index_type (str): Target type, defaults to config.FAISS_INDEX_TYPE
+
+    Returns:
+        faiss.Index: The populated target index
+    """
+    index_type = index_type or config.FAISS_INDEX_TYPE
+    vectors = np.ascontiguousarray(all_vectors(index), dtype="float32")
+    target = create_index(index.d, index_type)
+    if not target.is_trained:
+        target.train(vectors)
+    target.add(vectors)
+    return target
+
+
+def add_vectors(index, vectors, index_type=None):
+    """
+    Add vectors, creating or upgrading the index as needed.
+
+    A flat index is used until enough vectors exist to train the configured
+    IVF index, at which point the store is migrated in place.
+
+    Args:
+        index (faiss.Index | None): Current index
+        vectors (np.ndarray): New embeddings
+        index_type (str): Desired index type, defaults to config.FAISS_INDEX_TYPE
+
+    Returns:
+        faiss.Index: The index holding the new vectors
+    """
+    index_type = index_type or config.FAISS_INDEX_TYPE
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+
+    if index is None:
+        if min_training_vectors(index_type) > len(vectors):
+            index = create_index(vectors.shape[1], "flat")
+        else:
+            index = create_index(vectors.shape[1], index_type)
+            if not index.is_trained:
+                index.train(vectors)
+        index.add(vectors)
+        return index
+
+    index.add(vectors)
+    current_type = index_type_of(index)
+    if current_type != index_type and index.ntotal >= min_training_vectors(index_type):
+        logger.info("🔄 Migrating FAISS index from %s to %s...", current_type, index_type)
+        index = migrate_index(index, index_type)
+    return index
+
+
+def exclude_selector(ids):
+    """ID selector matching every id except `ids` (e.g. tombstoned chunks)."""
+    ids = np.ascontiguousarray(ids, dtype="int64")
+    batch = faiss.IDSelectorBatch(len(ids), faiss.swig_ptr(ids))
+    selector = faiss.IDSelectorNot(batch)
+    # The SWIG wrappers do not own their inputs; keep them alive with the selector
+    selector.referenced_objects = [batch, ids]
+    return selector
+
+
+def range_selector(ranges):
+    """ID selector matching ids inside any of the [start, end) `ranges`."""
+    if len(ranges) == 1:
+        return faiss.IDSelectorRange(int(ranges[0][0]), int(ranges[0][1]))
+    ids = np.concatenate([np.arange(start, end, dtype="int64") for start, end in ranges])
+    selector = faiss.IDSelectorBatch(len(ids), faiss.swig_ptr(ids))
+    selector.referenced_objects = [ids]
+    return selector
+
+
+def search_params(index, nprobe=None, ef_search=None, selector=None):
+    """
+    Build per-request search parameters for an index.
+
+    Args:
+        index (faiss.Index): Index being searched
+        nprobe (int): IVF lists to probe, defaults to config.FAISS_NPROBE
+        ef_search (int): HNSW candidate list size, defaults to config.FAISS_EF_SEARCH
+        selector (faiss.IDSelector): Restricts which ids may be returned
+
+    Returns:
+        faiss.SearchParameters | None: Parameters, or None for an unfiltered flat index
+    """
+    index_type = index_type_of(index)
+    if index_type in ("ivfflat", "ivfpq"):
+        params = faiss.SearchParametersIVF(nprobe=nprobe or config.FAISS_NPROBE)
+    elif index_type == "hnsw":
+        params = faiss.SearchParametersHNSW(efSearch=ef_search or config.FAISS_EF_SEARCH)
+    elif selector is not None:
+        params = faiss.SearchParameters()
+    else:
+        return None
+    if selector is not None:
+        params.sel = selector
+    return params
+
+
+def search_index(index, query_vectors, k, nprobe=None, ef_search=None, exclude_ids=None, include_ranges=None):
+    """
+    Search an index with per-request recall/latency parameters.
+
+    `exclude_ids` (such as tombstoned chunks) are filtered inside FAISS, so
+    up to k live neighbours are still returned. `include_ranges`, a list of
+    [start, end) id ranges, likewise restricts the search to those ids.
+    """
+    query_vectors = np.ascontiguousarray(query_vectors, dtype="float32")
+    selector = exclude_selector(exclude_ids) if exclude_ids is not None and len(exclude_ids) else None
+    if include_ranges is not None:
+        include = range_selector(include_ranges)
+        if selector is not None:
+            both = faiss.IDSelectorAnd(include, selector)
+            both.referenced_objects = [include, selector]
+            include = both
+        selector = include
+    params = search_params(index, nprobe=nprobe, ef_search=ef_search, selector=selector)
+    if params is None:
+        return index.search(query_vectors, k)
+    return index.search(query_vectors, k, params=params)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert a stored FAISS index to another index type.")
+    parser.add_argument("--index-file", default="data/faiss.index")
+    parser.add_argument("--type", choices=INDEX_TYPES, default=config.FAISS_INDEX_TYPE)
+    parser.add_argument("--output", help="Defaults to overwriting --index-file")
+    args = parser.parse_args()
+
+    source = faiss.read_index(args.index_file)
+    print(f"🔄 Migrating {source.ntotal} vectors from {index_type_of(source)} to {args.type}...", flush=True)
+    migrated = migrate_index(source, args.type)
+    faiss.write_index(migrated, args.output or args.index_file)
+    print(f"✅ Wrote {args.type} index to {args.output or args.index_file}", flush=True)
@@ -0,0 +1,72 @@
+"""
+Recall@k and latency of each approximate FAISS index against the exact flat baseline.
+
+Usage (from the backend directory):
+    python -m benchmarks.ann_recall --vectors 100000 --queries 1000 --k 20
+    python -m benchmarks.ann_recall --index-file data/faiss.index
+"""
+import argparse
+import time
+import faiss
+import numpy as np
+from app.services.vector_index import all_vectors, create_index, search_index
+
+
+def recall_at_k(exact_ids, approx_ids):
+    """Fraction of the exact top-k neighbours found by the approximate search."""
+    hits = sum(len(set(e) & set(a)) for e, a in zip(exact_ids, approx_ids))
+    return hits / exact_ids.size
+
+
+def build(index_type, vectors):
+    index = create_index(vectors.shape[1], index_type)
+    start = time.perf_counter()
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return index, time.perf_counter() - start
+
+
+def timed_search(index, queries, k, **params):
+    start = time.perf_counter()
+    _, ids = search_index(index, queries, k, **params)
+    return ids, (time.perf_counter() - start) / len(queries) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index-file", help="Benchmark vectors from an existing index instead of random data")
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 32, 64, 128])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.index_file:
+        vectors = all_vectors(faiss.read_index(args.index_file)).astype("float32")
+    else:
+        vectors = rng.standard_normal((args.vectors, args.dim), dtype=np.float32)
+    queries = vectors[rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)]
+    queries = queries + rng.normal(scale=0.01, size=queries.shape).astype("float32")
+
+    flat, _ = build("flat", vectors)
+    exact_ids, flat_ms = timed_search(flat, queries, args.k)
+    print(f"{'index':<10} {'param':<14} {'recall@' + str(args.k):>10} {'ms/query':>10} {'build s':>9}")
+    print(f"{'flat':<10} {'-':<14} {1.0:>10.4f} {flat_ms:>10.3f} {'-':>9}")
+
+    for index_type in ("hnsw", "ivfflat", "ivfpq"):
+        index, build_s = build(index_type, vectors)
+        if index_type == "hnsw":
+            sweeps = [("ef_search", value) for value in args.ef_search]
+        else:
+            sweeps = [("nprobe", value) for value in args.nprobe]
+        for name, value in sweeps:
+            ids, ms = timed_search(index, queries, args.k, **{name: value})
+            print(f"{index_type:<10} {f'{name}={value}':<14} {recall_at_k(exact_ids, ids):>10.4f} {ms:>10.3f} {build_s:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Compare embedding backends: startup time, encode throughput, RSS and parity.
+
+Each backend runs in a fresh subprocess so startup time and peak RSS are not
+polluted by previously loaded models. Parity is the cosine similarity between
+each backend's embeddings and the sentence-transformers reference.
+
+Usage (from the backend directory):
+    python -m benchmarks.embedding_backends --texts 2000
+    python -m benchmarks.embedding_backends --backends sentence-transformers onnx-int8 --min-cosine 0.98
+"""
+import argparse
+import multiprocessing
+import resource
+import sys
+import time
+import numpy as np
+from app.services.embedding_backends import BACKENDS, create_backend
+
+
+def peak_rss_mb():
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes on Linux
+    return usage / (1024 * 1024) if sys.platform == "darwin" else usage / 1024
+
+
+def sample_texts(count):
+    rng = np.random.default_rng(0)
+    words = ("retrieval augmented generation document index vector search keyword ranking "
+             "model answer context question latency memory throughput chunk embedding").split()
+    return [" ".join(rng.choice(words, size=rng.integers(8, 120))) for _ in range(count)]
+
+
+def measure(name, texts, results):
+    start = time.perf_counter()
+    backend = create_backend(name)
+    backend.encode(texts[:1])
+    startup = time.perf_counter() - start
+
+    start = time.perf_counter()
+    embeddings = backend.encode(texts)
+    elapsed = time.perf_counter() - start
+    results.put({
+        "backend": name,
+        "startup_s": startup,
+        "texts_per_s": len(texts) / elapsed,
+        "peak_rss_mb": peak_rss_mb(),
+        "embeddings": embeddings,
+    })
+
+
+def run_isolated(name, texts):
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    process = ctx.Process(target=measure, args=(name, texts, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--min-cosine", type=float, default=0.98,
+                        help="Fail if any embedding's cosine similarity to the reference is lower")
+    args = parser.parse_args()
+
+    texts = sample_texts(args.texts)
+    reference = run_isolated("sentence-transformers", texts)
+    results = [reference] + [run_isolated(name, texts) for name in args.backends if name != "sentence-transformers"]
+
+    print(f"{'backend':<22} {'startup s':>10} {'texts/s':>10} {'peak RSS MB':>12} {'min cos':>8} {'mean cos':>9}")
+    failed = False
+    for result in results:
+        cosine = np.sum(result["embeddings"] * reference["embeddings"], axis=1)
+        failed = failed or cosine.min() < args.min_cosine
+        print(f"{result['backend']:<22} {result['startup_s']:>10.2f} {result['texts_per_s']:>10.1f} "
+              f"{result['peak_rss_mb']:>12.0f} {cosine.min():>8.4f} {cosine.mean():>9.4f}")
+
+    if failed:
+        raise SystemExit(f"❌ Backend parity below {args.min_cosine}")
+    print("✅ All backends match the reference embeddings")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Cost of hybrid score fusion per query as the corpus grows.
+
+Times the vectorized fusion strategies (candidate selection, exact
+similarity of the candidates, fusion and top-k) against the per-chunk
+Python dict loop search used before, on synthetic BM25 scores and nearest
+neighbour ids. Retrieval itself (BM25 scoring, the FAISS search) is not
+included.
+
+Usage (from the backend directory):
+    python -m benchmarks.fusion --chunks 10000 100000 1000000
+"""
+import argparse
+import time
+import numpy as np
+from app.services.fusion import STRATEGIES, hybrid_rank
+
+
+def legacy_fusion(bm25_scores, distances, ids, bm25_weight, semantic_weight, top_k):
+    """The previous fusion: a dict entry per chunk, normalized by the top-20 neighbours."""
+    bm25_norm = bm25_scores / np.max(bm25_scores) if np.max(bm25_scores) > 0 else bm25_scores
+    semantic_scores = 1 - (distances / np.max(distances)) if np.max(distances) > 0 else 1 - distances
+    combined = {}
+    for i, score in enumerate(bm25_norm):
+        combined[i] = bm25_weight * score
+    for pos, idx in enumerate(ids):
+        combined[idx] = combined.get(idx, 0) + semantic_weight * semantic_scores[pos]
+    return sorted(combined, key=lambda x: combined[x], reverse=True)[:top_k]
+
+
+def synthetic_query(rng, chunks, match_rate, depth):
+    """Sparse BM25 scores and a list of nearest neighbour ids for one query."""
+    bm25_scores = np.zeros(chunks, dtype=np.float32)
+    matches = rng.choice(chunks, size=max(1, int(chunks * match_rate)), replace=False)
+    bm25_scores[matches] = rng.gamma(2.0, 2.0, size=len(matches))
+    neighbours = rng.choice(chunks, size=min(depth, chunks), replace=False)
+    return bm25_scores, neighbours
+
+
+def time_per_query(fn, queries):
+    start = time.perf_counter()
+    for query in queries:
+        fn(*query)
+    return (time.perf_counter() - start) / len(queries) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--legacy-queries", type=int, default=3, help="The dict loop is slow at scale")
+    parser.add_argument("--match-rate", type=float, default=0.02, help="Fraction of chunks matching a query term")
+    parser.add_argument("--depth", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    # Candidate embeddings are gathered from a fixed pool so 1M chunks fit in memory
+    pool = rng.standard_normal((100000, args.dim), dtype=np.float32)
+    pool /= np.linalg.norm(pool, axis=1, keepdims=True)
+    vectors_at = lambda positions: pool[positions % len(pool)]
+
+    print(f"{'chunks':>9} {'strategy':<8} {'ms/query':>10}")
+    for chunks in args.chunks:
+        queries = []
+        for _ in range(args.queries):
+            bm25_scores, neighbours = synthetic_query(rng, chunks, args.match_rate, args.depth)
+            query_embedding = vectors_at(neighbours[:1])[0]
+            queries.append((bm25_scores, neighbours, query_embedding))
+
+        legacy = [
+            (bm25_scores, np.sort(rng.random(20, dtype=np.float32)), neighbours[:20], 0.3, 0.7, args.top_k)
+            for bm25_scores, neighbours, _ in queries[:args.legacy_queries]
+        ]
+        print(f"{chunks:>9} {'legacy':<8} {time_per_query(legacy_fusion, legacy):>10.3f}")
+
+        for strategy in STRATEGIES:
+            fused = [
+                (bm25_scores, neighbours, vectors_at, query_embedding, 0.3, 0.7, args.top_k, args.depth, strategy)
+                for bm25_scores, neighbours, query_embedding in queries
+            ]
+            print(f"{chunks:>9} {strategy:<8} {time_per_query(hybrid_rank, fused):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
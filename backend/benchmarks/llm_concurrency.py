@@ -0,0 +1,63 @@
+"""
+Show that concurrent /ask streams run in parallel on the shared async client.
+
+Starts the local stub OpenRouter server, then runs the same streaming request
+once and N times concurrently. With a non-blocking client the concurrent wall
+time stays close to a single stream instead of growing N-fold.
+
+Usage (from the backend directory):
+    python -m benchmarks.llm_concurrency --streams 16 --tokens 50 --delay 0.02
+"""
+import argparse
+import asyncio
+import time
+from app.services import llm
+from benchmarks.stub_openrouter import start_server
+
+
+async def consume(question):
+    events = 0
+    async for event in llm.ask_llm_streaming(question, ["stub context"]):
+        if '"error"' in event:
+            raise RuntimeError(event)
+        events += 1
+    return events
+
+
+async def run(streams, tokens, delay):
+    runner, base_url = await start_server(tokens=tokens, delay=delay)
+    llm.CHAT_COMPLETIONS_URL = f"{base_url}/chat/completions"
+    try:
+        start = time.perf_counter()
+        await consume("warm-up")
+        single = time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(consume(f"question {i}") for i in range(streams)))
+        concurrent = time.perf_counter() - start
+    finally:
+        await llm.close_session()
+        await runner.cleanup()
+
+    serial_estimate = single * streams
+    print(f"single stream:        {single:.3f}s ({results[0]} events)")
+    print(f"{streams} concurrent streams: {concurrent:.3f}s")
+    print(f"serial estimate:      {serial_estimate:.3f}s")
+    print(f"parallelism:          {serial_estimate / concurrent:.1f}x")
+    return concurrent < serial_estimate / 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", type=int, default=16)
+    parser.add_argument("--tokens", type=int, default=50)
+    parser.add_argument("--delay", type=float, default=0.02)
+    args = parser.parse_args()
+    parallel = asyncio.run(run(args.streams, args.tokens, args.delay))
+    if not parallel:
+        raise SystemExit("❌ Streams did not run in parallel")
+    print("✅ Streams ran in parallel")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Query-encoding throughput with and without micro-batching.
+
+Runs N client threads that each encode distinct queries back to back, once
+calling the model directly with single-item batches and once through
+QueryEncodingBatcher.
+
+Usage (from the backend directory):
+    python -m benchmarks.query_batching --clients 1 8 64 --seconds 5
+"""
+import argparse
+import threading
+import time
+import numpy as np
+from app.services.embedder import QueryEncodingBatcher
+from app.services.embedding_backends import BACKENDS, create_backend
+
+
+def run_clients(encode, clients, seconds):
+    """Return queries/sec achieved by `clients` threads calling encode()."""
+    counts = [0] * clients
+    stop = time.monotonic() + seconds
+
+    def client(slot):
+        i = 0
+        while time.monotonic() < stop:
+            encode(f"client {slot} query {i} about retrieval augmented generation")
+            i += 1
+        counts[slot] = i
+
+    threads = [threading.Thread(target=client, args=(slot,)) for slot in range(clients)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / (time.monotonic() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=BACKENDS, default=None)
+    parser.add_argument("--model", default=None)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 64])
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--window-ms", type=float, default=2.0)
+    parser.add_argument("--max-batch", type=int, default=64)
+    args = parser.parse_args()
+
+    model = create_backend(args.backend, args.model).load()
+    model.encode(["warm-up"])
+
+    def direct(query):
+        return np.array(model.encode([query]))[0]
+
+    batcher = QueryEncodingBatcher(model.encode, max_batch_size=args.max_batch, window_seconds=args.window_ms / 1000)
+
+    print(f"{'clients':>8} {'direct q/s':>12} {'batched q/s':>12} {'speedup':>8} {'mean batch':>11}")
+    for clients in args.clients:
+        direct_qps = run_clients(direct, clients, args.seconds)
+        before = batcher.stats()
+        batched_qps = run_clients(batcher.encode, clients, args.seconds)
+        after = batcher.stats()
+        batches = after["batches"] - before["batches"]
+        mean_batch = (after["queries"] - before["queries"]) / batches if batches else 0.0
+        print(f"{clients:>8} {direct_qps:>12.1f} {batched_qps:>12.1f} {batched_qps / direct_qps:>7.2f}x {mean_batch:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Local stand-in for the OpenRouter chat completions API.
+
+Streams a fixed number of tokens as SSE with a delay between them, so LLM
+client concurrency and latency can be measured without network access.
+
+Usage (from the backend directory):
+    python -m benchmarks.stub_openrouter --port 8089 --tokens 50 --delay 0.02
+    OPENROUTER_BASE_URL=http://127.0.0.1:8089/api/v1 uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import json
+from aiohttp import web
+
+
+def create_app(tokens=50, delay=0.02):
+    """Build an aiohttp app serving POST /api/v1/chat/completions."""
+
+    async def chat_completions(request):
+        body = await request.json()
+        words = [f"token{i} " for i in range(tokens)]
+
+        if not body.get("stream"):
+            await asyncio.sleep(delay * tokens)
+            return web.json_response({"choices": [{"message": {"content": "".join(words)}}]})
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for word in words:
+            await asyncio.sleep(delay)
+            chunk = {"choices": [{"delta": {"content": word}}]}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    app = web.Application()
+    app.router.add_post("/api/v1/chat/completions", chat_completions)
+    return app
+
+
+async def start_server(host="127.0.0.1", port=0, tokens=50, delay=0.02):
+    """
+    Start the stub server in the running event loop.
+
+    Returns:
+        tuple: (runner, base_url); call `await runner.cleanup()` to stop it
+    """
+    runner = web.AppRunner(create_app(tokens=tokens, delay=delay))
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{bound_port}/api/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--tokens", type=int, default=50)
+    parser.add_argument("--delay", type=float, default=0.02)
+    args = parser.parse_args()
+    web.run_app(create_app(tokens=args.tokens, delay=args.delay), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+"""
+End-to-end benchmark suite: ingest, startup, search and ask.
+
+For each corpus size a synthetic corpus is generated and indexed through
+DocumentEmbedder.store_text_embeddings in a fresh process and a fresh data
+directory. A second fresh process then starts the app (imports app.main,
+which loads the indexes), runs searches through DocumentEmbedder.search and
+/ask requests (answered by the local stub OpenRouter server) at each
+concurrency level. Results are written as JSON so runs can be compared
+across commits.
+
+Measured per corpus size:
+    ingest: chunks/s and documents/s, including background compaction
+    startup: app import time and a repeated load_indexes
+    search and ask: p50/p95/p99 latency and throughput per concurrency level
+    peak RSS of the ingest and the serving process
+
+The embedding model dominates ingest time, so the `small` profile (10k
+chunks) finishes in a few minutes on a laptop CPU; `full` adds 100k and 1M
+chunks. Set EMBEDDING_BACKEND=onnx-int8 for faster CPU ingestion.
+
+Usage (from the backend directory):
+    python -m benchmarks.suite --output results.json
+    python -m benchmarks.suite --profile full --output results.json
+    python -m benchmarks.suite --chunks 20000 --concurrency 1 4 16
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+PROFILES = {
+    "small": {"chunks": [10000], "queries": 200, "concurrency": [1, 8], "ask_requests": 32},
+    "full": {"chunks": [10000, 100000, 1000000], "queries": 1000, "concurrency": [1, 8, 32], "ask_requests": 128},
+}
+
+# Server settings for the benchmark processes: every search and answer is
+# computed (no answer cache), and no other process shares the data directory
+BENCHMARK_ENV = {
+    "ANSWER_CACHE_ENABLED": "false",
+    "INDEX_RELOAD_INTERVAL_SECONDS": "0",
+    "LOG_LEVEL": "WARNING",
+}
+
+
+def peak_rss_mb():
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes on Linux
+    return usage / (1024 * 1024) if sys.platform == "darwin" else usage / 1024
+
+
+def latency_summary(latencies, elapsed):
+    """Percentiles in milliseconds and throughput of one timed run."""
+    latencies = np.asarray(latencies) * 1000
+    return {
+        "requests": len(latencies),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "mean_ms": float(latencies.mean()),
+        "throughput_per_s": len(latencies) / elapsed,
+    }
+
+
+class SyntheticCorpus:
+    """
+    Deterministic pseudo-text with a Zipf-like word distribution, so BM25
+    sees realistic term statistics and queries match some chunks strongly.
+
+    Args:
+        seed (int): Random seed; the same seed generates the same corpus
+        vocabulary_size (int): Distinct words
+    """
+
+    SYLLABLES = ("ka", "ro", "mi", "te", "su", "na", "lo", "vi", "de", "pa", "zu", "he", "to", "ri", "ga", "el")
+
+    def __init__(self, seed=0, vocabulary_size=20000):
+        self.rng = np.random.default_rng(seed)
+        words = set()
+        while len(words) < vocabulary_size:
+            length = self.rng.integers(2, 5)
+            words.add("".join(self.rng.choice(self.SYLLABLES, size=length)))
+        self.words = np.array(sorted(words))
+        ranks = np.arange(1, vocabulary_size + 1)
+        self.frequencies = 1.0 / ranks
+        self.frequencies /= self.frequencies.sum()
+
+    def sentence(self):
+        words = self.rng.choice(self.words, size=self.rng.integers(8, 24), p=self.frequencies)
+        return " ".join(words).capitalize() + "."
+
+    def document(self, words):
+        """A document of roughly `words` words."""
+        sentences = []
+        count = 0
+        while count < words:
+            sentences.append(self.sentence())
+            count += sentences[-1].count(" ") + 1
+        return " ".join(sentences)
+
+    def queries(self, count):
+        """Distinct 2-4 word queries, drawn from the less common words so they are selective."""
+        queries = []
+        seen = set()
+        while len(queries) < count:
+            words = self.rng.choice(self.words[100:], size=self.rng.integers(2, 5))
+            query = " ".join(words)
+            if query not in seen:
+                seen.add(query)
+                queries.append(query)
+        return queries
+
+
+def run_ingest(params):
+    """Index a synthetic corpus of `params["chunks"]` chunks into the working directory."""
+    from app.services.embedder import document_embedder
+    from app.config import config
+
+    corpus = SyntheticCorpus(params["seed"])
+    start = time.perf_counter()
+    document_embedder.embedder.encode(["warm-up"])
+    model_load = time.perf_counter() - start
+
+    # Start from one word per model token and correct the document length
+    # towards `document_chunks` chunks as the chunker's output is seen
+    words_per_document = params["document_chunks"] * config.CHUNK_MAX_TOKENS
+    documents = 0
+    start = time.perf_counter()
+    while len(document_embedder.store) < params["chunks"]:
+        before = len(document_embedder.store)
+        text = corpus.document(words_per_document)
+        document_embedder.store_text_embeddings(text, document_id=f"doc_{documents}", filename=f"doc_{documents}.txt")
+        documents += 1
+        added = len(document_embedder.store) - before
+        if added:
+            words_per_document = max(1, int(words_per_document * params["document_chunks"] / added))
+    elapsed = time.perf_counter() - start
+    chunks = len(document_embedder.store)
+
+    # Checkpoint the indexes, as the background compaction eventually would
+    start = time.perf_counter()
+    document_embedder.compact(force=True)
+    compaction = time.perf_counter() - start
+
+    return {
+        "chunks": chunks,
+        "documents": documents,
+        "model_load_seconds": model_load,
+        "seconds": elapsed,
+        "chunks_per_s": chunks / elapsed,
+        "documents_per_s": documents / elapsed,
+        "compaction_seconds": compaction,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_search(document_embedder, queries, concurrency):
+    def timed(query):
+        start = time.perf_counter()
+        results = document_embedder.search(query)
+        if isinstance(results, dict):
+            raise RuntimeError(results["error"])
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        latencies = list(pool.map(timed, queries))
+    return {"concurrency": concurrency, **latency_summary(latencies, time.perf_counter() - start)}
+
+
+async def run_ask(ask_question, questions, concurrency):
+    """Stream /ask answers, `concurrency` at a time, timing the first answer token and the whole answer."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def timed(question):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await ask_question(
+                query=question, stream=True, document_id=None, uploaded_after=None, uploaded_before=None,
+                collection=None
+            )
+            first_token = None
+            async for event in response.body_iterator:
+                if '"error"' in event:
+                    raise RuntimeError(event)
+                if first_token is None and '"content"' in event:
+                    first_token = time.perf_counter() - start
+            return first_token, time.perf_counter() - start
+
+    start = time.perf_counter()
+    timings = await asyncio.gather(*(timed(question) for question in questions))
+    elapsed = time.perf_counter() - start
+    first_tokens = [first_token for first_token, _ in timings]
+    return {
+        "concurrency": concurrency,
+        **latency_summary([total for _, total in timings], elapsed),
+        "time_to_first_token_p50_ms": float(np.percentile(first_tokens, 50) * 1000),
+        "time_to_first_token_p95_ms": float(np.percentile(first_tokens, 95) * 1000),
+    }
+
+
+async def run_asks(ask_question, corpus, params):
+    from app.services import llm
+    from benchmarks.stub_openrouter import start_server
+
+    runner, base_url = await start_server(tokens=params["ask_tokens"], delay=params["ask_token_delay"])
+    llm.CHAT_COMPLETIONS_URL = f"{base_url}/chat/completions"
+    try:
+        return [
+            await run_ask(ask_question, corpus.queries(params["ask_requests"]), concurrency)
+            for concurrency in params["concurrency"]
+        ]
+    finally:
+        await llm.close_session()
+        await runner.cleanup()
+
+
+def run_serving(params):
+    """Start the app on the indexed working directory, then time searches and asks."""
+    start = time.perf_counter()
+    import app.main  # noqa: F401 (loads the indexes, like server startup)
+    startup = time.perf_counter() - start
+    from app.routes.ask import ask_question
+    from app.services.embedder import document_embedder
+
+    corpus = SyntheticCorpus(params["seed"] + 1)
+    document_embedder.encode_query("warm-up")
+    search = []
+    for concurrency in params["concurrency"]:
+        # Fresh queries per level, so no result is served from the search cache
+        search.append(run_search(document_embedder, corpus.queries(params["queries"]), concurrency))
+    ask = asyncio.run(run_asks(ask_question, corpus, params))
+    serving_rss = peak_rss_mb()
+
+    start = time.perf_counter()
+    document_embedder.load_indexes()
+    reload = time.perf_counter() - start
+
+    return {
+        "startup": {"app_import_seconds": startup, "load_indexes_seconds": reload},
+        "search": search,
+        "ask": ask,
+        "peak_rss_mb": serving_rss,
+    }
+
+
+def isolated(target, params, workdir, results):
+    """Process entry point: run `target` in `workdir` and report its result."""
+    os.chdir(workdir)
+    sys.path.insert(0, params["backend_dir"])
+    try:
+        results.put(target(params))
+    except BaseException as e:
+        results.put({"error": repr(e)})
+        raise
+
+
+def run_isolated(target, params, workdir):
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    process = ctx.Process(target=isolated, args=(target, params, workdir, results))
+    process.start()
+    result = results.get()
+    process.join()
+    if "error" in result:
+        raise SystemExit(f"❌ {target.__name__} failed: {result['error']}")
+    return result
+
+
+def git_commit(path):
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=path, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="small")
+    parser.add_argument("--chunks", type=int, nargs="+", help="Corpus sizes (overrides the profile)")
+    parser.add_argument("--queries", type=int, help="Searches per concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", help="Concurrent searches and asks")
+    parser.add_argument("--ask-requests", type=int, help="/ask requests per concurrency level")
+    parser.add_argument("--ask-tokens", type=int, default=50, help="Tokens streamed by the stub LLM per answer")
+    parser.add_argument("--ask-token-delay", type=float, default=0.005, help="Stub LLM seconds per token")
+    parser.add_argument("--document-chunks", type=int, default=100, help="Approximate chunks per document")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="Keep the indexed corpora here instead of a temporary directory")
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    params = dict(PROFILES[args.profile])
+    for name in ("chunks", "queries", "concurrency", "ask_requests"):
+        if getattr(args, name) is not None:
+            params[name] = getattr(args, name)
+    params.update(
+        ask_tokens=args.ask_tokens,
+        ask_token_delay=args.ask_token_delay,
+        document_chunks=args.document_chunks,
+        seed=args.seed,
+        backend_dir=backend_dir,
+    )
+    # Inherited by the spawned benchmark processes
+    os.environ.update(BENCHMARK_ENV)
+
+    report = {
+        "profile": args.profile,
+        "git_commit": git_commit(backend_dir),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "settings": {key: value for key, value in params.items() if key != "backend_dir"},
+        "environment": {
+            name: os.environ.get(name)
+            for name in ("EMBEDDING_BACKEND", "EMBEDDING_MODEL", "FAISS_INDEX_TYPE", "CHUNK_MAX_TOKENS",
+                         "SEARCH_FUSION", "QUERY_BATCH_WINDOW_MS", *BENCHMARK_ENV)
+        },
+        "runs": [],
+    }
+    with tempfile.TemporaryDirectory(prefix="rag-benchmark-") as tmp:
+        for chunks in params["chunks"]:
+            workdir = os.path.join(args.workdir or tmp, f"chunks_{chunks}")
+            os.makedirs(workdir, exist_ok=True)
+            print(f"🔹 Indexing {chunks} chunks in {workdir}", file=sys.stderr, flush=True)
+            ingest = run_isolated(run_ingest, {**params, "chunks": chunks}, workdir)
+            print(f"🔹 {ingest['chunks_per_s']:.1f} chunks/s; searching", file=sys.stderr, flush=True)
+            serving = run_isolated(run_serving, params, workdir)
+            report["runs"].append({"chunks": ingest["chunks"], "ingest": ingest, **serving})
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+        print(f"✅ Results written to {args.output}", file=sys.stderr, flush=True)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,11 @@ export const uploadFile = async (file) => {
     });
 };
 
+// Get status of a background upload job
+export const getUploadJob = async (jobId) => {
+    return axios.get(`${BASE_URL}/upload/jobs/${jobId}`);
+};
+
 // Search for documents
 export const searchQuery = async (query, options = {}) => {
     const { topK = 5, semanticWeight = 0.7, keywordWeight = 0.3 } = options;
@@ -1,5 +1,5 @@
 import React, { useState } from "react";
-import { uploadFile } from "../api";
+import { uploadFile, getUploadJob } from "../api";
 import { Button, Typography, Box, CircularProgress } from "@mui/material";
 
 const UploadPage = () => {
@@ -18,7 +18,25 @@ const UploadPage = () => {
 
         try {
             const response = await uploadFile(file);
-            setMessage(response.data.message);
+            if (response.data.error) {
+                setMessage(response.data.error);
+                return;
+            }
+            setMessage("Processing document...");
+
+            // Poll the background job until indexing finishes
+            let job = response.data;
+            while (job.status !== "completed" && job.status !== "failed") {
+                await new Promise((resolve) => setTimeout(resolve, 1000));
+                job = (await getUploadJob(response.data.job_id)).data;
+            }
+            if (job.status === "failed") {
+                setMessage(`Error processing document: ${job.error}`);
+            } else if (job.duplicate_of) {
+                setMessage("This document has already been uploaded.");
+            } else {
+                setMessage(`Document processed successfully (${job.chunks_processed} chunks).`);
+            }
         } catch (error) {
             setMessage("Error uploading file.");
         } finally {